@@ -0,0 +1,69 @@
+# Compare the throughput of split search and tree traversal on in-memory and out-of-core (memory-mapped) data.
+#
+# Usage: python benchmark_out_of_core.py [num_rows] [num_cols]
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+from data_.Data import Data
+from splitting.RegressionSplittingRule import RegressionSplittingRule
+from tree.NodeSamples import NodeSamples
+
+num_rows = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+num_cols = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+num_repeats = 3
+
+# Write a random table, with the outcome in the last column
+rng = np.random.default_rng(42)
+values = rng.normal(size=(num_rows, num_cols))
+values[:, -1] = values[:, 0] + 0.5 * values[:, 1] ** 2 + rng.normal(scale=0.1, size=num_rows)
+directory = tempfile.mkdtemp()
+file_name = os.path.join(directory, "table.txt")
+np.savetxt(file_name, values)
+del values
+
+
+def load(out_of_core):
+    start = time.perf_counter()
+    data = Data.from_file(file_name, out_of_core=out_of_core)
+    data.set_outcome_index(num_cols - 1)
+    data.presort()
+    return data, time.perf_counter() - start
+
+
+def split_search(data):
+    # Split the root of a half-sample on every covariate
+    samples = NodeSamples()
+    samples.add_node()
+    samples.set_root_samples(np.sort(rng.choice(num_rows, num_rows // 2, replace=False)))
+    responses_by_sample = data.get_outcomes(samples[0])[:, np.newaxis]
+    splitting_rule = RegressionSplittingRule(max_num_unique_values=num_rows, alpha=0.05, imbalance_penalty=0.0)
+    start = time.perf_counter()
+    splitting_rule.find_best_split(data, 0, range(num_cols - 1), responses_by_sample, samples, [0], [0.0], [True])
+    return len(samples[0]) * (num_cols - 1) / (time.perf_counter() - start)
+
+
+def traversal(data):
+    # One level of a batch traversal: a random variable per sample
+    samples = np.arange(num_rows)
+    variables = rng.integers(0, num_cols - 1, size=num_rows)
+    start = time.perf_counter()
+    data.get_values_at(samples, variables)
+    return num_rows / (time.perf_counter() - start)
+
+
+try:
+    print("rows: {}, columns: {}".format(num_rows, num_cols))
+    for out_of_core in [False, True]:
+        data, load_time = load(out_of_core)
+        split_rate = max(split_search(data) for _ in range(num_repeats))
+        traversal_rate = max(traversal(data) for _ in range(num_repeats))
+        print("{:12s} load + presort: {:7.2f} s, split search: {:8.2f} M values/s, traversal: {:8.2f} M rows/s".format(
+            "out-of-core" if out_of_core else "in-memory", load_time, split_rate / 1e6, traversal_rate / 1e6))
+        del data
+finally:
+    shutil.rmtree(directory)
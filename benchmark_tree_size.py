@@ -0,0 +1,67 @@
+# Trade-off between training time, forest size and out-of-bag error for the tree size limits
+# (max_depth, max_leaf_nodes, min_split_gain) of a regression forest on Crime.csv.
+#
+# Usage: python benchmark_tree_size.py [num_trees]
+import sys
+import time
+
+import numpy as np
+
+from data_ import utility
+from data_.Data import Data
+from forest.ForestOptions import ForestOptions
+from forest.ForestTrainer import ForestTrainer
+from relabelling.NoopRelabelingStrategy import NoopRelabelingStrategy
+from splitting.RegressionSplittingRuleFactory import RegressionSplittingRuleFactory
+
+num_trees = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+
+# Predict the crime rate (crmrte) from the other columns, leaving out the row names
+storage, column_names, _ = utility.read_table("Crime.csv")
+storage = storage[:, 1:]
+column_names = column_names[1:]
+data = Data(storage)
+data.set_outcome_index(column_names.index("crmrte"))
+num_rows = data.get_num_rows()
+outcomes = data.get_outcomes(np.arange(num_rows))
+
+
+def oob_error(forest):
+    # Mean squared error of the out-of-bag predictions, each tree predicting the mean outcome of the leaf
+    prediction_sums = np.zeros(num_rows)
+    prediction_counts = np.zeros(num_rows)
+    for tree in forest.get_trees():
+        oob_samples = np.setdiff1d(np.arange(num_rows), tree.get_drawn_samples())
+        leaf_nodes = tree.find_leaf_nodes(data, oob_samples)[oob_samples]
+        leaf_offsets = tree.get_leaf_offsets()
+        leaf_sums = np.add.reduceat(np.append(outcomes[tree.get_leaf_members()], 0.0), leaf_offsets[:-1])
+        leaf_sizes = np.diff(leaf_offsets)
+        has_samples = leaf_sizes[leaf_nodes] > 0
+        prediction_sums[oob_samples[has_samples]] += leaf_sums[leaf_nodes[has_samples]] / leaf_sizes[leaf_nodes[has_samples]]
+        prediction_counts[oob_samples[has_samples]] += 1
+    predicted = prediction_counts > 0
+    return np.mean((prediction_sums[predicted] / prediction_counts[predicted] - outcomes[predicted]) ** 2)
+
+
+def run(label, **tree_size_options):
+    options = ForestOptions(num_trees=num_trees, ci_group_size=1, sample_fraction=0.5, mtry=5, min_node_size=1,
+                            honesty=False, honesty_fraction=0.5, honesty_prune_leaves=False, alpha=0.05,
+                            imbalance_penalty=0.0, num_threads=1, random_seed=42, sample_clusters=None,
+                            samples_per_cluster=0, **tree_size_options)
+    trainer = ForestTrainer(NoopRelabelingStrategy(), RegressionSplittingRuleFactory(), None)
+    start = time.perf_counter()
+    forest = trainer.train(data, options)
+    training_time = time.perf_counter() - start
+    num_nodes = sum(tree.get_num_nodes() for tree in forest.get_trees())
+    print("{:40s} {:10.2f} {:12d} {:14.3e}".format(label, training_time, num_nodes, oob_error(forest)))
+
+
+print("{:40s} {:>10s} {:>12s} {:>14s}".format("limits", "train (s)", "forest nodes", "OOB MSE"))
+run("none")
+for max_depth in [2, 4, 6, 8]:
+    run("max_depth={}".format(max_depth), max_depth=max_depth)
+for max_leaf_nodes in [4, 8, 16, 32]:
+    run("max_leaf_nodes={} (breadth-first)".format(max_leaf_nodes), max_leaf_nodes=max_leaf_nodes)
+    run("max_leaf_nodes={} (best-first)".format(max_leaf_nodes), max_leaf_nodes=max_leaf_nodes, growth_order="best_first")
+for min_split_gain in [1e-3, 3e-3, 1e-2]:
+    run("min_split_gain={:g}".format(min_split_gain), min_split_gain=min_split_gain)
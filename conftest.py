@@ -0,0 +1,2 @@
+# Lets the tests under tests/ import the top-level packages (data_, forest, splitting, ...) when pytest is run
+# from the repository root, as the scripts there do.
@@ -1,29 +1,74 @@
+import hashlib
+import json
+import os
+from multiprocessing import shared_memory
+
 import numpy as np
 
+from data_ import utility
+
 
 class Data:
     """
     A class to represent data with various indices for outcomes, treatments, instruments, etc.
     """
 
-    def __init__(self, data, num_rows=None, num_cols=None):
+    # Bin code reserved for missing values in the binned representation.
+    MISSING_BIN = 255
+
+    # Large arrays that are placed in shared memory rather than pickled.
+    SHARED_ARRAYS = ("data", "sorted_index", "bin_codes")
+
+    # Arrays and attributes stored in a binary cache by save.
+    CACHE_ARRAYS = ("data", "sorted_index")
+    CACHE_INDICES = ("outcome_index", "treatment_index", "instrument_index", "weight_index",
+                     "causal_survival_numerator_index", "causal_survival_denominator_index", "censor_index")
+    CACHE_VERSION = 1
+
+    # Number of samples from which get_values_matrix gathers column by column rather than with one 2D fancy index.
+    COLUMN_GATHER_MIN_SAMPLES = 512
+
+    # Supported storage types of the data matrix.
+    DTYPES = (np.float64, np.float32)
+
+    def __init__(self, data, num_rows=None, num_cols=None, dtype=np.float64, exact_columns=None):
         """
         Initialize the Data object with data and dimensions.
 
+        The values are copied into a column-major (Fortran-ordered) array, so that all values of one
+        variable are contiguous and can be gathered for a set of samples at once.
+
+        With dtype=np.float32, the matrix takes half the memory and bandwidth. Columns listed in
+        exact_columns are also kept in float64. The outcome, treatment, instrument, weight and causal
+        survival columns must be among them (their setters raise a ValueError otherwise), so that sums
+        over them keep full precision.
+
         :param data: Either a list of double values or a tuple containing a list of double values and a list of sizes.
+                     A flat list is interpreted in column-major order, as in the original C++ storage.
         :param num_rows: Number of rows in the data.
         :param num_cols: Number of columns in the data.
+        :param dtype: The storage type of the matrix, np.float64 or np.float32.
+        :param exact_columns: Columns to keep in float64 when dtype is np.float32.
         """
         if isinstance(data, tuple):
-            self.data = data[0]
-            self.num_rows = data[1][0]
-            self.num_cols = data[1][1]
+            num_rows = data[1][0]
+            num_cols = data[1][1]
+            data = data[0]
+        elif data is None:
+            raise ValueError("Invalid data storage: None")
+
+        dtype = np.dtype(dtype)
+        if dtype not in [np.dtype(supported) for supported in Data.DTYPES]:
+            raise ValueError("Invalid data dtype: " + str(dtype))
+
+        self.exact_values = {}
+        if exact_columns and dtype != np.float64:
+            storage = self.to_column_major(data, num_rows, num_cols)
+            self.exact_values = {int(col): storage[:, col].copy() for col in exact_columns}
+            self.data = np.asfortranarray(storage, dtype=dtype)
         else:
-            if data is None:
-                raise ValueError("Invalid data storage: None")
-            self.data = data
-            self.num_rows = num_rows
-            self.num_cols = num_cols
+            self.data = self.to_column_major(data, num_rows, num_cols, dtype)
+        self.num_rows, self.num_cols = self.data.shape
 
         self.outcome_index = []
         self.treatment_index = []
@@ -33,6 +78,310 @@ class Data:
         self.causal_survival_denominator_index = None
         self.censor_index = None
         self.disallowed_split_variables = set()
+        self.sorted_index = None
+        self.bin_codes = None
+        self.bin_values = None
+        self.column_names = None
+        self.cache_dir = None
+        self.source_key = None
+        # The identity (device, inode) of each file the arrays were memory-mapped from by load or presort.
+        self.mapped_files = {}
+
+    @classmethod
+    def from_file(cls, file_name, cache=False, out_of_core=False, **kwargs):
+        """
+        Load a Data object from a text table, keeping its column names.
+
+        With cache=True, the parsed data is saved to a binary sidecar next to the file (see save), and later
+        calls memory-map the sidecar instead of parsing the file again, as long as the file is unchanged.
+
+        With out_of_core=True, the table is parsed straight into the sidecar and the returned data is backed by
+        the memory-mapped file, so it does not need to fit in memory (see is_out_of_core).
+
+        :param file_name: The name of the file to load data from.
+        :param cache: Whether to read and write a binary cache of the parsed file.
+        :param out_of_core: Whether to keep the data in a memory-mapped sidecar rather than in memory.
+        :param kwargs: Options passed to utility.read_table (delimiter, header, dtype, na_values, chunk_size,
+                       exact_columns).
+        :return: A Data object.
+        """
+        cache_dir = cls.get_cache_dir(file_name)
+        if cache or out_of_core:
+            data = cls.load(cache_dir, source_file=file_name)
+            if data is not None:
+                return data
+
+        if out_of_core:
+            os.makedirs(cache_dir, exist_ok=True)
+            storage, column_names, exact_values = utility.read_table(file_name, out_file=os.path.join(cache_dir, "data.npy"), **kwargs)
+            data = cls(storage, dtype=storage.dtype)
+            data.column_names = column_names
+            data.exact_values = exact_values
+            data.save(cache_dir, source_file=file_name)
+            del data, storage
+            return cls.load(cache_dir)
+
+        storage, column_names, exact_values = utility.read_table(file_name, **kwargs)
+        data = cls(storage, dtype=storage.dtype)
+        data.column_names = column_names
+        data.exact_values = exact_values
+        if cache:
+            data.save(cache_dir, source_file=file_name)
+        return data
+
+    @staticmethod
+    def get_cache_dir(file_name):
+        """
+        Get the sidecar cache directory of a source file.
+
+        :param file_name: The name of the source file.
+        :return: The path of the cache directory.
+        """
+        return str(file_name) + ".cache"
+
+    @staticmethod
+    def get_file_key(file_name, with_hash=True):
+        """
+        Describe a source file by its size, modification time and (optionally) the SHA-256 of its contents.
+
+        :param file_name: The name of the file.
+        :param with_hash: Whether to hash the contents, which reads the whole file.
+        :return: A dict with the keys size, mtime_ns and sha256 (None if not hashed).
+        """
+        stat = os.stat(file_name)
+        sha256 = None
+        if with_hash:
+            digest = hashlib.sha256()
+            with open(file_name, 'rb') as file:
+                for block in iter(lambda: file.read(1 << 24), b""):
+                    digest.update(block)
+            sha256 = digest.hexdigest()
+        return {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns, "sha256": sha256}
+
+    @staticmethod
+    def get_mapped_file(array):
+        """
+        Find the file an array is memory-mapped from.
+
+        :param array: A numpy array, possibly a view of a np.memmap.
+        :return: The absolute path of the mapped file, or None if the array is not memory-mapped.
+        """
+        while array is not None:
+            if isinstance(array, np.memmap) and array.filename is not None:
+                return os.path.abspath(array.filename)
+            array = getattr(array, 'base', None)
+        return None
+
+    @staticmethod
+    def get_file_id(file_name):
+        """
+        Identify the file currently at a path. A file replaced by os.replace gets a new identity, while processes
+        that mapped the old file keep reading it.
+
+        :param file_name: The name of the file.
+        :return: A tuple of the device and inode numbers.
+        """
+        stat = os.stat(file_name)
+        return stat.st_dev, stat.st_ino
+
+    @staticmethod
+    def map_file(file_name, mapped_files):
+        """
+        Memory-map a .npy file read-only and record its identity, see is_mapped_from.
+
+        :param file_name: The name of the file.
+        :param mapped_files: The dict of file identities to record the file in.
+        :return: The np.memmap.
+        """
+        # Identified before mapping, so a file replaced in between is seen as replaced, never the other way round.
+        mapped_files[os.path.abspath(file_name)] = Data.get_file_id(file_name)
+        return np.load(file_name, mmap_mode='r', allow_pickle=False)
+
+    def is_mapped_from(self, array, file_name):
+        """
+        Check whether an array is memory-mapped from a file, and the file has not been replaced since.
+
+        :param array: A numpy array.
+        :param file_name: The name of the file.
+        :return: True if the array maps the file currently at file_name.
+        """
+        file_name = os.path.abspath(file_name)
+        if self.get_mapped_file(array) != file_name:
+            return False
+        file_id = self.mapped_files.get(file_name)
+        return file_id is None or file_id == self.get_file_id(file_name)
+
+    def save(self, cache_dir, source_file=None):
+        """
+        Save the data to a binary cache directory: one .npy file per array (the matrix, and the presorted
+        index if computed) and a meta.json with the indices, disallowed split variables and column names.
+
+        Every file is written to a temporary file and renamed over the old one, so processes that still map the
+        old cache keep reading the old contents instead of a truncated file.
+
+        :param cache_dir: The directory to write the cache to.
+        :param source_file: The file the data was loaded from, whose key is stored to validate the cache.
+        """
+        os.makedirs(cache_dir, exist_ok=True)
+        # The old metadata is removed first and the new one written last, so an interrupted save leaves no
+        # valid cache behind.
+        meta_file = os.path.join(cache_dir, "meta.json")
+        if os.path.exists(meta_file):
+            os.remove(meta_file)
+        arrays = []
+        for name in Data.CACHE_ARRAYS:
+            array = getattr(self, name)
+            if array is None:
+                continue
+            # Arrays already mapped from the cache (out-of-core data) are not rewritten.
+            array_file = os.path.join(cache_dir, name + ".npy")
+            if not self.is_mapped_from(array, array_file):
+                Data.save_array(array_file, array)
+            arrays.append(name)
+        exact_columns = sorted(self.exact_values)
+        if exact_columns:
+            exact_file = os.path.join(cache_dir, "exact_values.npy")
+            exact_values = np.column_stack([self.exact_values[col] for col in exact_columns])
+            Data.save_array(exact_file, np.asfortranarray(exact_values))
+
+        def to_json(index):
+            if index is None:
+                return None
+            if isinstance(index, (list, tuple, np.ndarray)):
+                return [int(i) for i in index]
+            return int(index)
+
+        meta = {
+            "version": Data.CACHE_VERSION,
+            "source": self.source_key if source_file is None else self.get_file_key(source_file),
+            "arrays": arrays,
+            "indices": {name: to_json(getattr(self, name)) for name in Data.CACHE_INDICES},
+            "disallowed_split_variables": sorted(int(var) for var in self.disallowed_split_variables),
+            "column_names": self.column_names,
+            "exact_columns": exact_columns,
+        }
+        with open(meta_file + ".tmp", 'w', encoding='utf-8') as file:
+            json.dump(meta, file)
+        os.replace(meta_file + ".tmp", meta_file)
+
+    @staticmethod
+    def save_array(array_file, array):
+        """
+        Write an array to a .npy file by way of a temporary file, replacing the file only once it is complete.
+
+        Writing in place would truncate the file under any process that has it memory-mapped.
+
+        :param array_file: The .npy file to write.
+        :param array: The array.
+        """
+        with open(array_file + ".tmp", 'wb') as file:
+            np.save(file, array, allow_pickle=False)
+        os.replace(array_file + ".tmp", array_file)
+
+    @classmethod
+    def load(cls, cache_dir, source_file=None, mmap=True):
+        """
+        Load data saved by save.
+
+        When a source file is given, the cache is only used if it was built from the same file: a matching size
+        and modification time are trusted, otherwise the contents are hashed and compared.
+
+        :param cache_dir: The cache directory.
+        :param source_file: The file the data should have been loaded from.
+        :param mmap: Whether to memory-map the arrays (read-only) instead of reading them into memory. The loaded
+                     data is then out of core, see is_out_of_core.
+        :return: A Data object, or None if there is no valid cache.
+        """
+        meta_file = os.path.join(cache_dir, "meta.json")
+        if not os.path.exists(meta_file):
+            return None
+        with open(meta_file, 'r', encoding='utf-8') as file:
+            meta = json.load(file)
+        if meta.get("version") != Data.CACHE_VERSION:
+            return None
+
+        if source_file is not None:
+            cached_key = meta["source"]
+            if cached_key is None:
+                return None
+            key = cls.get_file_key(source_file, with_hash=False)
+            if key["size"] != cached_key["size"]:
+                return None
+            if key["mtime_ns"] != cached_key["mtime_ns"] and \
+                    cls.get_file_key(source_file)["sha256"] != cached_key["sha256"]:
+                return None
+
+        mapped_files = {}
+
+        def load_array(file_name):
+            file_name = os.path.join(cache_dir, file_name)
+            return cls.map_file(file_name, mapped_files) if mmap else np.load(file_name, allow_pickle=False)
+
+        arrays = {name: load_array(name + ".npy") for name in meta["arrays"]}
+
+        data = cls(arrays["data"], dtype=arrays["data"].dtype)
+        if meta["exact_columns"]:
+            exact_values = load_array("exact_values.npy")
+            data.exact_values = {col: exact_values[:, i] for i, col in enumerate(meta["exact_columns"])}
+        data.sorted_index = arrays.get("sorted_index")
+        for name, index in meta["indices"].items():
+            setattr(data, name, index)
+        data.disallowed_split_variables = set(meta["disallowed_split_variables"])
+        data.column_names = meta["column_names"]
+        data.source_key = meta["source"]
+        data.mapped_files = mapped_files
+        if mmap:
+            data.cache_dir = cache_dir
+        return data
+
+    def is_out_of_core(self):
+        """
+        Check whether the data is backed by memory-mapped files rather than held in memory.
+
+        Out-of-core data is read one column (or column block) at a time, and the presorted index is written
+        next to the data instead of being built in memory.
+
+        :return: True if the data is memory-mapped from a cache directory, False otherwise.
+        """
+        return self.cache_dir is not None
+
+    @staticmethod
+    def to_column_major(data, num_rows=None, num_cols=None, dtype=np.float64):
+        """
+        Convert the given storage into a column-major array of shape (num_rows, num_cols).
+
+        :param data: A 2D array-like, or a flat list of values in column-major order.
+        :param num_rows: Number of rows in the data.
+        :param num_cols: Number of columns in the data.
+        :param dtype: The dtype of the array.
+        :return: A Fortran-ordered numpy array.
+        """
+        storage = np.asarray(data, dtype=dtype)
+        if storage.ndim == 1:
+            if num_rows is None or num_cols is None:
+                raise ValueError("num_rows and num_cols are required for flat data storage.")
+            storage = storage.reshape((num_rows, num_cols), order='F')
+        elif storage.ndim != 2:
+            raise ValueError("Invalid data storage: expected a 1D or 2D array.")
+
+        if num_rows is not None and num_cols is not None and storage.shape != (num_rows, num_cols):
+            raise ValueError("Data storage does not match the provided dimensions.")
+
+        return np.asfortranarray(storage)
+
+    def check_exact_columns(self, columns):
+        """
+        Check that columns whose values are summed (outcomes, treatments, instruments, weights) are kept in
+        float64 when the matrix is stored in float32, rather than silently rounded to float32.
+
+        :param columns: The column indices.
+        """
+        if self.data.dtype == np.float64:
+            return
+        rounded = [col for col in columns if col not in self.exact_values]
+        if rounded:
+            raise ValueError("Columns " + str(rounded) + " are stored in float32: pass them in exact_columns "
+                             "to keep them in float64.")
 
     def set_outcome_index(self, index):
         """
@@ -42,6 +391,7 @@ class Data:
         """
         if isinstance(index, int):
             index = [index]
+        self.check_exact_columns(index)
         self.outcome_index = index
         self.disallowed_split_variables.update(index)
 
@@ -53,6 +403,7 @@ class Data:
         """
         if isinstance(index, int):
             index = [index]
+        self.check_exact_columns(index)
         self.treatment_index = index
         self.disallowed_split_variables.update(index)
 
@@ -62,6 +413,7 @@ class Data:
 
         :param index: The index for the instrument.
         """
+        self.check_exact_columns([index])
         self.instrument_index = index
         self.disallowed_split_variables.add(index)
 
@@ -71,6 +423,7 @@ class Data:
 
         :param index: The index for the weight.
         """
+        self.check_exact_columns([index])
         self.weight_index = index
         self.disallowed_split_variables.add(index)
 
@@ -80,6 +433,7 @@ class Data:
 
         :param index: The index for the causal survival numerator.
         """
+        self.check_exact_columns([index])
         self.causal_survival_numerator_index = index
         self.disallowed_split_variables.add(index)
 
@@ -89,6 +443,7 @@ class Data:
 
         :param index: The index for the causal survival denominator.
         """
+        self.check_exact_columns([index])
         self.causal_survival_denominator_index = index
         self.disallowed_split_variables.add(index)
 
@@ -101,30 +456,228 @@ class Data:
         self.censor_index = index
         self.disallowed_split_variables.add(index)
 
+    def presort(self):
+        """
+        Compute, once, the order of the samples by value for every column (NaNs first).
+
+        The index is read-only once built and can be shared by all trees trained on this data, so that
+        sorting the samples of a node reduces to a linear-time filter of the presorted column. For out-of-core
+        data, the index is written to the cache directory and memory-mapped.
+        """
+        index_dtype = np.int32 if self.num_rows < np.iinfo(np.int32).max else np.int64
+        shape = (self.num_rows, self.num_cols)
+        if self.is_out_of_core():
+            # Built in a temporary file, so that a previous index mapped by other processes is not truncated.
+            index_file = os.path.join(self.cache_dir, "sorted_index.npy")
+            sorted_index = np.lib.format.open_memmap(index_file + ".tmp", mode='w+', dtype=index_dtype, shape=shape, fortran_order=True)
+        else:
+            sorted_index = np.empty(shape, dtype=index_dtype, order='F')
+
+        for col in range(self.num_cols):
+            sorted_index[:, col] = self.nan_first_argsort(self.data[:, col])
+
+        if self.is_out_of_core():
+            sorted_index.flush()
+            del sorted_index
+            os.replace(index_file + ".tmp", index_file)
+            self.sorted_index = self.map_file(index_file, self.mapped_files)
+            self.save(self.cache_dir)
+        else:
+            sorted_index.flags.writeable = False
+            self.sorted_index = sorted_index
+
+    def get_sorted_index(self):
+        """
+        Get the presorted index computed by presort, or None if it has not been computed.
+
+        :return: An array of shape (num_rows, num_cols) holding the sample order of each column.
+        """
+        return self.sorted_index
+
+    @staticmethod
+    def nan_first_argsort(values):
+        """
+        Stable argsort that places NaNs at the front.
+
+        :param values: A 1D array of values.
+        :return: The indices that sort the values.
+        """
+        index = np.argsort(values, kind='stable')
+        num_missing = np.count_nonzero(np.isnan(values))
+        if num_missing > 0:
+            index = np.concatenate((index[len(index) - num_missing:], index[:len(index) - num_missing]))
+        return index
+
+    def get_sorted_samples(self, samples, var):
+        """
+        Sort samples by their value for a given variable (NaNs first).
+
+        Uses the presorted index when available and the node is large enough for a linear filter of the
+        whole column to beat sorting the node's values. Samples are assumed to be distinct.
+
+        :param samples: A list or array of sample indices.
+        :param var: The variable index.
+        :return: A tuple of the sorted sample indices and their values.
+        """
+        samples = np.asarray(samples, dtype=np.intp)
+        num_samples = len(samples)
+
+        if self.sorted_index is not None and num_samples * np.log2(max(num_samples, 2)) >= self.num_rows:
+            in_node = np.zeros(self.num_rows, dtype=bool)
+            in_node[samples] = True
+            order = self.sorted_index[:, var]
+            sorted_samples = order[in_node[order]].astype(np.intp)
+            in_node[samples] = False
+        else:
+            sorted_samples = samples[self.nan_first_argsort(self.get_values(samples, var))]
+
+        return sorted_samples, self.get_values(sorted_samples, var)
+
     def get_all_values(self, samples, var):
         """
         Retrieve and sort all values for a given variable from specified samples.
 
         :param samples: A list of sample indices.
         :param var: The variable index.
-        :return: A tuple of sorted values and the corresponding sorted sample indices.
+        :return: A tuple of sorted unique values (NaNs first, counted once) and the corresponding sorted sample indices.
         """
-        all_values = [self.get(sample, var) for sample in samples]
+        sorted_samples, all_values = self.get_sorted_samples(samples, var)
+        if len(all_values) == 0:
+            return all_values, sorted_samples
 
-        # Argsort, handling NaNs (NaNs go to the front)
-        index = sorted(range(len(all_values)), key=lambda i: (np.isnan(all_values[i]), all_values[i]))
-        sorted_samples = [samples[i] for i in index]
+        # Remove duplicates, treating all NaNs as one value
+        is_new_value = np.empty(len(all_values), dtype=bool)
+        is_new_value[0] = True
+        is_new_value[1:] = (all_values[1:] != all_values[:-1]) & ~np.isnan(all_values[1:])
+        unique_values = all_values[is_new_value]
 
-        # Update all_values based on sorted samples
-        all_values = [self.get(sample, var) for sample in sorted_samples]
+        return unique_values, sorted_samples
 
-        # Remove duplicates while handling NaNs
-        unique_values = []
-        for value in all_values:
-            if not unique_values or not np.isclose(value, unique_values[-1], equal_nan=True):
-                unique_values.append(value)
+    def build_bins(self, max_bins=255):
+        """
+        Quantize every column into at most max_bins quantile bins, stored as uint8 codes.
 
-        return unique_values, sorted_samples
+        Bin b of a column holds the values in (bin_values[b - 1], bin_values[b]], where each bin value is an
+        observed value of the column, so splitting at bin b is the same as splitting at value bin_values[b].
+        Missing values get the code MISSING_BIN.
+
+        :param max_bins: The maximum number of bins per column, at most 255.
+        """
+        if max_bins < 1 or max_bins > Data.MISSING_BIN:
+            raise ValueError("max_bins must be between 1 and " + str(Data.MISSING_BIN) + ".")
+
+        bin_codes = np.empty((self.num_rows, self.num_cols), dtype=np.uint8, order='F')
+        bin_values = []
+        for col in range(self.num_cols):
+            column = self.data[:, col]
+            is_missing = np.isnan(column)
+            observed = column[~is_missing]
+
+            upper_values = np.unique(observed)
+            if len(upper_values) > max_bins:
+                quantiles = np.arange(1, max_bins + 1) / max_bins
+                upper_values = np.unique(np.quantile(observed, quantiles, method='inverted_cdf'))
+
+            codes = np.searchsorted(upper_values, column, side='left')
+            codes[is_missing] = Data.MISSING_BIN
+            bin_codes[:, col] = codes
+            bin_values.append(upper_values)
+
+        bin_codes.flags.writeable = False
+        self.bin_codes = bin_codes
+        self.bin_values = bin_values
+
+    def is_binned(self):
+        """
+        Check whether the data has been quantized with build_bins.
+
+        :return: True if bin codes are available, False otherwise.
+        """
+        return self.bin_codes is not None
+
+    def get_bin_codes(self, samples, var):
+        """
+        Gather the bin codes of one variable for a set of samples.
+
+        :param samples: A list or array of sample indices.
+        :param var: The variable index.
+        :return: A uint8 array with one bin code per sample.
+        """
+        return self.bin_codes[:, var][np.asarray(samples, dtype=np.intp)]
+
+    def get_bin_values(self, var):
+        """
+        Get the split value of every bin of a variable.
+
+        :param var: The variable index.
+        :return: An array holding the largest value that falls into each bin.
+        """
+        return self.bin_values[var]
+
+    def to_shared_memory(self):
+        """
+        Copy the data matrix and its precomputed indices into shared memory segments.
+
+        The caller owns the returned segments and must close and unlink them once all readers are done.
+        Arrays that are memory-mapped from a file are not copied: readers map the same file.
+
+        :return: A tuple of a picklable description of the data, to pass to from_shared_memory, and the segments.
+        """
+        arrays = {}
+        segments = []
+        for name in Data.SHARED_ARRAYS:
+            array = getattr(self, name)
+            if array is None:
+                continue
+            mapped_file = self.get_mapped_file(array)
+            if mapped_file is not None and mapped_file.endswith(".npy"):
+                arrays[name] = ("file", mapped_file, array.shape, array.dtype.str)
+                continue
+            segment = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+            shared_array = np.ndarray(array.shape, dtype=array.dtype, buffer=segment.buf, order='F')
+            shared_array[...] = array
+            arrays[name] = ("segment", segment.name, array.shape, array.dtype.str)
+            segments.append(segment)
+
+        state = {key: value for key, value in self.__dict__.items() if key not in Data.SHARED_ARRAYS}
+        return (arrays, state), segments
+
+    @classmethod
+    def from_shared_memory(cls, data_spec):
+        """
+        Attach to data placed in shared memory by to_shared_memory, without copying it.
+
+        The returned segments must be kept alive (and closed, not unlinked) for as long as the data is used.
+
+        :param data_spec: The description returned by to_shared_memory.
+        :return: A tuple of the read-only Data and the attached segments.
+        """
+        arrays, state = data_spec
+        data = cls.__new__(cls)
+        data.__dict__.update(state)
+        for name in Data.SHARED_ARRAYS:
+            setattr(data, name, None)
+
+        segments = []
+        for name, (kind, location, shape, dtype) in arrays.items():
+            if kind == "file":
+                setattr(data, name, np.load(location, mmap_mode='r'))
+                continue
+            segment = shared_memory.SharedMemory(name=location)
+            array = np.ndarray(shape, dtype=dtype, buffer=segment.buf, order='F')
+            array.flags.writeable = False
+            setattr(data, name, array)
+            segments.append(segment)
+
+        return data, segments
+
+    def get_column_names(self):
+        """
+        Get the column names read from the file header, or None if there were none.
+
+        :return: A list of column names.
+        """
+        return self.column_names
 
     def get_num_cols(self):
         """
@@ -166,4 +719,146 @@ class Data:
         """
         return self.disallowed_split_variables
 
-    # Implementation of 'get' method is needed for this class to work properly.
+    def get_dtype(self):
+        """
+        Get the storage type of the data matrix.
+
+        :return: The numpy dtype of the matrix, float64 or float32.
+        """
+        return self.data.dtype
+
+    def get_column(self, var):
+        """
+        Get all values of one variable, from the float64 copy if the column is kept exact.
+
+        :param var: The variable index.
+        :return: A view of the column.
+        """
+        column = self.exact_values.get(var)
+        if column is None:
+            column = self.data[:, var]
+        return column
+
+    def get(self, row, col):
+        """
+        Get a single value.
+
+        :param row: The row (sample) index.
+        :param col: The column (variable) index.
+        :return: The value at the given position.
+        """
+        return self.get_column(col)[row]
+
+    def get_outcome(self, row):
+        """
+        Get the (first) outcome of a sample.
+
+        :param row: The sample index.
+        :return: The outcome value.
+        """
+        return float(self.get_column(self.outcome_index[0])[row])
+
+    def get_weight(self, row):
+        """
+        Get the weight of a sample, or 1.0 if no weight index was set.
+
+        :param row: The sample index.
+        :return: The sample weight.
+        """
+        if self.weight_index is None:
+            return 1.0
+        return float(self.get_column(self.weight_index)[row])
+
+    def get_values(self, samples, var):
+        """
+        Gather the values of one variable for a set of samples.
+
+        :param samples: A list or array of sample indices.
+        :param var: The variable index.
+        :return: An array with one value per sample, in the order of samples, of the storage dtype (float64 for exact columns).
+        """
+        return self.get_column(var)[np.asarray(samples, dtype=np.intp)]
+
+    def get_values_matrix(self, samples, variables, out=None):
+        """
+        Gather the values of several variables for a set of samples.
+
+        For large sets of samples, the values are gathered one column at a time, which reads each contiguous
+        column of the data once instead of striding across all of them for every sample.
+
+        :param samples: A list or array of sample indices.
+        :param variables: A list of variable indices.
+        :param out: An optional array of shape (len(samples), len(variables)) to gather into.
+        :return: An array of shape (len(samples), len(variables)), of the storage dtype (float64 if any column is exact).
+        """
+        samples = np.asarray(samples, dtype=np.intp)
+        has_exact_columns = any(var in self.exact_values for var in variables)
+        if len(samples) < Data.COLUMN_GATHER_MIN_SAMPLES and not has_exact_columns:
+            values = self.data[np.ix_(samples, np.asarray(variables, dtype=np.intp))]
+            if out is None:
+                return values
+            out[...] = values
+            return out
+
+        if out is None:
+            dtype = np.float64 if has_exact_columns else self.data.dtype
+            out = np.empty((len(samples), len(variables)), dtype=dtype, order='F')
+        for j, var in enumerate(variables):
+            out[:, j] = self.get_column(var).take(samples)
+        return out
+
+    def get_values_at(self, samples, variables):
+        """
+        Gather one value per (sample, variable) pair.
+
+        For out-of-core data, the pairs are grouped by variable and each column is read as one block, in row
+        order, instead of faulting in pages of every column at random.
+
+        :param samples: An array of sample indices.
+        :param variables: An array of variable indices, of the same length as samples.
+        :return: An array with the value of each pair, of the storage dtype.
+        """
+        if not self.is_out_of_core():
+            return self.data[samples, variables]
+
+        samples = np.asarray(samples, dtype=np.intp)
+        variables = np.asarray(variables, dtype=np.intp)
+        order = np.lexsort((samples, variables))
+        sorted_variables = variables[order]
+        starts = np.flatnonzero(np.concatenate(([True], sorted_variables[1:] != sorted_variables[:-1])))
+        ends = np.append(starts[1:], len(order))
+
+        values = np.empty(len(samples), dtype=self.data.dtype)
+        for start, end in zip(starts, ends):
+            block = order[start:end]
+            values[block] = self.data[:, sorted_variables[start]][samples[block]]
+        return values
+
+    def get_outcomes(self, samples):
+        """
+        Gather the (first) outcome for a set of samples.
+
+        :param samples: A list or array of sample indices.
+        :return: A float64 array with one outcome per sample.
+        """
+        return self.get_values(samples, self.outcome_index[0]).astype(np.float64, copy=False)
+
+    def get_outcome_matrix(self, samples):
+        """
+        Gather all outcomes for a set of samples.
+
+        :param samples: A list or array of sample indices.
+        :return: A float64 array of shape (len(samples), num_outcomes).
+        """
+        return self.get_values_matrix(samples, self.outcome_index).astype(np.float64, copy=False)
+
+    def get_weights(self, samples):
+        """
+        Gather the weights for a set of samples, or ones if no weight index was set.
+
+        :param samples: A list or array of sample indices.
+        :return: A float64 array with one weight per sample.
+        """
+        if self.weight_index is None:
+            return np.ones(len(samples))
+        return self.get_values(samples, self.weight_index).astype(np.float64, copy=False)
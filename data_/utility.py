@@ -1,4 +1,5 @@
 import math
+import os
 import numpy as np
 import pandas as pd
 
@@ -45,44 +46,182 @@ def equal_doubles(first, second, epsilon=1e-7):
         return math.isnan(second)
     return abs(first - second) < epsilon
 
-def load_data(file_name):
+# Tokens read as missing values, in addition to the ones pandas recognizes by default.
+NA_VALUES = ("NA", "NaN", "nan", "")
+
+def is_number(token, na_values=NA_VALUES):
     """
-    Load data from a file into a numpy array.
+    Check whether a token of a text table is a number (or a missing value token).
 
-    :param file_name: The name of the file to load data from.
-    :return: A tuple containing the data as a numpy array and its dimensions.
+    :param token: The token to check.
+    :param na_values: The tokens read as missing values.
+    :return: True if the token can be read as a number, False otherwise.
+    """
+    token = token.strip()
+    if token in na_values:
+        return True
+    try:
+        float(token)
+    except ValueError:
+        return False
+    return True
+
+def count_lines(file_name, block_size=1 << 24, num_cols=None, delimiter=None):
     """
-    with open(file_name, 'r',  encoding='utf-8') as file:
-        lines = file.readlines()
+    Count the lines of a file without holding more than one block of it in memory.
 
-    if not lines:
-        raise RuntimeError("Could not open input file.")
+    :param file_name: The name of the file.
+    :param block_size: The number of bytes read at a time.
+    :param num_cols: If set, also check that every non-blank line has this number of fields.
+    :param delimiter: The field delimiter for num_cols, or None for runs of whitespace.
+    :return: The number of lines, counting a last line without a trailing newline.
+    """
+    num_lines = 0
+    rest = b""
+    with open(file_name, 'rb') as file:
+        while True:
+            block = file.read(block_size)
+            if not block:
+                break
+            num_lines += block.count(b"\n")
+            if num_cols is not None:
+                # Only whole lines are checked; the end of the last one is carried over to the next block.
+                block = rest + block
+                end = block.rfind(b"\n") + 1
+                check_num_fields(block[:end], num_cols, delimiter)
+                rest = block[end:]
+            else:
+                rest = block[-1:]
+
+    if rest and rest != b"\n":
+        num_lines += 1
+        if num_cols is not None:
+            check_num_fields(rest + b"\n", num_cols, delimiter)
+    return num_lines
+
+# Bytes that separate fields when the delimiter is whitespace (as pandas' \s+), newline included.
+WHITESPACE = np.frombuffer(b" \t\n\r\x0b\x0c", dtype=np.uint8)
+
+def check_num_fields(lines, num_cols, delimiter=None):
+    """
+    Check that every non-blank line of a block of whole lines has the given number of fields.
 
-    num_rows = len(lines)
-    num_cols = len(lines[0].split())
+    pandas pads lines with too few fields with NaN instead of rejecting them, so the fields are counted here,
+    a whole block at a time: a field starts at each non-whitespace byte that follows whitespace, or is one more
+    than the number of delimiters on its line.
 
-    # 用pd.read_excel读取Excel文件
-    # df = pd.read_excel(file_name)
-    #
-    # # 获取 DataFrame 的行数和列数
-    # num_rows, num_cols = df.shape
-    #
-    # # 打印行数和列数
-    # print("行数:", num_rows)
-    # print("列数:", num_cols)
+    :param lines: The bytes of the lines, ending with a newline.
+    :param num_cols: The expected number of fields.
+    :param delimiter: The field delimiter, or None for runs of whitespace.
+    """
+    values = np.frombuffer(lines, dtype=np.uint8)
+    line_ends = np.flatnonzero(values == ord("\n"))
+    is_space = np.isin(values, WHITESPACE)
+    starts = np.flatnonzero(~is_space & np.concatenate(([True], is_space[:-1])))
+    num_starts = np.bincount(np.searchsorted(line_ends, starts), minlength=len(line_ends))
+    if delimiter is None:
+        num_fields = num_starts
+    else:
+        delimiters = np.flatnonzero(values == ord(delimiter))
+        num_fields = np.bincount(np.searchsorted(line_ends, delimiters), minlength=len(line_ends)) + 1
+        # Lines holding only whitespace are blank, as for pandas.
+        num_fields[(num_starts == 0) & (num_fields == 1)] = 0
+    if np.any((num_fields != 0) & (num_fields != num_cols)):
+        raise RuntimeError("Inconsistent number of columns.")
+
+def read_table(file_name, delimiter=None, header="infer", dtype=np.float64, na_values=NA_VALUES, chunk_size=100000, out_file=None, exact_columns=()):
+    """
+    Stream a whitespace- or comma-delimited text table into a preallocated column-major array.
 
-    # # 将 DataFrame 转换为行列表
-    # lines = df.values.tolist()
+    The rows are counted and their fields checked first, then parsed chunk by chunk straight into the array, so
+    peak memory is about one copy of the numeric matrix plus one chunk.
 
-    storage = np.zeros((num_rows, num_cols))
+    :param file_name: The name of the file to load data from.
+    :param delimiter: The column delimiter, or None to use commas if the first line has one and whitespace otherwise.
+    :param header: True if the first line holds column names, False if not, or "infer" to detect it from non-numeric tokens.
+    :param dtype: The dtype of the array, float64 or float32.
+    :param na_values: The tokens read as missing values (NaN).
+    :param chunk_size: The number of lines parsed at a time.
+    :param out_file: If set, the array is a memory-mapped .npy file created at this path instead of an in-memory
+                     array, so tables larger than memory can be loaded. The table is written to a temporary file
+                     that replaces out_file once complete, so processes mapping a previous out_file are unaffected.
+    :param exact_columns: Columns to also return in float64 when dtype is float32, e.g. outcomes and weights.
+    :return: A tuple containing the data as a numpy array, the column names (None if there is no header) and
+             a dict from each exact column to its float64 values.
+    """
+    with open(file_name, 'r', encoding='utf-8') as file:
+        first_line = file.readline()
 
-    for row, line in enumerate(lines):
-        values = line.split()
-        if len(values) != num_cols:
-            raise RuntimeError("Inconsistent number of columns.")
-        storage[row] = np.array([float(value) for value in values])
+    if not first_line.strip():
+        raise RuntimeError("Could not open input file.")
 
-    return storage, (num_rows, num_cols)
+    if delimiter is None and ',' in first_line:
+        delimiter = ','
+    tokens = first_line.strip().split(delimiter)
+    if header == "infer":
+        header = not all(is_number(token, na_values) for token in tokens)
+
+    column_names = [token.strip().strip('"') for token in tokens] if header else None
+    num_cols = len(tokens)
+    num_rows = count_lines(file_name, num_cols=num_cols, delimiter=delimiter) - (1 if header else 0)
+
+    partial_file = None if out_file is None else out_file + ".tmp"
+    if out_file is None:
+        storage = np.empty((num_rows, num_cols), dtype=dtype, order='F')
+    else:
+        storage = np.lib.format.open_memmap(partial_file, mode='w+', dtype=dtype, shape=(num_rows, num_cols), fortran_order=True)
+    exact_values = {col: np.empty(num_rows) for col in exact_columns}
+
+    # Chunks are parsed in float64 and rounded once when stored.
+    reader = pd.read_csv(file_name, sep=r'\s+' if delimiter is None else delimiter, header=None,
+                         skiprows=1 if header else 0, dtype=np.float64, na_values=list(na_values),
+                         chunksize=chunk_size, engine='c', float_precision='round_trip')
+
+    row = 0
+    try:
+        for chunk in reader:
+            if chunk.shape[1] != num_cols:
+                raise RuntimeError("Inconsistent number of columns.")
+            values = chunk.to_numpy(dtype=np.float64)
+            storage[row:row + len(chunk)] = values
+            for col, column in exact_values.items():
+                column[row:row + len(chunk)] = values[:, col]
+            row += len(chunk)
+    except pd.errors.ParserError as error:
+        raise RuntimeError("Inconsistent number of columns.") from error
+
+    # Blank lines are counted but not parsed.
+    exact_values = {col: column[:row] for col, column in exact_values.items()}
+    if row < num_rows and out_file is None:
+        storage = np.asfortranarray(storage[:row])
+    elif row < num_rows:
+        trimmed = np.lib.format.open_memmap(out_file + ".trimmed.tmp", mode='w+', dtype=dtype, shape=(row, num_cols), fortran_order=True)
+        for col in range(num_cols):
+            trimmed[:, col] = storage[:row, col]
+        del storage
+        os.remove(partial_file)
+        storage, partial_file = trimmed, out_file + ".trimmed.tmp"
+    if out_file is not None:
+        storage.flush()
+        del storage
+        os.replace(partial_file, out_file)
+        # Mapped again from its final path, which Data.save recognizes as already written.
+        storage = np.load(out_file, mmap_mode='r+')
+
+    return storage, column_names, exact_values
+
+def load_data(file_name, delimiter=None, header="infer", dtype=np.float64):
+    """
+    Load data from a file into a numpy array.
+
+    :param file_name: The name of the file to load data from.
+    :param delimiter: The column delimiter, or None to detect commas or whitespace.
+    :param header: True if the first line holds column names, False if not, or "infer" to detect it.
+    :param dtype: The dtype of the array, float64 or float32.
+    :return: A tuple containing the data as a numpy array and its dimensions.
+    """
+    storage, _, _ = read_table(file_name, delimiter, header, dtype)
+    return storage, storage.shape
 
 def set_data(data, row, col, value):
     """
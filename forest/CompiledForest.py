@@ -0,0 +1,73 @@
+import numpy as np
+
+
+class CompiledForest:
+    """
+    A forest flattened into one node table, for low-latency scoring of single rows or small batches.
+
+    The nodes of all trees are concatenated: node i of tree t has the global index tree_offsets[t] + i. Leaves
+    point to themselves, so a row can be routed through every tree at once by repeatedly replacing each tree's
+    current node with the chosen child.
+    """
+
+    def __init__(self, forest):
+        """
+        Compile a forest.
+
+        :param forest: The Forest object.
+        """
+        trees = forest.get_trees()
+        num_nodes = np.array([tree.get_num_nodes() for tree in trees], dtype=np.int64)
+
+        self.num_trees = len(trees)
+        self.tree_offsets = np.zeros(self.num_trees + 1, dtype=np.int64)
+        np.cumsum(num_nodes, out=self.tree_offsets[1:])
+        self.roots = self.tree_offsets[:-1] + np.array([tree.get_root_node() for tree in trees], dtype=np.int64)
+
+        self.split_vars = np.concatenate([tree.get_split_vars() for tree in trees]).astype(np.intp)
+        self.split_values = np.concatenate([tree.get_split_values() for tree in trees])
+        self.send_missing_left = np.concatenate([tree.get_send_missing_left() for tree in trees])
+
+        local_left_children = np.concatenate([tree.get_child_nodes()[0] for tree in trees]).astype(np.int64)
+        local_right_children = np.concatenate([tree.get_child_nodes()[1] for tree in trees]).astype(np.int64)
+        self.is_leaf = (local_left_children == 0) & (local_right_children == 0)
+
+        global_nodes = np.arange(self.tree_offsets[-1], dtype=np.int64)
+        node_offsets = np.repeat(self.tree_offsets[:-1], num_nodes)
+        self.left_children = np.where(self.is_leaf, global_nodes, local_left_children + node_offsets)
+        self.right_children = np.where(self.is_leaf, global_nodes, local_right_children + node_offsets)
+        self.node_offsets = node_offsets
+
+    def get_num_trees(self):
+        """Get the number of trees in the compiled forest."""
+        return self.num_trees
+
+    def find_leaf_nodes(self, rows):
+        """
+        Route one row, or a small batch of rows, through all trees.
+
+        :param rows: A 1D array with the values of all data columns for one row, or a 2D array with one such row per line.
+        :return: The leaf node of each tree (local to the tree, as in Tree.find_leaf_node), as an int64 array of shape
+                 (num_trees,) for one row or (num_rows, num_trees) for a batch.
+        """
+        rows = np.asarray(rows, dtype=np.float64)
+        single_row = rows.ndim == 1
+        rows = np.atleast_2d(rows)
+
+        nodes = np.tile(self.roots, rows.shape[0])
+        row_index = np.repeat(np.arange(rows.shape[0]), self.num_trees)
+
+        active = np.flatnonzero(~self.is_leaf[nodes])
+        while len(active) > 0:
+            active_nodes = nodes[active]
+            split_values = self.split_values[active_nodes]
+            values = rows[row_index[active], self.split_vars[active_nodes]]
+
+            go_left = (values <= split_values) | (np.isnan(values) & (self.send_missing_left[active_nodes] | np.isnan(split_values)))
+            active_nodes = np.where(go_left, self.left_children[active_nodes], self.right_children[active_nodes])
+
+            nodes[active] = active_nodes
+            active = active[~self.is_leaf[active_nodes]]
+
+        leaf_nodes = (nodes - self.node_offsets[nodes]).reshape(rows.shape[0], self.num_trees)
+        return leaf_nodes[0] if single_row else leaf_nodes
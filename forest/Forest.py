@@ -1,3 +1,8 @@
+import numpy as np
+
+from forest.CompiledForest import CompiledForest
+
+
 class Forest:
     def __init__(self, trees, num_variables, ci_group_size):
         """
@@ -16,6 +21,8 @@ class Forest:
         """
         Merge multiple forests into one.
 
+        The trees are shared, not copied, so merging memory-mapped forests keeps their arrays on the mapped pages.
+
         :param forests: A list of Forest objects to be merged.
         :return: A new merged Forest.
         """
@@ -51,3 +58,26 @@ class Forest:
         :return: The group size.
         """
         return self.ci_group_size
+
+    def get_drawn_sample_matrix(self, num_rows):
+        """
+        Get the drawn samples of all trees as one bit matrix.
+
+        :param num_rows: The number of rows of the training data.
+        :return: A uint8 array of shape (num_trees, ceil(num_rows / 8)) whose row t is the bitset of the samples
+                 drawn for tree t (see Tree), so out-of-bag masks are the complement of its bits.
+        """
+        num_bytes = -(-num_rows // 8)
+        matrix = np.zeros((len(self.trees), num_bytes), dtype=np.uint8)
+        for t, tree in enumerate(self.trees):
+            bits = tree.get_drawn_sample_bits()[:num_bytes]
+            matrix[t, :len(bits)] = bits
+        return matrix
+
+    def compile(self):
+        """
+        Flatten the forest into one node table for low-latency scoring.
+
+        :return: A CompiledForest whose find_leaf_nodes routes a row through all trees at once.
+        """
+        return CompiledForest(self)
@@ -6,8 +6,9 @@ from tree.TreeOptions import TreeOptions
 
 class ForestOptions:
     DEFAULT_NUM_THREADS = 0
+    BACKENDS = ("thread", "process")
 
-    def __init__(self, num_trees, ci_group_size, sample_fraction, mtry, min_node_size, honesty, honesty_fraction, honesty_prune_leaves, alpha, imbalance_penalty, num_threads, random_seed, sample_clusters, samples_per_cluster):
+    def __init__(self, num_trees, ci_group_size, sample_fraction, mtry, min_node_size, honesty, honesty_fraction, honesty_prune_leaves, alpha, imbalance_penalty, num_threads, random_seed, sample_clusters, samples_per_cluster, presort=True, max_bins=None, backend="thread", growth_order="breadth_first", max_leaf_nodes=None, max_depth=None, min_split_gain=0.0):
         """
         Initialize ForestOptions.
 
@@ -25,12 +26,26 @@ class ForestOptions:
         :param random_seed: The random seed for the random number generator.
         :param sample_clusters: The clusters of samples.
         :param samples_per_cluster: The number of samples per cluster.
+        :param presort: Whether to presort every column once before training, to speed up split finding.
+        :param max_bins: If set, quantize every variable into at most this many bins and search splits over the bins.
+        :param backend: "thread" to train trees in a thread pool, or "process" to train them in a process pool
+                        that reads the training data from shared memory.
+        :param growth_order: The order in which tree nodes are split: "breadth_first", "depth_first" or "best_first".
+        :param max_leaf_nodes: If set, the maximum number of leaves of each tree.
+        :param max_depth: If set, the maximum depth of each tree.
+        :param min_split_gain: The minimum decrease in impurity (the weighted sum of squared errors of the responses, minus
+                               the imbalance penalty) of a split.
         """
         self.ci_group_size = ci_group_size
         self.sample_fraction = sample_fraction
-        self.tree_options = TreeOptions(mtry, min_node_size, honesty, honesty_fraction, honesty_prune_leaves, alpha, imbalance_penalty)
+        self.tree_options = TreeOptions(mtry, min_node_size, honesty, honesty_fraction, honesty_prune_leaves, alpha, imbalance_penalty, max_bins, growth_order, max_leaf_nodes, max_depth, min_split_gain)
         self.sampling_options = SamplingOptions(samples_per_cluster, sample_clusters)
         self.random_seed = random_seed
+        self.presort = presort
+
+        if backend not in ForestOptions.BACKENDS:
+            raise ValueError("Unknown training backend: " + str(backend) + ".")
+        self.backend = backend
 
         self.num_threads = self.validate_num_threads(num_threads)
 
@@ -61,6 +76,12 @@ class ForestOptions:
     def get_random_seed(self):
         return self.random_seed
 
+    def get_presort(self):
+        return self.presort
+
+    def get_backend(self):
+        return self.backend
+
     @staticmethod
     def validate_num_threads(num_threads):
         if num_threads == ForestOptions.DEFAULT_NUM_THREADS:
@@ -1,16 +1,27 @@
+import numpy as np
+
+from prediction.OptimizedPredictionCollector import OptimizedPredictionCollector
+from prediction.SampleWeightComputer import SampleWeightComputer
+
+
 class ForestPredictor:
     def __init__(self, num_threads, strategy):
         """
         Initialize a ForestPredictor.
 
+        Strategies that precompute leaf statistics (such as RegressionPredictionStrategy) predict from the
+        statistics of the leaves with an OptimizedPredictionCollector, without the training data. The others
+        (such as LocalLinearPredictionStrategy) predict from the forest weights with their predict_batch.
+
         :param num_threads: The number of threads to use for prediction.
-        :param strategy: The prediction strategy (either Default or Optimized).
+        :param strategy: The prediction strategy.
         """
-        self.tree_traverser = TreeTraverser(num_threads)
-        if isinstance(strategy, DefaultPredictionStrategy):
-            self.prediction_collector = DefaultPredictionCollector(strategy, num_threads)
-        elif isinstance(strategy, OptimizedPredictionStrategy):
-            self.prediction_collector = OptimizedPredictionCollector(strategy, num_threads)
+        self.num_threads = num_threads
+        self.strategy = strategy
+        if hasattr(strategy, "precompute_prediction_values"):
+            self.prediction_collector = OptimizedPredictionCollector(strategy)
+        elif hasattr(strategy, "predict_batch"):
+            self.prediction_collector = None
         else:
             raise ValueError("Unknown prediction strategy type.")
 
@@ -22,16 +33,28 @@ class ForestPredictor:
         :param train_data: The training data used to train the forest.
         :param data: The data to predict.
         :param estimate_variance: Whether to estimate variance in predictions.
-        :param oob_prediction: Whether to make out-of-bag predictions.
-        :return: A list of predictions.
+        :param oob_prediction: Whether to make out-of-bag predictions, in which case data must be the training data.
+        :return: An array of shape (data.get_num_rows(), prediction_length), NaN for rows without any tree to
+                 predict from. With estimate_variance, a tuple of the predictions and the variance of each row.
         """
         if estimate_variance and forest.get_ci_group_size() <= 1:
             raise RuntimeError("To estimate variance during prediction, the forest must be trained with ci_group_size greater than 1.")
+        if estimate_variance and not hasattr(self.strategy, "compute_variance_batch"):
+            raise RuntimeError("The prediction strategy does not support variance estimates.")
+
+        samples = np.arange(data.get_num_rows())
+        leaf_nodes = SampleWeightComputer.get_leaf_nodes(forest, data, samples)
+        valid_trees = SampleWeightComputer.get_oob_trees(forest, samples) if oob_prediction else None
 
-        leaf_nodes_by_tree = self.tree_traverser.get_leaf_nodes(forest, data, oob_prediction)
-        trees_by_sample = self.tree_traverser.get_valid_trees_by_sample(forest, data, oob_prediction)
+        if self.prediction_collector is not None:
+            return self.prediction_collector.collect_predictions(forest, leaf_nodes, valid_trees)
 
-        return self.prediction_collector.collect_predictions(forest, train_data, data, leaf_nodes_by_tree, trees_by_sample, estimate_variance, oob_prediction)
+        weights = SampleWeightComputer.compute_weights(forest, leaf_nodes, train_data.get_num_rows(), valid_trees)
+        predictions = self.strategy.predict_batch(weights, train_data, data, samples)
+        if not estimate_variance:
+            return predictions
+        variances = self.strategy.compute_variance_batch(weights, forest, leaf_nodes, train_data, data, samples, valid_trees)
+        return predictions, variances
 
     def predict_oob(self, forest, data, estimate_variance=False):
         """
@@ -40,6 +63,26 @@ class ForestPredictor:
         :param forest: The Forest object.
         :param data: The data to predict.
         :param estimate_variance: Whether to estimate variance in predictions.
-        :return: A list of predictions.
+        :return: The predictions (and variances), as returned by predict.
         """
+        if self.prediction_collector is not None and not estimate_variance:
+            # Tree by tree, with each tree's out-of-bag rows read from its drawn sample bitset, so that no
+            # (rows x trees) leaf or mask array is built.
+            return self.prediction_collector.collect_oob_predictions(forest, data)
         return self.predict(forest, data, data, estimate_variance, True)
+
+    def get_sample_weights(self, forest, train_data, data, oob_prediction=False):
+        """
+        Compute the forest weights of every row of data, for strategies that predict from weights (such as
+        LocalLinearPredictionStrategy.predict_batch).
+
+        :param forest: The Forest object.
+        :param train_data: The training data used to train the forest.
+        :param data: The data to predict.
+        :param oob_prediction: Whether to use only the trees for which each row is out of bag.
+        :return: A scipy.sparse.csr_matrix of shape (data.get_num_rows(), train_data.get_num_rows()).
+        """
+        samples = range(data.get_num_rows())
+        leaf_nodes = SampleWeightComputer.get_leaf_nodes(forest, data, samples)
+        valid_trees = SampleWeightComputer.get_oob_trees(forest, samples) if oob_prediction else None
+        return SampleWeightComputer.compute_weights(forest, leaf_nodes, train_data.get_num_rows(), valid_trees)
@@ -0,0 +1,198 @@
+import json
+
+import numpy as np
+
+from forest.Forest import Forest
+from prediction.PredictionValues import PredictionValues
+from tree.Tree import Tree
+
+
+class ForestSerializer:
+    """
+    Reads and writes forests in a versioned binary format that can be memory-mapped.
+
+    The file starts with the magic bytes, the format version (a little-endian uint32) and the length of a JSON
+    header (a little-endian uint64). The header holds the forest metadata (num_variables, ci_group_size, num_trees)
+    and, for each section, its dtype, shape and byte offset. Sections are 64-byte aligned flat little-endian arrays
+    that concatenate the arrays of all trees, with per-tree offset arrays to slice them back:
+
+    - tree_num_nodes, root_nodes: one entry per tree.
+    - child_nodes (2 x total nodes), split_vars, split_values: sliced by node_offsets.
+    - send_missing_left_bits: sliced by bit_offsets.
+    - leaf_offsets: sliced by leaf_offset_offsets, relative to each tree's slice of leaf_members.
+    - leaf_members: sliced by member_offsets.
+    - drawn_sample_bits: the bitsets of the drawn samples (see Tree), sliced by drawn_offsets.
+    - leaf_value_types: one entry per tree, the number of statistics per node of the tree's PredictionValues,
+      or -1 if it has no prediction values.
+    - leaf_values: the PredictionValues sums, flattened row by row, sliced by leaf_value_offsets.
+    - leaf_counts: the PredictionValues counts, sliced by leaf_count_offsets.
+
+    Only arrays are stored, so reading a file never runs code from it. Files of other versions are rejected.
+
+    Trees read from a memory-mapped file hold read-only views into the mapping, so loading does not copy the
+    arrays and the pages are shared between processes that map the same file.
+    """
+
+    MAGIC = b"GRFPYFST"
+    VERSION = 3
+    ALIGNMENT = 64
+
+    @staticmethod
+    def get_sections(forest):
+        """
+        Build the sections of a forest, as lists of per-tree arrays to be concatenated.
+
+        :param forest: The Forest object.
+        :return: A dict from section name to (dtype, number of leading rows, list of per-tree arrays).
+        """
+        trees = forest.get_trees()
+        num_nodes = np.array([tree.get_num_nodes() for tree in trees], dtype=np.int64)
+        for tree in trees:
+            prediction_values = tree.get_prediction_values()
+            if prediction_values is not None and not isinstance(prediction_values, PredictionValues):
+                raise TypeError("Cannot serialize prediction values of type " + type(prediction_values).__name__ + ", only PredictionValues.")
+        # Trees without prediction values store empty leaf_values and leaf_counts slices.
+        has_leaf_values = [tree.get_prediction_values() is not None for tree in trees]
+        leaf_values = [tree.get_prediction_values() if has_values else PredictionValues(np.empty((0, 0)), np.empty(0))
+                       for tree, has_values in zip(trees, has_leaf_values)]
+        leaf_value_types = np.array([values.get_num_types() if has_values else -1 for values, has_values in zip(leaf_values, has_leaf_values)], dtype=np.int64)
+
+        def offsets(sizes):
+            result = np.zeros(len(trees) + 1, dtype=np.int64)
+            np.cumsum(np.asarray(sizes, dtype=np.int64), out=result[1:])
+            return [result]
+
+        return {
+            "tree_num_nodes": (np.int64, None, [num_nodes]),
+            "root_nodes": (np.int64, None, [np.array([tree.get_root_node() for tree in trees], dtype=np.int64)]),
+            "node_offsets": (np.int64, None, offsets(num_nodes)),
+            "child_nodes": (np.int32, 2, [tree.get_child_nodes() for tree in trees]),
+            "split_vars": (np.int32, None, [tree.get_split_vars() for tree in trees]),
+            "split_values": (np.float64, None, [tree.get_split_values() for tree in trees]),
+            "bit_offsets": (np.int64, None, offsets([len(tree.get_send_missing_left_bits()) for tree in trees])),
+            "send_missing_left_bits": (np.uint8, None, [tree.get_send_missing_left_bits() for tree in trees]),
+            "leaf_offset_offsets": (np.int64, None, offsets(num_nodes + 1)),
+            "leaf_offsets": (np.int64, None, [tree.get_leaf_offsets() for tree in trees]),
+            "member_offsets": (np.int64, None, offsets([len(tree.get_leaf_members()) for tree in trees])),
+            "leaf_members": (np.int32, None, [tree.get_leaf_members() for tree in trees]),
+            "drawn_offsets": (np.int64, None, offsets([len(tree.get_drawn_sample_bits()) for tree in trees])),
+            "drawn_sample_bits": (np.uint8, None, [tree.get_drawn_sample_bits() for tree in trees]),
+            "leaf_value_types": (np.int64, None, [leaf_value_types]),
+            "leaf_value_offsets": (np.int64, None, offsets([values.get_values().size for values in leaf_values])),
+            "leaf_values": (np.float64, None, [values.get_values().ravel() for values in leaf_values]),
+            "leaf_count_offsets": (np.int64, None, offsets([len(values.get_counts()) for values in leaf_values])),
+            "leaf_counts": (np.int64, None, [values.get_counts() for values in leaf_values]),
+        }
+
+    @staticmethod
+    def write(forest, file_name):
+        """
+        Write a forest to a file in one sequential pass.
+
+        :param forest: The Forest object.
+        :param file_name: The path of the file to write.
+        :raises TypeError: If a tree holds prediction values other than None or a PredictionValues.
+        """
+        sections = ForestSerializer.get_sections(forest)
+
+        # Lay out the sections before writing, so the header can be written first.
+        layout = {}
+        offset = 0
+        for name, (dtype, num_rows, arrays) in sections.items():
+            length = sum(array.shape[-1] for array in arrays)
+            shape = [length] if num_rows is None else [num_rows, length]
+            layout[name] = {"dtype": np.dtype(dtype).newbyteorder("<").str, "shape": shape, "offset": offset}
+            offset = ForestSerializer.align(offset + int(np.prod(shape)) * np.dtype(dtype).itemsize)
+
+        header = json.dumps({
+            "num_variables": int(forest.get_num_variables()),
+            "ci_group_size": int(forest.get_ci_group_size()),
+            "num_trees": len(forest.get_trees()),
+            "sections": layout,
+        }).encode("utf-8")
+        preamble_length = len(ForestSerializer.MAGIC) + 4 + 8 + len(header)
+        data_start = ForestSerializer.align(preamble_length)
+
+        with open(file_name, "wb") as file:
+            file.write(ForestSerializer.MAGIC)
+            file.write(np.array(ForestSerializer.VERSION, dtype="<u4").tobytes())
+            file.write(np.array(len(header), dtype="<u8").tobytes())
+            file.write(header)
+            file.write(b"\0" * (data_start - preamble_length))
+
+            position = 0
+            for name, (dtype, num_rows, arrays) in sections.items():
+                file.write(b"\0" * (layout[name]["offset"] - position))
+                position = layout[name]["offset"]
+                # Two-row sections are stored row by row, so each row is contiguous.
+                rows = [None] if num_rows is None else range(num_rows)
+                for row in rows:
+                    for array in arrays:
+                        chunk = np.ascontiguousarray(array if row is None else array[row], dtype=layout[name]["dtype"])
+                        file.write(chunk.tobytes())
+                        position += chunk.nbytes
+
+    @staticmethod
+    def align(offset):
+        """Round an offset up to the next multiple of ALIGNMENT."""
+        return -(-offset // ForestSerializer.ALIGNMENT) * ForestSerializer.ALIGNMENT
+
+    @staticmethod
+    def read(file_name, mmap=True):
+        """
+        Read a forest written by write.
+
+        :param file_name: The path of the file to read.
+        :param mmap: Whether to memory-map the file (read-only) instead of reading it into memory.
+        :return: A Forest object.
+        """
+        if mmap:
+            buffer = np.memmap(file_name, dtype=np.uint8, mode="r")
+        else:
+            buffer = np.fromfile(file_name, dtype=np.uint8)
+
+        magic_length = len(ForestSerializer.MAGIC)
+        if buffer[:magic_length].tobytes() != ForestSerializer.MAGIC:
+            raise RuntimeError("Not a forest file: " + str(file_name))
+        version = int(buffer[magic_length:magic_length + 4].view("<u4")[0])
+        if version != ForestSerializer.VERSION:
+            raise RuntimeError("Unsupported forest file version: " + str(version))
+        header_length = int(buffer[magic_length + 4:magic_length + 12].view("<u8")[0])
+        header_start = magic_length + 12
+        header = json.loads(buffer[header_start:header_start + header_length].tobytes().decode("utf-8"))
+        data_start = ForestSerializer.align(header_start + header_length)
+
+        sections = {}
+        for name, section in header["sections"].items():
+            dtype = np.dtype(section["dtype"])
+            start = data_start + section["offset"]
+            num_bytes = int(np.prod(section["shape"])) * dtype.itemsize
+            sections[name] = buffer[start:start + num_bytes].view(dtype).reshape(section["shape"])
+
+        trees = []
+        for t in range(header["num_trees"]):
+            node_start, node_end = sections["node_offsets"][t:t + 2]
+            bit_start, bit_end = sections["bit_offsets"][t:t + 2]
+            offset_start, offset_end = sections["leaf_offset_offsets"][t:t + 2]
+            member_start, member_end = sections["member_offsets"][t:t + 2]
+            drawn_start, drawn_end = sections["drawn_offsets"][t:t + 2]
+            prediction_values = None
+            if sections["leaf_value_types"][t] >= 0:
+                value_start, value_end = sections["leaf_value_offsets"][t:t + 2]
+                count_start, count_end = sections["leaf_count_offsets"][t:t + 2]
+                prediction_values = PredictionValues(
+                    sections["leaf_values"][value_start:value_end].reshape(-1, sections["leaf_value_types"][t]),
+                    sections["leaf_counts"][count_start:count_end])
+            trees.append(Tree.deserialize({
+                "root_node": int(sections["root_nodes"][t]),
+                "child_nodes": sections["child_nodes"][:, node_start:node_end],
+                "split_vars": sections["split_vars"][node_start:node_end],
+                "split_values": sections["split_values"][node_start:node_end],
+                "send_missing_left_bits": sections["send_missing_left_bits"][bit_start:bit_end],
+                "leaf_offsets": sections["leaf_offsets"][offset_start:offset_end],
+                "leaf_members": sections["leaf_members"][member_start:member_end],
+                "drawn_sample_bits": sections["drawn_sample_bits"][drawn_start:drawn_end],
+                "prediction_values": prediction_values,
+            }))
+
+        return Forest(trees, header["num_variables"], header["ci_group_size"])
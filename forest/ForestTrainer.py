@@ -1,13 +1,43 @@
 import concurrent.futures
 
-import random
-
 import numpy as np
 
+from data_ import utility
+from data_.Data import Data
 from forest.Forest import Forest
 from sampling.RandomSampler import RandomSampler
+from tree.Tree import Tree
+from tree.TrainingWorkspace import TrainingWorkspace
 from tree.TreeTrainer import TreeTrainer
 
+# State of a process-pool worker, set once by init_process_worker.
+_worker_state = {}
+
+
+def init_process_worker(forest_trainer, data_spec, options):
+    """
+    Initialize a process-pool worker: attach to the shared training data.
+
+    :param forest_trainer: The ForestTrainer to train trees with.
+    :param data_spec: The description of the shared data returned by Data.to_shared_memory.
+    :param options: The ForestOptions providing configuration for training.
+    """
+    data, segments = Data.from_shared_memory(data_spec)
+    _worker_state.update(forest_trainer=forest_trainer, data=data, segments=segments, options=options)
+
+
+def train_batch_in_process(start, num_trees):
+    """
+    Train a batch of trees in a process-pool worker.
+
+    :param start: The index of the first CI group of the batch.
+    :param num_trees: The number of CI groups in the batch.
+    :return: The trained trees, in their serialized form.
+    """
+    forest_trainer = _worker_state["forest_trainer"]
+    trees = forest_trainer.train_batch(start, num_trees, _worker_state["data"], _worker_state["options"])
+    return [tree.serialize() for tree in trees]
+
 
 class ForestTrainer:
     def __init__(self, relabeling_strategy, splitting_rule_factory, prediction_strategy):
@@ -21,6 +51,13 @@ class ForestTrainer:
         self.tree_trainer = TreeTrainer(relabeling_strategy, splitting_rule_factory, prediction_strategy)
 
     def train(self, data, options):
+        # The presorted index is computed once here and shared read-only by all trees.
+        if options.get_presort() and data.get_sorted_index() is None:
+            data.presort()
+        max_bins = options.get_tree_options().get_max_bins()
+        if max_bins is not None and not data.is_binned():
+            data.build_bins(max_bins)
+
         trees = self.train_trees(data, options)
 
         num_variables = data.get_num_cols() - len(data.get_disallowed_split_variables())
@@ -43,85 +80,94 @@ class ForestTrainer:
 
         # Calculate thread ranges for parallel execution
         num_groups = num_trees // options.get_ci_group_size()
-        thread_ranges = self.split_sequence(0, num_groups - 1, options.get_num_threads())
+        thread_ranges = utility.split_sequence(0, num_groups - 1, options.get_num_threads())
+        batches = [(start_index, thread_ranges[i + 1] - start_index) for i, start_index in enumerate(thread_ranges[:-1])]
 
+        # Batches are collected in order, so the forest does not depend on which worker finishes first.
         trees = []
-        with concurrent.futures.ThreadPoolExecutor(max_workers=options.get_num_threads()) as executor:
-            futures = [executor.submit(self.train_batch, start_index, thread_ranges[i + 1] - start_index, data, options)
-                       for i, start_index in enumerate(thread_ranges[:-1])]
-            for future in concurrent.futures.as_completed(futures):
-                trees.extend(future.result())
+        if options.get_backend() == "process":
+            data_spec, segments = data.to_shared_memory()
+            try:
+                with concurrent.futures.ProcessPoolExecutor(max_workers=options.get_num_threads(), initializer=init_process_worker, initargs=(self, data_spec, options)) as executor:
+                    futures = [executor.submit(train_batch_in_process, start_index, num_batch_trees) for start_index, num_batch_trees in batches]
+                    for future in futures:
+                        trees.extend(Tree.deserialize(serialized_tree) for serialized_tree in future.result())
+            finally:
+                for segment in segments:
+                    segment.close()
+                    segment.unlink()
+        else:
+            with concurrent.futures.ThreadPoolExecutor(max_workers=options.get_num_threads()) as executor:
+                futures = [executor.submit(self.train_batch, start_index, num_batch_trees, data, options) for start_index, num_batch_trees in batches]
+                for future in futures:
+                    trees.extend(future.result())
 
         return trees
 
-    def split_sequence(self, start, end, num_parts):
+    @staticmethod
+    def get_group_seed(random_seed, group):
         """
-        Split a sequence into roughly equal parts.
+        Derive the seed of one CI group (or tree) from the forest seed.
 
-        :param start: The starting index of the sequence.
-        :param end: The ending index of the sequence.
-        :param num_parts: The number of parts to split into.
-        :return: A list of indices marking the start of each part.
+        The seed only depends on the group index, so the trained forest is the same for any number of workers.
+
+        :param random_seed: The forest random seed.
+        :param group: The index of the CI group.
+        :return: The seed for the group's sampler.
         """
-        part_length = (end - start + 1) // num_parts
-        return [start + i * part_length for i in range(num_parts)] + [end + 1]
+        return int(np.random.SeedSequence([random_seed, group]).generate_state(1)[0])
 
     def train_batch(self, start, num_trees, data, options):
-        random.seed(options.get_random_seed() + start)
         trees = []
         ci_group_size = options.get_ci_group_size()
 
-        for _ in range(num_trees):
-            sampler = RandomSampler(random.randint(0, 2**32 - 1), options.get_sampling_options())
+        # Scratch buffers shared by all trees of the batch, which are trained by one worker.
+        workspace = TrainingWorkspace()
+
+        for group in range(start, start + num_trees):
+            sampler = RandomSampler(self.get_group_seed(options.get_random_seed(), group), options.get_sampling_options())
             if ci_group_size == 1:
-                tree = self.tree_trainer.train(data, sampler,options.get_tree_options())
+                tree = self.train_tree(data, sampler, options, workspace)
                 trees.append(tree)
             else:
-                group = self.train_ci_group(data, sampler, options)
-                trees.extend(group)
+                group_trees = self.train_ci_group(data, sampler, options, workspace)
+                trees.extend(group_trees)
         return trees
 
-    def train_tree(self, data, sampler, options):
+    def train_tree(self, data, sampler, options, workspace=None):
         """
         Train a single tree.
 
         :param data: The dataset used for training.
         :param sampler: The RandomSampler used for sampling data points.
         :param options: The ForestOptions providing configuration for training.
+        :param workspace: The TrainingWorkspace of the calling worker.
         :return: A trained Tree object.
         """
-        clusters = sampler.sample_clusters(data.get_num_rows(), options.get_sample_fraction())
-        return self.tree_trainer.train(data, sampler, clusters, options.get_tree_options())
+        clusters = []
+        sampler.sample_clusters(data.get_num_rows(), options.get_sample_fraction(), clusters)
+        return self.tree_trainer.train(data, sampler, clusters, options.get_tree_options(), workspace)
 
-    def train_ci_group(self, data, sampler, options):
+    def train_ci_group(self, data, sampler, options, workspace=None):
         """
         Train a group of trees for confidence interval estimation.
 
         :param data: The dataset used for training.
         :param sampler: The RandomSampler used for sampling data points.
         :param options: The ForestOptions providing configuration for training.
+        :param workspace: The TrainingWorkspace of the calling worker.
         :return: A list of trained Tree objects.
         """
         trees = []
 
-        num_rows = data.get_num_rows()
-        if num_rows is None:
-            raise ValueError("data.get_num_rows() returned None")
-
-        indices = np.arange(num_rows).tolist()
-
-        clusters = sampler.sample_clusters(num_rows, 0.5, indices)
-        if clusters is None:
-            raise ValueError("sampler.sample_clusters() returned None")
-
-        # indices = np.arange(data.get_num_rows()).tolist()
-        # clusters = sampler.sample_clusters(data.get_num_rows(), 0.5, indices)
+        clusters = []
+        sampler.sample_clusters(data.get_num_rows(), 0.5, clusters)
         sample_fraction = options.get_sample_fraction()
 
         for _ in range(options.get_ci_group_size()):
-            subsamples = np.random.choice(indices, size=int(len(indices) * sample_fraction * 2), replace=False).tolist()
-            cluster_subsample = sampler.subsample(clusters, sample_fraction * 2, subsamples)
-            tree = self.tree_trainer.train(data, sampler, cluster_subsample, options.get_tree_options())
+            cluster_subsample = []
+            sampler.subsample(clusters, sample_fraction * 2, cluster_subsample)
+            tree = self.tree_trainer.train(data, sampler, cluster_subsample, options.get_tree_options(), workspace)
             trees.append(tree)
 
         return trees
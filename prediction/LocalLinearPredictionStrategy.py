@@ -1,6 +1,13 @@
 import numpy as np
+import scipy.sparse
 
 class LocalLinearPredictionStrategy:
+    """
+    Local linear regression predictions, with the forest weights as kernel weights.
+    """
+
+    MAX_BATCH_ELEMENTS = 1 << 22
+
     def __init__(self, lambdas, weight_penalty, linear_correction_variables):
         """
         Initialize a LocalLinearPredictionStrategy.
@@ -22,105 +29,323 @@ class LocalLinearPredictionStrategy:
         return len(self.lambdas)
 
     def predict(self, sampleID, weights_by_sampleID, train_data, data):
-        num_variables = len(self.linear_correction_variables)
-        num_nonzero_weights = len(weights_by_sampleID)
-
-        indices = list(weights_by_sampleID.keys())
-        weights_vec = np.array(list(weights_by_sampleID.values()))
-
-        X = np.ones((num_nonzero_weights, num_variables + 1))
-        Y = np.zeros((num_nonzero_weights, 1))
-
-        for i, index in enumerate(indices):
-            for j, var in enumerate(self.linear_correction_variables):
-                X[i, j + 1] = train_data.get(index, var) - data.get(sampleID, var)
-            Y[i] = train_data.get_outcome(index)
-
-        M_unpenalized = X.T @ np.diag(weights_vec) @ X
-
-        predictions = []
+        """
+        Predict for one sample from its forest weights.
 
-        for lambda_val in self.lambdas:
-            M = M_unpenalized.copy()
-            if not self.weight_penalty:
-                normalization = np.trace(M) / (num_variables + 1)
-                M[1:, 1:] += lambda_val * normalization
-            else:
-                for j in range(1, num_variables + 1):
-                    M[j, j] += lambda_val * M[j, j]
+        :param sampleID: The sample of data to predict.
+        :param weights_by_sampleID: A dict from training sample to its weight.
+        :param train_data: The training data.
+        :param data: The data holding the sample to predict.
+        :return: A list with one prediction per lambda.
+        """
+        weights = self.to_sparse_weights(weights_by_sampleID, train_data.get_num_rows())
+        return list(self.predict_batch(weights, train_data, data, [sampleID])[0])
 
-            local_coefficients = np.linalg.solve(M, X.T @ np.diag(weights_vec) @ Y)
-            predictions.append(local_coefficients[0, 0])
+    def predict_batch(self, weights, train_data, data, samples=None):
+        """
+        Predict for many samples at once from their forest weights.
+
+        For each sample, the normal equations of the weighted ridge regression of the outcome on [1, X - x] are
+        formed by scaling the rows of the design by the weights, and the systems of all samples and all lambdas
+        are solved in one stacked call. Samples are processed in batches, so that the per-weight outer products
+        and the stacked systems of a batch hold at most MAX_BATCH_ELEMENTS values.
+
+        :param weights: A sparse matrix of shape (len(samples), train_data.get_num_rows()), whose i-th row holds
+            the forest weights of samples[i].
+        :param train_data: The training data.
+        :param data: The data holding the samples to predict.
+        :param samples: The samples of data to predict (all rows of data by default).
+        :return: An array of shape (len(samples), number of lambdas). Samples without weights are NaN.
+        """
+        samples, weights = self.validate_batch(weights, train_data, data, samples)
+        lambdas = np.asarray(self.lambdas, dtype=np.float64)
+        sample_values = data.get_values_matrix(samples, self.linear_correction_variables)
 
+        predictions = np.full((len(samples), len(lambdas)), np.nan)
+        for start, end in self.get_batches(weights, len(lambdas)):
+            self.predict_rows(weights, start, end, sample_values, train_data, lambdas, predictions)
         return predictions
 
+    @staticmethod
+    def to_sparse_weights(weights_by_sampleID, num_train_rows):
+        """
+        Convert the weights of one sample to a one-row sparse matrix.
 
-
-    def compute_variance(self, sampleID, samples_by_tree, weights_by_sampleID, train_data, data, ci_group_size):
-        lambda_val = self.lambdas[0]
-
-        num_variables = len(self.linear_correction_variables)
+        :param weights_by_sampleID: A dict from training sample to its weight.
+        :param num_train_rows: The number of rows of the training data.
+        :return: A scipy.sparse.csr_matrix of shape (1, num_train_rows).
+        """
         num_nonzero_weights = len(weights_by_sampleID)
+        indices = np.fromiter(weights_by_sampleID.keys(), dtype=np.int64, count=num_nonzero_weights)
+        weights_vec = np.fromiter(weights_by_sampleID.values(), dtype=np.float64, count=num_nonzero_weights)
+        return scipy.sparse.csr_matrix((weights_vec, indices, [0, num_nonzero_weights]), shape=(1, num_train_rows))
 
-        sample_index_map = {index: i for i, index in enumerate(weights_by_sampleID.keys())}
-        indices = list(sample_index_map.keys())
-        weights_vec = np.array(list(weights_by_sampleID.values()))
+    @staticmethod
+    def validate_batch(weights, train_data, data, samples):
+        """
+        Check the weights of a batch of samples and bring them to CSR form.
 
-        X = np.ones((num_nonzero_weights, num_variables + 1))
-        Y = np.zeros(num_nonzero_weights)
+        :param weights: A sparse matrix with one row per sample and one column per training sample.
+        :param train_data: The training data.
+        :param data: The data holding the samples.
+        :param samples: The samples of data, or None for all rows of data.
+        :return: A tuple of the samples, as an array, and the weights, as a CSR matrix with sorted and unique indices.
+        """
+        if samples is None:
+            samples = np.arange(data.get_num_rows())
+        samples = np.asarray(samples, dtype=np.intp)
+        weights = scipy.sparse.csr_matrix(weights, dtype=np.float64)
+        if weights.shape != (len(samples), train_data.get_num_rows()):
+            raise ValueError("The weights must have one row per sample and one column per training sample.")
+        weights.sum_duplicates()
+        return samples, weights
+
+    def get_batches(self, weights, num_lambdas):
+        """
+        Split the rows of the weights into batches whose outer products and stacked systems hold at most
+        MAX_BATCH_ELEMENTS values (a batch always holds at least one row).
 
-        for i, index in enumerate(indices):
-            X[i, 0] = 1
-            for j, var in enumerate(self.linear_correction_variables):
-                X[i, j + 1] = train_data.get(index, var) - data.get(sampleID, var)
-            Y[i] = train_data.get_outcome(index)
+        :param weights: The CSR weight matrix.
+        :param num_lambdas: The number of lambdas solved for per row.
+        :return: A list of (start, end) row ranges.
+        """
+        num_params = len(self.linear_correction_variables) + 1
+        max_entries = max(1, LocalLinearPredictionStrategy.MAX_BATCH_ELEMENTS // (num_params * num_params * (num_lambdas + 1)))
+        indptr = weights.indptr
+        num_rows = weights.shape[0]
+
+        batches = []
+        start = 0
+        while start < num_rows:
+            end = int(np.searchsorted(indptr, indptr[start] + max_entries, side="right")) - 1
+            end = min(max(end, start + 1), num_rows)
+            batches.append((start, end))
+            start = end
+        return batches
+
+    def get_normal_equations(self, weights, start, end, sample_values, train_data):
+        """
+        Form the unpenalized weighted normal equations of the samples of rows [start, end) of the weights.
+
+        :param weights: The CSR weight matrix, with sorted and unique indices.
+        :param start: The first row.
+        :param end: One past the last row.
+        :param sample_values: The linear correction variables of all samples, one row per row of weights.
+        :param train_data: The training data.
+        :return: A tuple of the rows with weights (relative to start), the row (an index into those rows) of
+            each weight, the centered design and the outcomes of each weight, and X'WX and X'WY of each row.
+        """
+        num_params = len(self.linear_correction_variables) + 1
+        first, last = weights.indptr[start], weights.indptr[end]
+        row_sizes = np.diff(weights.indptr[start:end + 1])
+        rows = np.flatnonzero(row_sizes)
+        entry_rows = np.repeat(np.arange(len(rows)), row_sizes[rows])
+
+        columns = weights.indices[first:last]
+        X = np.empty((last - first, num_params))
+        X[:, 0] = 1.0
+        train_data.get_values_matrix(columns, self.linear_correction_variables, out=X[:, 1:])
+        X[:, 1:] -= np.repeat(sample_values[start:end], row_sizes, axis=0)
+        weighted_X = X * weights.data[first:last, None]
+        Y = train_data.get_outcomes(columns)
+
+        if len(rows) == 0:
+            return rows, entry_rows, X, Y, np.empty((0, num_params, num_params)), np.empty((0, num_params))
+        row_starts = weights.indptr[start:end][rows] - first
+        M_unpenalized = np.add.reduceat(weighted_X[:, :, None] * X[:, None, :], row_starts)
+        XtWY = np.add.reduceat(weighted_X * Y[:, None], row_starts)
+        return rows, entry_rows, X, Y, M_unpenalized, XtWY
+
+    def penalize(self, M_unpenalized, lambdas):
+        """
+        Add the ridge penalty of each lambda to stacked normal equations.
 
-        M = X.T @ np.diag(weights_vec) @ X
+        :param M_unpenalized: The unpenalized X'WX, of shape (num_rows, num_params, num_params).
+        :param lambdas: The lambda values.
+        :return: The penalized matrices, of shape (num_rows, len(lambdas), num_params, num_params).
+        """
+        num_params = M_unpenalized.shape[-1]
+        M = np.repeat(M_unpenalized[:, None], len(lambdas), axis=1)
         if not self.weight_penalty:
-            normalization = np.trace(M) / (num_variables + 1)
-            M[1:, 1:] += lambda_val * normalization
+            normalization = np.trace(M_unpenalized, axis1=1, axis2=2) / num_params
+            M[:, :, 1:, 1:] += (normalization[:, None] * lambdas)[:, :, None, None]
         else:
-            for i in range(1, num_variables + 1):
-                M[i, i] += lambda_val * M[i, i]
+            diagonal = np.arange(1, num_params)
+            M[:, :, diagonal, diagonal] += lambdas[:, None] * M_unpenalized[:, None, diagonal, diagonal]
+        return M
+
+    def predict_rows(self, weights, start, end, sample_values, train_data, lambdas, predictions):
+        """
+        Predict for the samples of rows [start, end) of the weights.
+
+        :param weights: The CSR weight matrix, with sorted and unique indices.
+        :param start: The first row.
+        :param end: One past the last row.
+        :param sample_values: The linear correction variables of all samples, one row per row of weights.
+        :param train_data: The training data.
+        :param lambdas: The lambda values.
+        :param predictions: The array to write the predictions of the rows into.
+        """
+        rows, _, _, _, M_unpenalized, XtWY = self.get_normal_equations(weights, start, end, sample_values, train_data)
+        if len(rows) == 0:
+            return
 
-        theta = np.linalg.solve(M, X.T @ np.diag(weights_vec) @ Y)
+        M = self.penalize(M_unpenalized, lambdas)
+        local_coefficients = np.linalg.solve(M, np.broadcast_to(XtWY[:, None, :, None], M.shape[:3] + (1,)))
+        predictions[start + rows] = local_coefficients[:, :, 0, 0]
 
-        e_one = np.zeros(num_variables + 1)
+    def compute_variance(self, sampleID, samples_by_tree, weights_by_sampleID, train_data, data, ci_group_size):
+        """
+        Estimate the variance of the prediction of one sample, for the first lambda, from the groups of trees.
+
+        :param sampleID: The sample of data to predict.
+        :param samples_by_tree: The training samples of the sample's leaf in each tree (empty for unused trees).
+        :param weights_by_sampleID: A dict from training sample to its weight.
+        :param train_data: The training data.
+        :param data: The data holding the sample to predict.
+        :param ci_group_size: The number of trees per group.
+        :return: A list with the variance estimate.
+        """
+        weights = self.to_sparse_weights(weights_by_sampleID, train_data.get_num_rows())
+        leaf_sizes = np.fromiter((len(samples) for samples in samples_by_tree), dtype=np.int64, count=len(samples_by_tree))
+        pair_trees = np.repeat(np.arange(len(samples_by_tree)), leaf_sizes)
+        pair_samples = np.concatenate([np.asarray(samples, dtype=np.int64) for samples in samples_by_tree] + [np.empty(0, dtype=np.int64)])
+        pair_rows = np.zeros(len(pair_samples), dtype=np.int64)
+
+        sample_values = data.get_values_matrix([sampleID], self.linear_correction_variables)
+        variances = np.full(1, np.nan)
+        self.compute_variance_rows(weights, 0, 1, sample_values, train_data, pair_rows, pair_trees, pair_samples,
+                                   len(samples_by_tree), ci_group_size, variances)
+        return [variances[0]]
+
+    def compute_variance_batch(self, weights, forest, leaf_nodes, train_data, data, samples=None, valid_trees=None):
+        """
+        Estimate the variance of the predictions of many samples, for the first lambda, from the groups of trees.
+
+        The pseudo-residual means of every (sample, tree) pair are summed with one bincount over the flattened
+        pairs of a batch, and the group statistics of all samples are reduced at once on a
+        (samples, groups, ci_group_size) view.
+
+        :param weights: A sparse matrix of shape (len(samples), train_data.get_num_rows()) with the forest
+            weights of the samples, e.g. from SampleWeightComputer.compute_weights with the same leaf_nodes.
+        :param forest: The Forest object, trained with ci_group_size greater than 1.
+        :param leaf_nodes: An array of shape (len(samples), num_trees) with the leaf node of each sample in each tree.
+        :param train_data: The training data.
+        :param data: The data holding the samples to predict.
+        :param samples: The samples of data to predict (all rows of data by default).
+        :param valid_trees: An optional bool array of the shape of leaf_nodes, False for the trees to skip for a sample.
+        :return: An array with the variance estimate of each sample (NaN for samples without a complete group).
+        """
+        samples, weights = self.validate_batch(weights, train_data, data, samples)
+        trees = forest.get_trees()
+        leaf_nodes = np.asarray(leaf_nodes, dtype=np.intp).reshape(-1, len(trees))
+        sample_values = data.get_values_matrix(samples, self.linear_correction_variables)
+
+        variances = np.full(len(samples), np.nan)
+        for start, end in self.get_batches(weights, 1):
+            # The (row, tree, leaf sample) pairs of the batch, expanded from the trees' CSR leaf membership.
+            pair_rows, pair_trees, pair_samples = [], [], []
+            for t, tree in enumerate(trees):
+                leaf_offsets = tree.get_leaf_offsets()
+                leaves = leaf_nodes[start:end, t]
+                leaf_starts = leaf_offsets[leaves]
+                leaf_sizes = leaf_offsets[leaves + 1] - leaf_starts
+                if valid_trees is not None:
+                    leaf_sizes[~np.asarray(valid_trees[start:end, t], dtype=bool)] = 0
+                rows = np.flatnonzero(leaf_sizes)
+                if len(rows) == 0:
+                    continue
+                leaf_sizes = leaf_sizes[rows]
+                leaf_ends = np.cumsum(leaf_sizes)
+                positions = np.arange(leaf_ends[-1]) + np.repeat(leaf_starts[rows] - (leaf_ends - leaf_sizes), leaf_sizes)
+                pair_rows.append(np.repeat(rows, leaf_sizes))
+                pair_trees.append(np.full(leaf_ends[-1], t))
+                pair_samples.append(tree.get_leaf_members()[positions])
+
+            empty = [np.empty(0, dtype=np.int64)]
+            self.compute_variance_rows(weights, start, end, sample_values, train_data, np.concatenate(pair_rows + empty),
+                                       np.concatenate(pair_trees + empty), np.concatenate(pair_samples + empty),
+                                       len(trees), forest.get_ci_group_size(), variances)
+        return variances
+
+    def compute_variance_rows(self, weights, start, end, sample_values, train_data, pair_rows, pair_trees, pair_samples, num_trees, ci_group_size, variances):
+        """
+        Estimate the variances of the samples of rows [start, end) of the weights.
+
+        :param weights: The CSR weight matrix, with sorted and unique indices.
+        :param start: The first row.
+        :param end: One past the last row.
+        :param sample_values: The linear correction variables of all samples, one row per row of weights.
+        :param train_data: The training data.
+        :param pair_rows: The row (relative to start) of each (row, tree, leaf sample) pair.
+        :param pair_trees: The tree of each pair.
+        :param pair_samples: The training sample of each pair, which must have a weight in its row.
+        :param num_trees: The number of trees.
+        :param ci_group_size: The number of trees per group.
+        :param variances: The array to write the variances of the rows into.
+        """
+        rows, entry_rows, X, Y, M_unpenalized, XtWY = self.get_normal_equations(weights, start, end, sample_values, train_data)
+        if len(rows) == 0:
+            return
+        num_params = M_unpenalized.shape[-1]
+
+        M = self.penalize(M_unpenalized, np.asarray(self.lambdas[:1], dtype=np.float64))[:, 0]
+        theta = np.linalg.solve(M, XtWY[:, :, None])[:, :, 0]
+        e_one = np.zeros((num_params, 1))
         e_one[0] = 1.0
-        zeta = np.linalg.solve(M, e_one)
+        zeta = np.linalg.solve(M, np.broadcast_to(e_one, M.shape[:2] + (1,)))[:, :, 0]
 
-        X_times_zeta = X @ zeta
-        local_prediction = X @ theta
+        X_times_zeta = np.einsum("ij,ij->i", X, zeta[entry_rows])
+        local_prediction = np.einsum("ij,ij->i", X, theta[entry_rows])
         pseudo_residual = X_times_zeta * (Y - local_prediction)
 
-        num_good_groups = 0
-        psi_squared = psi_grouped_squared = avg_score = 0
-
-        for group in range(len(samples_by_tree) // ci_group_size):
-            good_group = all(len(samples_by_tree[group * ci_group_size + j]) > 0 for j in range(ci_group_size))
-            if not good_group:
-                continue
-
-            num_good_groups += 1
-            group_psi = 0
-
-            for j in range(ci_group_size):
-                b = group * ci_group_size + j
-                psi_1 = sum(pseudo_residual[sample_index_map[sample]] for sample in samples_by_tree[b]) / len(samples_by_tree[b])
-                psi_squared += psi_1 * psi_1
-                group_psi += psi_1
-
-            group_psi /= ci_group_size
-            psi_grouped_squared += group_psi * group_psi
-            avg_score += group_psi
+        # Find each pair's weight: the weights of a row are sorted by training sample and the rows are in order.
+        num_train_rows = weights.shape[1]
+        first, last = weights.indptr[start], weights.indptr[end]
+        entry_keys = rows[entry_rows].astype(np.int64) * num_train_rows + weights.indices[first:last]
+        pair_keys = np.asarray(pair_rows, dtype=np.int64) * num_train_rows + pair_samples
+        entries = np.minimum(np.searchsorted(entry_keys, pair_keys), len(entry_keys) - 1)
+        if np.any(entry_keys[entries] != pair_keys):
+            raise ValueError("Every sample of a leaf must have a weight.")
+
+        num_rows = end - start
+        pairs = pair_rows * num_trees + pair_trees
+        psi_sums = np.bincount(pairs, weights=pseudo_residual[entries], minlength=num_rows * num_trees).reshape(num_rows, num_trees)
+        leaf_sizes = np.bincount(pairs, minlength=num_rows * num_trees).reshape(num_rows, num_trees)
+        variances[start + rows] = self.compute_group_variance(psi_sums[rows], leaf_sizes[rows], ci_group_size)
+
+    @staticmethod
+    def compute_group_variance(psi_sums, leaf_sizes, ci_group_size):
+        """
+        Estimate variances from the pseudo-residuals of the trees, grouped ci_group_size trees at a time.
 
-        avg_score /= num_good_groups
-        var_between = psi_grouped_squared / num_good_groups - avg_score * avg_score
-        var_total = psi_squared / (num_good_groups * ci_group_size) - avg_score * avg_score
-        group_noise = (var_total - var_between) / (ci_group_size - 1)
+        :param psi_sums: The sum of the pseudo-residuals of each sample's leaf in each tree, of shape (num_samples, num_trees).
+        :param leaf_sizes: The size of each sample's leaf in each tree (0 for unused trees), of the same shape.
+        :param ci_group_size: The number of trees per group. Groups with an empty leaf are left out.
+        :return: An array with the variance estimate of each sample.
+        """
+        num_samples, num_trees = psi_sums.shape
+        num_groups = num_trees // ci_group_size
+        group_shape = (num_samples, num_groups, ci_group_size)
+        leaf_sizes = leaf_sizes[:, :num_groups * ci_group_size].reshape(group_shape)
+
+        good_groups = np.all(leaf_sizes > 0, axis=2)
+        psi = psi_sums[:, :num_groups * ci_group_size].reshape(group_shape) / np.maximum(leaf_sizes, 1)
+        psi[~good_groups] = 0.0
+        num_good_groups = np.count_nonzero(good_groups, axis=1)
+
+        group_psi = psi.mean(axis=2)
+        psi_squared = np.sum(psi * psi, axis=(1, 2))
+        psi_grouped_squared = np.sum(group_psi * group_psi, axis=1)
+
+        with np.errstate(divide="ignore", invalid="ignore"):
+            avg_score = group_psi.sum(axis=1) / num_good_groups
+            var_between = psi_grouped_squared / num_good_groups - avg_score * avg_score
+            var_total = psi_squared / (num_good_groups * ci_group_size) - avg_score * avg_score
+            group_noise = (var_total - var_between) / (ci_group_size - 1)
 
         # Placeholder for bayes_debiaser.debias
         # var_debiased = bayes_debiaser.debias(var_between, group_noise, num_good_groups)
         var_debiased = var_between - group_noise  # Simplified version
 
-        return [var_debiased]
+        return var_debiased
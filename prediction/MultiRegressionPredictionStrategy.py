@@ -0,0 +1,66 @@
+import numpy as np
+
+from prediction.PredictionValues import PredictionValues
+
+
+class MultiRegressionPredictionStrategy:
+    """
+    Predicts the weighted mean of each outcome, from the weighted outcome sums and the weight sum of each leaf.
+    The statistics of a leaf are laid out as [weighted sum of outcome 0, ..., weighted sum of outcome k - 1, weight sum].
+    """
+
+    def __init__(self, num_outcomes):
+        """
+        Initialize a MultiRegressionPredictionStrategy.
+
+        :param num_outcomes: The number of outcomes.
+        """
+        self.num_outcomes = num_outcomes
+
+    def prediction_length(self):
+        """
+        Get the length of the prediction vector.
+
+        :return: The number of outcomes.
+        """
+        return self.num_outcomes
+
+    def prediction_value_length(self):
+        """
+        Get the number of statistics precomputed per leaf.
+
+        :return: The number of outcomes plus one, for the weight sum.
+        """
+        return self.num_outcomes + 1
+
+    def precompute_prediction_values(self, leaf_samples, data):
+        """
+        Sum the weighted outcomes and the weights of the samples of each leaf.
+
+        :param leaf_samples: A list of samples for each node.
+        :param data: The training data.
+        :return: A PredictionValues object.
+        """
+        def sample_values(samples):
+            weights = data.get_weights(samples)
+            return np.column_stack((weights[:, None] * data.get_outcome_matrix(samples), weights))
+
+        return PredictionValues.from_leaf_samples(leaf_samples, sample_values)
+
+    def predict(self, average):
+        """
+        Predict from the leaf statistics of one sample, averaged over trees.
+
+        :param average: The averaged statistics.
+        :return: A list with one prediction per outcome.
+        """
+        return list(np.asarray(average[:self.num_outcomes]) / average[self.num_outcomes])
+
+    def predict_batch(self, averages):
+        """
+        Predict from the averaged leaf statistics of many samples.
+
+        :param averages: An array of shape (num_samples, num_outcomes + 1).
+        :return: An array of shape (num_samples, num_outcomes).
+        """
+        return averages[:, :self.num_outcomes] / averages[:, [self.num_outcomes]]
@@ -0,0 +1,94 @@
+import numpy as np
+
+
+class OptimizedPredictionCollector:
+    """
+    Collects predictions from the statistics each tree precomputed for its leaves (see PredictionValues).
+
+    For every sample, the per-sample means of the statistics of its leaf in each tree are gathered and averaged
+    over the trees, and the strategy turns the averages into predictions. The cost per sample is one gather
+    per tree, whatever the size of the leaves, and the training data is not needed.
+    """
+
+    def __init__(self, strategy):
+        """
+        Initialize an OptimizedPredictionCollector.
+
+        :param strategy: A prediction strategy with precompute_prediction_values and predict_batch.
+        """
+        self.strategy = strategy
+
+    def collect_predictions(self, forest, leaf_nodes, valid_trees=None):
+        """
+        Predict for a batch of samples.
+
+        :param forest: The Forest object, whose trees hold PredictionValues.
+        :param leaf_nodes: An array of shape (num_samples, num_trees) with the leaf node of each sample in each
+            tree, as returned by SampleWeightComputer.get_leaf_nodes.
+        :param valid_trees: An optional bool array of the shape of leaf_nodes, False for the trees to skip for a
+            sample (e.g. from SampleWeightComputer.get_oob_trees for out-of-bag predictions).
+        :return: An array of shape (num_samples, prediction_length). Samples whose leaves are all empty (or
+            skipped) are NaN.
+        """
+        trees = forest.get_trees()
+        leaf_nodes = np.asarray(leaf_nodes, dtype=np.intp).reshape(-1, len(trees))
+        num_samples = leaf_nodes.shape[0]
+
+        sums = np.zeros((num_samples, self.strategy.prediction_value_length()))
+        num_trees = np.zeros(num_samples, dtype=np.int64)
+        for t, tree in enumerate(trees):
+            used = None if valid_trees is None else np.asarray(valid_trees[:, t], dtype=bool)
+            self.add_tree(tree, leaf_nodes[:, t], used, sums, num_trees)
+        return self.predict_from_sums(sums, num_trees)
+
+    def collect_oob_predictions(self, forest, data):
+        """
+        Predict every row of the training data from the trees for which it is out of bag.
+
+        The forest is traversed one tree at a time for all rows, and the out-of-bag mask of each tree is read
+        from its drawn sample bitset, so memory grows with the number of rows, not rows times trees.
+
+        :param forest: The Forest object, whose trees hold PredictionValues.
+        :param data: The training data.
+        :return: An array of shape (num_rows, prediction_length). Rows that are in bag for every tree are NaN.
+        """
+        samples = np.arange(data.get_num_rows())
+        sums = np.zeros((len(samples), self.strategy.prediction_value_length()))
+        num_trees = np.zeros(len(samples), dtype=np.int64)
+        for tree in forest.get_trees():
+            self.add_tree(tree, tree.find_leaf_nodes(data, samples), ~tree.is_drawn(samples), sums, num_trees)
+        return self.predict_from_sums(sums, num_trees)
+
+    def add_tree(self, tree, leaves, used, sums, num_trees):
+        """
+        Add the per-sample means of the statistics of one tree's leaves to the running sums.
+
+        :param tree: The tree, holding PredictionValues.
+        :param leaves: The leaf node of each sample.
+        :param used: An optional bool array, False for the samples the tree must not be used for.
+        :param sums: The running sums of the statistics, of shape (num_samples, prediction_value_length).
+        :param num_trees: The running number of trees used for each sample.
+        """
+        prediction_values = tree.get_prediction_values()
+        if prediction_values is None:
+            raise RuntimeError("The trees of the forest must be trained with a prediction strategy that precomputes prediction values.")
+
+        counts = prediction_values.get_counts()[leaves]
+        used = counts > 0 if used is None else used & (counts > 0)
+        used = np.flatnonzero(used)
+
+        sums[used] += prediction_values.get_values()[leaves[used]] / counts[used, None]
+        num_trees[used] += 1
+
+    def predict_from_sums(self, sums, num_trees):
+        """
+        Average the statistics over trees and turn them into predictions.
+
+        :param sums: The sums of the statistics, of shape (num_samples, prediction_value_length).
+        :param num_trees: The number of trees used for each sample.
+        :return: An array of shape (num_samples, prediction_length), NaN for samples without trees.
+        """
+        predictions = np.full((len(num_trees), self.strategy.prediction_length()), np.nan)
+        has_trees = num_trees > 0
+        predictions[has_trees] = self.strategy.predict_batch(sums[has_trees] / num_trees[has_trees, None])
+        return predictions
@@ -0,0 +1,81 @@
+import numpy as np
+
+
+class PredictionValues:
+    """
+    Per-node sufficient statistics precomputed by a prediction strategy, so that predicting does not need the
+    training samples of the leaves.
+
+    The statistics are held in a dense (num_nodes, num_types) float64 array of sums over each node's samples,
+    and the number of samples of each node in an int64 array. Nodes without samples (internal or empty nodes)
+    have a count of 0 and sums of 0.
+    """
+
+    __slots__ = ("values", "counts")
+
+    def __init__(self, values, counts):
+        """
+        Initialize a PredictionValues object.
+
+        :param values: The sums of each type of statistic, of shape (num_nodes, num_types).
+        :param counts: The number of samples of each node, of length num_nodes.
+        """
+        self.values = np.asarray(values, dtype=np.float64)
+        self.counts = np.asarray(counts, dtype=np.int64)
+
+    @classmethod
+    def from_leaf_samples(cls, leaf_samples, sample_values):
+        """
+        Sum per-sample statistics over the samples of each node.
+
+        :param leaf_samples: A list of samples for each node.
+        :param sample_values: A function from an array of samples to a (len(samples), num_types) array of their
+            statistics.
+        :return: A PredictionValues object.
+        """
+        counts = np.fromiter((len(samples) for samples in leaf_samples), dtype=np.int64, count=len(leaf_samples))
+        nonempty = np.flatnonzero(counts)
+        samples = np.concatenate([leaf_samples[node] for node in nonempty]) if len(nonempty) > 0 else np.empty(0, dtype=np.intp)
+        statistics = np.asarray(sample_values(samples), dtype=np.float64)
+
+        values = np.zeros((len(leaf_samples), statistics.shape[1]))
+        if len(nonempty) > 0:
+            starts = np.zeros(len(nonempty), dtype=np.int64)
+            np.cumsum(counts[nonempty][:-1], out=starts[1:])
+            values[nonempty] = np.add.reduceat(statistics, starts)
+        return cls(values, counts)
+
+    def get_values(self):
+        """Get the sums of the statistics, as a (num_nodes, num_types) array."""
+        return self.values
+
+    def get_counts(self):
+        """Get the number of samples of each node."""
+        return self.counts
+
+    def get_num_nodes(self):
+        """Get the number of nodes."""
+        return self.values.shape[0]
+
+    def get_num_types(self):
+        """Get the number of statistics per node."""
+        return self.values.shape[1]
+
+    def get(self, node, type):
+        """
+        Get one statistic of a node.
+
+        :param node: The node index.
+        :param type: The index of the statistic.
+        :return: The sum of the statistic over the node's samples.
+        """
+        return self.values[node, type]
+
+    def empty(self, node):
+        """
+        Check whether a node has no samples.
+
+        :param node: The node index.
+        :return: True if the node has no samples.
+        """
+        return self.counts[node] == 0
@@ -0,0 +1,60 @@
+import numpy as np
+
+from prediction.PredictionValues import PredictionValues
+
+
+class RegressionPredictionStrategy:
+    """
+    Predicts the weighted mean outcome, from the weighted outcome sum and the weight sum of each leaf.
+    """
+
+    OUTCOME = 0
+    WEIGHT = 1
+
+    def prediction_length(self):
+        """
+        Get the length of the prediction vector.
+
+        :return: 1.
+        """
+        return 1
+
+    def prediction_value_length(self):
+        """
+        Get the number of statistics precomputed per leaf.
+
+        :return: 2, the weighted outcome sum and the weight sum.
+        """
+        return 2
+
+    def precompute_prediction_values(self, leaf_samples, data):
+        """
+        Sum the weighted outcomes and the weights of the samples of each leaf.
+
+        :param leaf_samples: A list of samples for each node.
+        :param data: The training data.
+        :return: A PredictionValues object.
+        """
+        def sample_values(samples):
+            weights = data.get_weights(samples)
+            return np.column_stack((weights * data.get_outcomes(samples), weights))
+
+        return PredictionValues.from_leaf_samples(leaf_samples, sample_values)
+
+    def predict(self, average):
+        """
+        Predict from the leaf statistics of one sample, averaged over trees.
+
+        :param average: The averaged statistics, indexed by OUTCOME and WEIGHT.
+        :return: A list with the prediction.
+        """
+        return [average[RegressionPredictionStrategy.OUTCOME] / average[RegressionPredictionStrategy.WEIGHT]]
+
+    def predict_batch(self, averages):
+        """
+        Predict from the averaged leaf statistics of many samples.
+
+        :param averages: An array of shape (num_samples, 2).
+        :return: An array of shape (num_samples, 1).
+        """
+        return averages[:, [RegressionPredictionStrategy.OUTCOME]] / averages[:, [RegressionPredictionStrategy.WEIGHT]]
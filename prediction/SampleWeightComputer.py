@@ -0,0 +1,126 @@
+import numpy as np
+import scipy.sparse
+
+
+class SampleWeightComputer:
+    """
+    Computes forest weights as a sparse (query sample x training sample) matrix.
+
+    Each tree gives the training samples in a query's leaf a weight of one over the leaf size; the weights are
+    summed over the trees and each query's weights are normalized to sum to one. The matrix is built from the
+    trees' CSR leaf membership, in batches of queries, without Python loops over queries or leaf samples.
+    """
+
+    MAX_BATCH_ENTRIES = 1 << 24
+
+    @staticmethod
+    def get_leaf_nodes(forest, data, samples=None):
+        """
+        Find the leaf of every tree for a batch of samples.
+
+        :param forest: The Forest object.
+        :param data: The data holding the samples.
+        :param samples: The samples to route (all rows of data by default).
+        :return: An int32 array of shape (len(samples), num_trees) with the leaf node of each sample in each tree.
+        """
+        if samples is None:
+            samples = np.arange(data.get_num_rows())
+        samples = np.asarray(samples, dtype=np.intp)
+        leaf_nodes = np.empty((len(samples), len(forest.get_trees())), dtype=np.int32)
+        for t, tree in enumerate(forest.get_trees()):
+            leaf_nodes[:, t] = tree.find_leaf_nodes(data, samples)[samples]
+        return leaf_nodes
+
+    @staticmethod
+    def get_oob_trees(forest, samples):
+        """
+        Find the trees for which each sample is out of bag, i.e. was not drawn to train the tree.
+
+        :param forest: The Forest object.
+        :param samples: The training samples.
+        :return: A bool array of shape (len(samples), num_trees), True where the tree may be used for the sample.
+        """
+        samples = np.asarray(samples, dtype=np.intp)
+        valid_trees = np.empty((len(samples), len(forest.get_trees())), dtype=bool)
+        for t, tree in enumerate(forest.get_trees()):
+            valid_trees[:, t] = ~tree.is_drawn(samples)
+        return valid_trees
+
+    @staticmethod
+    def compute_weights(forest, leaf_nodes, num_train_rows, valid_trees=None):
+        """
+        Compute the forest weights of a batch of query samples.
+
+        :param forest: The Forest object, whose trees hold the leaf samples.
+        :param leaf_nodes: An array of shape (num_queries, num_trees) with the leaf node of each query in each tree,
+            as returned by get_leaf_nodes or CompiledForest.find_leaf_nodes.
+        :param num_train_rows: The number of rows of the training data.
+        :param valid_trees: An optional bool array of the shape of leaf_nodes, False for the trees to skip for a
+            query (e.g. from get_oob_trees for out-of-bag weights).
+        :return: A scipy.sparse.csr_matrix of shape (num_queries, num_train_rows), with sorted indices. Queries
+            whose leaves are all empty (or skipped) have an empty row.
+        """
+        trees = forest.get_trees()
+        leaf_nodes = np.asarray(leaf_nodes, dtype=np.intp).reshape(-1, len(trees))
+        num_queries = leaf_nodes.shape[0]
+
+        leaf_starts = np.empty(leaf_nodes.shape, dtype=np.int64)
+        leaf_sizes = np.empty(leaf_nodes.shape, dtype=np.int64)
+        for t, tree in enumerate(trees):
+            leaf_offsets = tree.get_leaf_offsets()
+            leaf_starts[:, t] = leaf_offsets[leaf_nodes[:, t]]
+            leaf_sizes[:, t] = leaf_offsets[leaf_nodes[:, t] + 1] - leaf_starts[:, t]
+        if valid_trees is not None:
+            leaf_sizes[~np.asarray(valid_trees, dtype=bool)] = 0
+
+        # Split the queries into batches of at most MAX_BATCH_ENTRIES (query, leaf sample) pairs.
+        entry_offsets = np.zeros(num_queries + 1, dtype=np.int64)
+        np.cumsum(leaf_sizes.sum(axis=1), out=entry_offsets[1:])
+        batches = []
+        start = 0
+        while start < num_queries:
+            end = int(np.searchsorted(entry_offsets, entry_offsets[start] + SampleWeightComputer.MAX_BATCH_ENTRIES, side="right")) - 1
+            end = min(max(end, start + 1), num_queries)
+            batches.append(SampleWeightComputer.compute_batch_weights(trees, leaf_starts[start:end], leaf_sizes[start:end], num_train_rows))
+            start = end
+
+        if len(batches) == 0:
+            return scipy.sparse.csr_matrix((0, num_train_rows))
+        return scipy.sparse.vstack(batches, format="csr")
+
+    @staticmethod
+    def compute_batch_weights(trees, leaf_starts, leaf_sizes, num_train_rows):
+        """
+        Compute the forest weights of one batch of queries.
+
+        :param trees: The trees of the forest.
+        :param leaf_starts: The offset of each query's leaf in each tree's leaf members, of shape (num_queries, num_trees).
+        :param leaf_sizes: The size of each query's leaf in each tree (0 to skip the tree), of the same shape.
+        :param num_train_rows: The number of rows of the training data.
+        :return: A scipy.sparse.csr_matrix of shape (num_queries, num_train_rows).
+        """
+        num_queries = leaf_sizes.shape[0]
+        rows, columns, values = [], [], []
+        for t, tree in enumerate(trees):
+            sizes = leaf_sizes[:, t]
+            queries = np.flatnonzero(sizes)
+            if len(queries) == 0:
+                continue
+            sizes = sizes[queries]
+            # The members of each query's leaf: leaf start plus 0, 1, ..., size - 1.
+            ends = np.cumsum(sizes)
+            positions = np.arange(ends[-1]) + np.repeat(leaf_starts[queries, t] - (ends - sizes), sizes)
+            rows.append(np.repeat(queries, sizes))
+            columns.append(tree.get_leaf_members()[positions])
+            values.append(np.repeat(1.0 / sizes, sizes))
+
+        if len(rows) == 0:
+            return scipy.sparse.csr_matrix((num_queries, num_train_rows))
+        weights = scipy.sparse.csr_matrix((np.concatenate(values), (np.concatenate(rows), np.concatenate(columns))),
+                                          shape=(num_queries, num_train_rows))
+        weights.sum_duplicates()
+
+        row_sums = np.asarray(weights.sum(axis=1)).ravel()
+        row_sums[row_sums == 0] = 1.0
+        weights.data /= np.repeat(row_sums, np.diff(weights.indptr))
+        return weights
@@ -1,3 +1,5 @@
+import copy
+
 import numpy as np
 
 class LLRegressionRelabelingStrategy:
@@ -17,34 +19,127 @@ class LLRegressionRelabelingStrategy:
         self.ll_split_cutoff = ll_split_cutoff
         self.ll_split_variables = ll_split_variables
 
-    def relabel(self, samples, data, responses_by_sample):
+        # Per-node sufficient statistics (X'X, X'Y) of the tree being trained, kept until the node is split,
+        # and the designs gathered for children before they are relabeled.
+        self.node_statistics = {}
+        self.node_designs = {}
+
+    def clone(self):
+        """
+        Create a copy of the strategy with an empty statistics cache, for training one tree.
+
+        :return: A LLRegressionRelabelingStrategy.
+        """
+        strategy = copy.copy(self)
+        strategy.node_statistics = {}
+        strategy.node_designs = {}
+        return strategy
+
+    def get_response_length(self):
+        """Get the number of responses per sample."""
+        return 1
+
+    def get_design(self, samples, data):
+        """
+        Gather the regression design of a set of samples: an intercept column and the split variables.
+
+        :param samples: The sample indices.
+        :param data: The training data.
+        :return: A float64 array of shape (len(samples), num_variables + 1).
+        """
+        X = np.empty((len(samples), len(self.ll_split_variables) + 1), order='F')
+        X[:, 0] = 1.0
+        data.get_values_matrix(samples, self.ll_split_variables, out=X[:, 1:])
+        return X
+
+    def set_children(self, node, left_child, right_child, samples, data, min_node_size=0):
+        """
+        Derive the statistics of a split node's children: only the smaller child is accumulated from its
+        samples, the larger one is the parent's statistics minus the smaller one's. The smaller child's
+        design is kept for its relabeling, so it is gathered only once.
+
+        Children of at most min_node_size samples are leaves that are never relabeled, so nothing is kept
+        for them, and nothing is computed if both are.
+
+        :param node: The index of the split node.
+        :param left_child: The index of the left child.
+        :param right_child: The index of the right child.
+        :param samples: The NodeSamples holding the samples of each node, already partitioned.
+        :param data: The training data.
+        :param min_node_size: The size at or below which a node is not split.
+        """
+        parent_statistics = self.node_statistics.pop(node, None)
+        if parent_statistics is None:
+            return
+
+        if len(samples[left_child]) <= len(samples[right_child]):
+            small_child, large_child = left_child, right_child
+        else:
+            small_child, large_child = right_child, left_child
+        # Children below the cutoff use the overall coefficients and need no statistics.
+        if len(samples[large_child]) < self.ll_split_cutoff or len(samples[large_child]) <= min_node_size:
+            return
+
+        X = self.get_design(samples[small_child], data)
+        small_gram = X.T @ X
+        small_xty = X.T @ data.get_outcomes(samples[small_child])
+        parent_gram, parent_xty = parent_statistics
+        self.node_statistics[large_child] = (parent_gram - small_gram, parent_xty - small_xty)
+        if len(samples[small_child]) <= min_node_size:
+            return
+        self.node_designs[small_child] = X
+        if len(samples[small_child]) >= self.ll_split_cutoff:
+            self.node_statistics[small_child] = (small_gram, small_xty)
+
+    def set_leaf(self, node):
+        """
+        Drop the statistics and design kept for a node that is final as a leaf.
+
+        :param node: The index of the leaf.
+        """
+        self.node_statistics.pop(node, None)
+        self.node_designs.pop(node, None)
+
+    def relabel(self, samples, positions, data, responses_by_sample, node=None):
+        """
+        Set the responses of a node's samples to the residuals of a ridge regression fitted on the node.
+
+        :param samples: The samples of the node.
+        :param positions: The positions of the samples among the tree's samples (see NodeSamples.get_positions).
+        :param data: The training data.
+        :param responses_by_sample: The responses of the tree's samples, one row per position, updated in place.
+        :param node: The index of the node, used to look up statistics derived from its parent.
+        :return: False, as relabeling never stops the split.
+        """
         num_variables = len(self.ll_split_variables)
         num_data_points = len(samples)
 
-        X = np.ones((num_data_points, num_variables + 1))
-        Y = np.array([data.get_outcome(sample) for sample in samples])
-
-        for i, sample in enumerate(samples):
-            for j, var in enumerate(self.ll_split_variables):
-                X[i, j + 1] = data.get(sample, var)
+        X = self.node_designs.pop(node, None)
+        if X is None:
+            X = self.get_design(samples, data)
+        Y = data.get_outcomes(samples)
 
         if num_data_points < self.ll_split_cutoff:
             leaf_predictions = X @ self.overall_beta
         else:
-            M = X.T @ X
+            statistics = self.node_statistics.get(node)
+            if statistics is None:
+                statistics = (X.T @ X, X.T @ Y)
+            if node is not None:
+                self.node_statistics[node] = statistics
+            gram, xty = statistics
+
+            M = gram.copy()
             if self.weight_penalty:
-                for j in range(1, num_variables + 1):
-                    M[j, j] += self.split_lambda * M[j, j]
+                diagonal = np.arange(1, num_variables + 1)
+                M[diagonal, diagonal] += self.split_lambda * M[diagonal, diagonal]
             else:
                 normalization = np.trace(M) / (num_variables + 1)
                 M[1:, 1:] += self.split_lambda * normalization
 
-            local_coefficients = np.linalg.solve(M, X.T @ Y)
+            local_coefficients = np.linalg.solve(M, xty)
             leaf_predictions = X @ local_coefficients
 
-        for i, sample in enumerate(samples):
-            prediction = leaf_predictions[i]
-            residual = prediction - data.get_outcome(sample)
-            responses_by_sample[sample, 0] = residual
+        responses_by_sample[positions, 0] = leaf_predictions - Y
 
         return False
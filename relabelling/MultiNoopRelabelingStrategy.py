@@ -0,0 +1,34 @@
+class MultiNoopRelabelingStrategy:
+    """
+    A relabeling strategy that uses the outcomes themselves as responses, as in multi-regression forests.
+    """
+
+    def __init__(self, num_outcomes):
+        """
+        Initialize a MultiNoopRelabelingStrategy.
+
+        :param num_outcomes: The number of outcomes.
+        """
+        self.num_outcomes = num_outcomes
+
+    def relabel(self, samples, positions, data, responses_by_sample, node=None):
+        """
+        Set the responses of the given samples to their outcomes.
+
+        :param samples: The samples of the node.
+        :param positions: The positions of the samples among the tree's samples (see NodeSamples.get_positions).
+        :param data: The data used for training the tree.
+        :param responses_by_sample: The responses of the tree's samples, one row per position, updated in place.
+        :param node: The index of the node (unused).
+        :return: False, as relabeling never stops the split.
+        """
+        responses_by_sample[positions, :] = data.get_outcome_matrix(samples)
+        return False
+
+    def is_node_invariant(self):
+        """Whether a sample's responses are the same at every node, which they are, as they are its outcomes."""
+        return True
+
+    def get_response_length(self):
+        """Get the number of responses per sample."""
+        return self.num_outcomes
@@ -1,9 +1,13 @@
 import math
-import random
+
+import numpy as np
 
 class RandomSampler:
     """
     A class for random sampling and subsampling of data.
+
+    Draws come from a numpy Generator (PCG64) and are made as int32 arrays in one call each; the output lists
+    of the public methods are filled with their contents.
     """
 
     def __init__(self, seed, options):
@@ -13,8 +17,12 @@ class RandomSampler:
         :param seed: The seed for the random number generator.
         :param options: An object containing sampling options.
         """
-        self.random_number_generator = random.Random(seed)
+        self.random_number_generator = np.random.Generator(np.random.PCG64(seed))
         self.options = options
+        # The values that may be drawn for the last (max, skip) pair, as an int32 array.
+        self.allowed_max = None
+        self.allowed_skip = None
+        self.allowed_values = None
 
     def sample_clusters(self, num_rows, sample_fraction, samples):
         """
@@ -39,7 +47,7 @@ class RandomSampler:
         :param samples: A list to store the sampled indices.
         """
         num_samples_inbag = int(num_samples * sample_fraction)
-        samples.extend(self.random_number_generator.sample(range(num_samples), num_samples_inbag))
+        samples.extend(self.random_number_generator.choice(num_samples, num_samples_inbag, replace=False).astype(np.int32).tolist())
 
     def subsample(self, samples, sample_fraction, subsamples, oob_samples=None):
         """
@@ -50,15 +58,13 @@ class RandomSampler:
         :param subsamples: A list to store the subsampled indices.
         :param oob_samples: A list to store out-of-bag samples if needed.
         """
-
-        shuffled_sample = samples
-        self.random_number_generator.shuffle(shuffled_sample)
+        shuffled_sample = np.asarray(samples, dtype=np.int32)[self.random_number_generator.permutation(len(samples))]
 
         subsample_size = int(math.ceil(len(samples) * sample_fraction))
-        subsamples.extend(shuffled_sample[:subsample_size])
+        subsamples.extend(shuffled_sample[:subsample_size].tolist())
 
         if oob_samples is not None:
-            oob_samples.extend(shuffled_sample[subsample_size:])
+            oob_samples.extend(shuffled_sample[subsample_size:].tolist())
 
     def subsample_with_size(self, samples, subsample_size, subsamples):
         """
@@ -68,9 +74,9 @@ class RandomSampler:
         :param subsample_size: The number of samples to draw.
         :param subsamples: A list to store the subsampled indices.
         """
-        shuffled_sample = samples[:]
-        self.random_number_generator.shuffle(shuffled_sample)
-        subsamples.extend(shuffled_sample[:subsample_size])
+        subsample_size = min(subsample_size, len(samples))
+        drawn = self.random_number_generator.choice(len(samples), subsample_size, replace=False)
+        subsamples.extend(np.asarray(samples, dtype=np.int32)[drawn].tolist())
 
     def sample_from_clusters(self, clusters, samples):
         """
@@ -115,24 +121,41 @@ class RandomSampler:
         :param size: The size of the desired sample.
         :return: A list of shuffled and split samples.
         """
-        samples = list(range(n_all))
-        self.random_number_generator.shuffle(samples)
-        return samples[:size]
+        return self.random_number_generator.permutation(n_all).astype(np.int32)[:size].tolist()
 
     def draw(self, max, skip, num_samples):
         """
         Draw samples, choosing the method based on the number of samples.
 
+        The choice depends on the number of values that can be drawn, not on max: when skip holds most of
+        [0, max), drawing with replacement would repeat values too often.
+
         :param max: The maximum value for drawing.
         :param skip: A set of values to skip.
         :param num_samples: The number of samples to draw.
         :return: A list of drawn samples.
         """
-        if num_samples < max / 10:
+        if num_samples < len(self.get_allowed_values(max, skip)) / 10:
             return self.draw_simple(max, skip, num_samples)
         else:
             return self.draw_fisher_yates(max, skip, num_samples)
 
+    def get_allowed_values(self, max, skip):
+        """
+        Get the values in [0, max) that are not in skip, computed once for repeated draws with the same arguments.
+
+        :param max: The maximum value for drawing.
+        :param skip: A set of values to skip.
+        :return: The allowed values, as a sorted int32 array.
+        """
+        if max != self.allowed_max or skip != self.allowed_skip:
+            allowed = np.ones(max, dtype=bool)
+            allowed[[value for value in skip if 0 <= value < max]] = False
+            self.allowed_max = max
+            self.allowed_skip = frozenset(skip)
+            self.allowed_values = np.flatnonzero(allowed).astype(np.int32)
+        return self.allowed_values
+
     def draw_simple(self, max, skip, num_samples):
         """
         Draw samples using a simple method.
@@ -142,19 +165,14 @@ class RandomSampler:
         :param num_samples: The number of samples to draw.
         :return: A list of drawn samples.
         """
-        result = []
-        temp = [False] * max
-
-        while len(result) < num_samples:
-            draw = self.random_number_generator.randint(0, max - 1 - len(skip))
-            for skip_value in sorted(skip):
-                if draw >= skip_value:
-                    draw += 1
-            if not temp[draw]:
-                temp[draw] = True
-                result.append(draw)
-
-        return result
+        allowed = self.get_allowed_values(max, skip)
+        if num_samples > len(allowed):
+            raise ValueError("Cannot draw more distinct samples than there are allowed values.")
+        # Draw with replacement and redraw on a repeat, which is rare when few values are drawn.
+        while True:
+            drawn = allowed[self.random_number_generator.integers(0, len(allowed), num_samples)].tolist()
+            if len(set(drawn)) == num_samples:
+                return drawn
 
     def draw_fisher_yates(self, max, skip, num_samples):
         """
@@ -165,15 +183,8 @@ class RandomSampler:
         :param num_samples: The number of samples to draw.
         :return: A list of drawn samples.
         """
-        result = list(range(max))
-        for skip_value in sorted(skip, reverse=True):
-            result.pop(skip_value)
-
-        for i in range(num_samples):
-            j = self.random_number_generator.randint(i, max - len(skip) - 1)
-            result[i], result[j] = result[j], result[i]
-
-        return result[:num_samples]
+        allowed = self.get_allowed_values(max, skip)
+        return allowed[self.random_number_generator.permutation(len(allowed))[:num_samples]].tolist()
 
     def sample_poisson(self, mean):
         """
@@ -182,5 +193,5 @@ class RandomSampler:
         :param mean: The mean of the Poisson distribution.
         :return: A random sample from the Poisson distribution.
         """
-        return self.random_number_generator.poisson(mean)
+        return int(self.random_number_generator.poisson(mean))
 
@@ -1,5 +1,7 @@
 import numpy as np
 
+from splitting.SplitBuckets import SplitBuckets
+
 class MultiRegressionSplittingRule:
     def __init__(self, max_num_unique_values, alpha, imbalance_penalty, num_outcomes):
         """
@@ -10,41 +12,41 @@ class MultiRegressionSplittingRule:
         :param imbalance_penalty: Penalty for imbalanced splits.
         :param num_outcomes: The number of outcomes to consider.
         """
+        self.max_num_unique_values = max_num_unique_values
         self.alpha = alpha
         self.imbalance_penalty = imbalance_penalty
         self.num_outcomes = num_outcomes
-        self.counter = np.zeros(max_num_unique_values, dtype=int)
-        self.sums = np.zeros((max_num_unique_values, num_outcomes))
-        self.weight_sums = np.zeros(max_num_unique_values)
 
-    def find_best_split(self, data, node, possible_split_vars, responses_by_sample, samples):
+    def find_best_split(self, data, node, possible_split_vars, responses_by_sample, samples, split_vars, split_values, send_missing_left, split_gains=None):
         """
         Find the best split for a node.
 
         :param data: The data used for training the tree.
         :param node: The index of the node to be split.
         :param possible_split_vars: A list of variables considered for splitting.
-        :param responses_by_sample: The responses associated with each sample.
-        :param samples: A list of samples at each node.
+        :param responses_by_sample: The responses of the tree's samples, one row per position (see NodeSamples.get_positions).
+        :param samples: The NodeSamples holding the samples of each node.
+        :param split_vars: Variables used for splitting at each node.
+        :param split_values: Values used for splitting at each node.
+        :param send_missing_left: Whether to send missing values left at each node.
+        :param split_gains: If given, the decrease in impurity of the best split (relative to the node itself, so it
+                            does not depend on the mean response) is stored at the node's index.
         :return: True if no split is found, False otherwise.
         """
         size_node = len(samples[node])
         min_child_size = max(int(np.ceil(size_node * self.alpha)), 1)
 
         # Precompute the sum of outcomes in this node
-        sum_node = np.zeros(self.num_outcomes)
-        weight_sum_node = 0.0
-        for sample in samples[node]:
-            sample_weight = data.get_weight(sample)
-            weight_sum_node += sample_weight
-            sum_node += sample_weight * responses_by_sample[sample, :]
+        node_weights = data.get_weights(samples[node])
+        weight_sum_node = np.sum(node_weights)
+        sum_node = node_weights @ responses_by_sample[samples.get_positions(node), :]
 
         # Initialize the variables to track the best split variable
         best_var, best_value, best_decrease, best_send_missing_left = 0, 0.0, 0.0, True
 
         # For all possible split variables
         for var in possible_split_vars:
-            self.find_best_split_value(data, node, var, weight_sum_node, sum_node, size_node, min_child_size, best_value, best_var, best_decrease, best_send_missing_left, responses_by_sample, samples)
+            best_value, best_var, best_decrease, best_send_missing_left = self.find_best_split_value(data, node, var, weight_sum_node, sum_node, size_node, min_child_size, best_value, best_var, best_decrease, best_send_missing_left, responses_by_sample, samples)
 
         # Stop if no good split found
         if best_decrease <= 0.0:
@@ -54,77 +56,23 @@ class MultiRegressionSplittingRule:
         split_vars[node] = best_var
         split_values[node] = best_value
         send_missing_left[node] = best_send_missing_left
+        if split_gains is not None:
+            split_gains[node] = SplitBuckets.get_impurity_decrease(best_decrease, weight_sum_node, sum_node)
         return False
 
-    # Placeholder for find_best_split_value method
-    # ...
-
     def find_best_split_value(self, data, node, var, weight_sum_node, sum_node, size_node, min_child_size, best_value, best_var, best_decrease, best_send_missing_left, responses_by_sample, samples):
-        possible_split_values, sorted_samples = data.get_all_values(samples[node], var)
-
-        if len(possible_split_values) < 2:
-            return
-
-        num_splits = len(possible_split_values) - 1
-        self.weight_sums[:num_splits] = 0
-        self.counter[:num_splits] = 0
-        self.sums[:num_splits, :] = 0
-        n_missing = weight_sum_missing = 0
-        sum_missing = np.zeros(self.num_outcomes)
-
-        split_index = 0
-        for i in range(size_node - 1):
-            sample = sorted_samples[i]
-            next_sample = sorted_samples[i + 1]
-            sample_value = data.get(sample, var)
-            sample_weight = data.get_weight(sample)
-
-            if np.isnan(sample_value):
-                weight_sum_missing += sample_weight
-                sum_missing += sample_weight * responses_by_sample[sample, :]
-                n_missing += 1
-            else:
-                self.weight_sums[split_index] += sample_weight
-                self.sums[split_index, :] += sample_weight * responses_by_sample[sample, :]
-                self.counter[split_index] += 1
-
-            next_sample_value = data.get(next_sample, var)
-            if sample_value != next_sample_value and not np.isnan(next_sample_value):
-                split_index += 1
-
-        n_left = weight_sum_left = 0
-        sum_left = np.zeros(self.num_outcomes)
-
-        for send_left in [True, False]:
-            if not send_left and n_missing == 0:
-                break
-
-            n_left = weight_sum_left = 0
-            sum_left.fill(0)
-
-            for i in range(num_splits):
-                if i == 0 and not send_left:
-                    continue
-
-                n_left += self.counter[i]
-                weight_sum_left += self.weight_sums[i]
-                sum_left += self.sums[i, :]
-
-                if n_left < min_child_size:
-                    continue
+        sorted_samples, sorted_positions, sorted_values = samples.get_sorted_samples(node, data, var)
 
-                n_right = size_node - n_left
-                if n_right < min_child_size:
-                    break
+        # One (num_samples x num_outcomes) block of weighted responses, reduced per bucket in one call.
+        sample_weights = data.get_weights(sorted_samples)
+        weighted_responses = sample_weights[:, np.newaxis] * responses_by_sample[sorted_positions, :]
+        buckets = SplitBuckets.from_sorted_values(sorted_values, sample_weights, weighted_responses)
+        if buckets is None:
+            return best_value, best_var, best_decrease, best_send_missing_left
+        possible_split_values, counter, weight_sums, sums, n_missing, weight_sum_missing, sum_missing = buckets
 
-                weight_sum_right = weight_sum_node - weight_sum_left
-                sum_right = sum_node - sum_left
-                decrease = np.sum(sum_left**2) / weight_sum_left + np.sum(sum_right**2) / weight_sum_right
-                penalty = self.imbalance_penalty * (1.0 / n_left + 1.0 / n_right)
-                decrease -= penalty
+        index, decrease, send_left = SplitBuckets.find_best_bucket(counter, weight_sums, sums, n_missing, weight_sum_missing, sum_missing, weight_sum_node, sum_node, size_node, min_child_size, self.imbalance_penalty)
 
-                if decrease > best_decrease:
-                    best_value = possible_split_values[i]
-                    best_var = var
-                    best_decrease = decrease
-                    best_send_missing_left = send_left
+        if decrease > best_decrease:
+            return possible_split_values[index], var, decrease, send_left
+        return best_value, best_var, best_decrease, best_send_missing_left
@@ -0,0 +1,27 @@
+from splitting.MultiRegressionSplittingRule import MultiRegressionSplittingRule
+
+
+class MultiRegressionSplittingRuleFactory:
+    """
+    A factory creating a MultiRegressionSplittingRule for each tree.
+    """
+
+    def __init__(self, num_outcomes):
+        """
+        Initialize a MultiRegressionSplittingRuleFactory.
+
+        :param num_outcomes: The number of outcomes.
+        """
+        self.num_outcomes = num_outcomes
+
+    def create(self, max_num_unique_values, options):
+        """
+        Create a splitting rule.
+
+        :param max_num_unique_values: The maximum number of unique values for a variable.
+        :param options: The TreeOptions of the tree.
+        :return: A MultiRegressionSplittingRule.
+        """
+        if options.get_max_bins() is not None:
+            raise ValueError("MultiRegressionSplittingRule does not support binned split finding.")
+        return MultiRegressionSplittingRule(max_num_unique_values, options.get_alpha(), options.get_imbalance_penalty(), self.num_outcomes)
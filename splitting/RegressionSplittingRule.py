@@ -1,45 +1,100 @@
 import numpy as np
 
+from data_.Data import Data
+from splitting.SplitBuckets import SplitBuckets
+
 
 class RegressionSplittingRule:
-    def __init__(self, max_num_unique_values, alpha, imbalance_penalty):
+    def __init__(self, max_num_unique_values, alpha, imbalance_penalty, max_bins=None, histogram_subtraction=False):
         """
         Initialize a RegressionSplittingRule.
 
         :param max_num_unique_values: The maximum number of unique values for a variable.
         :param alpha: Minimum node size proportion as fraction of total samples.
         :param imbalance_penalty: Penalty for imbalanced splits.
+        :param max_bins: If set, search splits over the bins built by Data.build_bins instead of over every unique value.
+        :param histogram_subtraction: In binned mode, derive a child's histograms as parent minus sibling. This is only
+                                      valid when the responses do not change between a node and its children, so it
+                                      is off by default; TreeTrainer turns it on for relabeling strategies whose
+                                      responses are the same at every node.
         """
         self.alpha = alpha
         self.imbalance_penalty = imbalance_penalty
-        self.counter = np.zeros(max_num_unique_values, dtype=int)
-        self.sums = np.zeros(max_num_unique_values)
-        self.weight_sums = np.zeros(max_num_unique_values)
+        self.max_num_unique_values = max_num_unique_values
+        self.max_bins = max_bins
+        self.histogram_subtraction = histogram_subtraction
+
+        # Binned mode: histograms of split nodes whose children are still open, histograms of children whose
+        # sibling is still open, and each open child's (parent, sibling).
+        self.histograms = {}
+        self.child_histograms = {}
+        self.parents = {}
 
-    def find_best_split(self, data, node, possible_split_vars, responses_by_sample, samples):
+    def set_histogram_subtraction(self, histogram_subtraction):
+        """
+        Enable or disable deriving a child's histograms from its parent's in binned mode.
+
+        :param histogram_subtraction: True only if the responses of a sample are the same at every node of the tree.
+        """
+        self.histogram_subtraction = histogram_subtraction
+
+    def set_children(self, node, left_child, right_child):
+        """
+        Record the children of a node that was just split, so their histograms can be derived from the parent's.
+
+        :param node: The index of the split node.
+        :param left_child: The index of the left child.
+        :param right_child: The index of the right child.
+        """
+        if node in self.histograms:
+            self.parents[left_child] = (node, right_child)
+            self.parents[right_child] = (node, left_child)
+
+    def find_best_split(self, data, node, possible_split_vars, responses_by_sample, samples, split_vars, split_values, send_missing_left, split_gains=None):
         """
         Find the best split for a node.
 
         :param data: The data used for training the tree.
         :param node: The index of the node to be split.
         :param possible_split_vars: A list of variables considered for splitting.
-        :param responses_by_sample: The responses associated with each sample.
-        :param samples: A list of samples at each node.
+        :param responses_by_sample: The responses of the tree's samples, one row per position (see NodeSamples.get_positions).
+        :param samples: The NodeSamples holding the samples of each node.
+        :param split_vars: Variables used for splitting at each node.
+        :param split_values: Values used for splitting at each node.
+        :param send_missing_left: Whether to send missing values left at each node.
+        :param split_gains: If given, the decrease in impurity of the best split (relative to the node itself, so it
+                            does not depend on the mean response) is stored at the node's index.
         :return: True if no split is found, False otherwise.
         """
         size_node = len(samples[node])
         min_child_size = max(int(np.ceil(size_node * self.alpha)), 1)
 
-        sum_node = weight_sum_node = 0.0
-        for sample in samples[node]:
-            sample_weight = data.get_weight(sample)
-            weight_sum_node += sample_weight
-            sum_node += sample_weight * responses_by_sample[sample, 0]
+        node_weights = data.get_weights(samples[node])
+        weight_sum_node = np.sum(node_weights)
+        sum_node = node_weights @ responses_by_sample[samples.get_positions(node), :1]
 
         best_var, best_value, best_decrease, best_send_missing_left = 0, 0.0, 0.0, True
 
-        for var in possible_split_vars:
-            self.find_best_split_value(data, node, var, weight_sum_node, sum_node, size_node, min_child_size, best_value, best_var, best_decrease, best_send_missing_left, responses_by_sample, samples)
+        if self.max_bins is None:
+            for var in possible_split_vars:
+                best_value, best_var, best_decrease, best_send_missing_left = self.find_best_split_value(data, node, var, weight_sum_node, sum_node, size_node, min_child_size, best_value, best_var, best_decrease, best_send_missing_left, responses_by_sample, samples)
+        else:
+            if not data.is_binned():
+                raise RuntimeError("Binned split finding requires the data to be quantized with Data.build_bins.")
+            if node == 0:
+                self.histograms.clear()
+                self.child_histograms.clear()
+                self.parents.clear()
+
+            node_histograms = {}
+            for var in possible_split_vars:
+                histogram = self.get_histogram(data, node, var, responses_by_sample, samples)
+                node_histograms[var] = histogram
+                best_value, best_var, best_decrease, best_send_missing_left = self.find_best_split_value_binned(data, var, histogram, weight_sum_node, sum_node, size_node, min_child_size, best_value, best_var, best_decrease, best_send_missing_left)
+
+            self.release_histograms(node, node_histograms)
+            if self.histogram_subtraction and best_decrease > 0.0:
+                self.histograms[node] = node_histograms
 
         if best_decrease <= 0.0:
             return True
@@ -47,74 +102,124 @@ class RegressionSplittingRule:
         split_vars[node] = best_var
         split_values[node] = best_value
         send_missing_left[node] = best_send_missing_left
+        if split_gains is not None:
+            split_gains[node] = SplitBuckets.get_impurity_decrease(best_decrease, weight_sum_node, sum_node)
 
         return False
 
 
     def find_best_split_value(self, data, node, var, weight_sum_node, sum_node, size_node, min_child_size, best_value, best_var, best_decrease, best_send_missing_left, responses_by_sample, samples):
-        possible_split_values, sorted_samples = data.get_all_values(samples[node], var)
+        sorted_samples, sorted_positions, sorted_values = samples.get_sorted_samples(node, data, var)
+
+        sample_weights = data.get_weights(sorted_samples)
+        weighted_responses = sample_weights[:, np.newaxis] * responses_by_sample[sorted_positions, :1]
+        buckets = SplitBuckets.from_sorted_values(sorted_values, sample_weights, weighted_responses)
+        if buckets is None:
+            return best_value, best_var, best_decrease, best_send_missing_left
+        possible_split_values, counter, weight_sums, sums, n_missing, weight_sum_missing, sum_missing = buckets
+
+        index, decrease, send_left = SplitBuckets.find_best_bucket(counter, weight_sums, sums, n_missing, weight_sum_missing, sum_missing, weight_sum_node, sum_node, size_node, min_child_size, self.imbalance_penalty)
+
+        if decrease > best_decrease:
+            return possible_split_values[index], var, decrease, send_left
+        return best_value, best_var, best_decrease, best_send_missing_left
+
+    def get_histogram(self, data, node, var, responses_by_sample, samples):
+        """
+        Get the histogram of a variable over a node's samples, by subtraction from the parent when possible.
+
+        Only the smaller of two siblings is accumulated from its samples; the larger one is the parent's
+        histogram minus the smaller one's.
+
+        :param data: The data used for training the tree.
+        :param node: The index of the node.
+        :param var: The variable index.
+        :param responses_by_sample: The responses of the tree's samples, one row per position (see NodeSamples.get_positions).
+        :param samples: The NodeSamples holding the samples of each node.
+        :return: An array of shape (3, MISSING_BIN + 1) with the counts, weight sums and weighted response sums per bin.
+        """
+        histogram = self.child_histograms.get(node, {}).get(var)
+        if histogram is not None:
+            return histogram
+
+        if node in self.parents:
+            parent, sibling = self.parents[node]
+            parent_histogram = self.histograms[parent].get(var)
+            if parent_histogram is not None:
+                sibling_histogram = self.child_histograms.get(sibling, {}).get(var)
+                if sibling_histogram is None and len(samples[sibling]) < len(samples[node]):
+                    sibling_histogram = self.compute_histogram(data, var, responses_by_sample, samples, sibling)
+                    self.child_histograms.setdefault(sibling, {})[var] = sibling_histogram
+                if sibling_histogram is not None:
+                    return parent_histogram - sibling_histogram
+
+        return self.compute_histogram(data, var, responses_by_sample, samples, node)
+
+    @staticmethod
+    def compute_histogram(data, var, responses_by_sample, samples, node):
+        """
+        Accumulate the per-bin counts, weight sums and weighted response sums of a variable.
+
+        :param data: The data used for training the tree.
+        :param var: The variable index.
+        :param responses_by_sample: The responses of the tree's samples, one row per position (see NodeSamples.get_positions).
+        :param samples: The NodeSamples holding the samples of each node.
+        :param node: The index of the node whose samples are accumulated.
+        :return: An array of shape (3, MISSING_BIN + 1).
+        """
+        num_bins = Data.MISSING_BIN + 1
+        codes = data.get_bin_codes(samples[node], var)
+        weights = data.get_weights(samples[node])
+
+        histogram = np.empty((3, num_bins))
+        histogram[0] = np.bincount(codes, minlength=num_bins)
+        histogram[1] = np.bincount(codes, weights=weights, minlength=num_bins)
+        histogram[2] = np.bincount(codes, weights=weights * responses_by_sample[samples.get_positions(node), 0], minlength=num_bins)
+        return histogram
+
+    def release_histograms(self, node, node_histograms):
+        """
+        Drop the cached histograms that are no longer needed once a node has been processed.
 
-        if len(possible_split_values) < 2:
+        :param node: The index of the node that was just processed.
+        :param node_histograms: The histograms computed for the node, keyed by variable.
+        """
+        if node not in self.parents:
             return
+        parent, sibling = self.parents.pop(node)
+        if sibling in self.parents:
+            # The sibling is still open and can subtract this node's histograms from the parent's.
+            self.child_histograms[node] = node_histograms
+        else:
+            self.histograms.pop(parent, None)
+            self.child_histograms.pop(node, None)
+            self.child_histograms.pop(sibling, None)
+
+    def set_leaf(self, node):
+        """
+        Drop the cached histograms of a node that is final as a leaf, as it will have no children to subtract
+        them, and release its parent's as if it had been processed.
+
+        :param node: The index of the node that became a leaf.
+        """
+        self.histograms.pop(node, None)
+        self.release_histograms(node, {})
+
+    def find_best_split_value_binned(self, data, var, histogram, weight_sum_node, sum_node, size_node, min_child_size, best_value, best_var, best_decrease, best_send_missing_left):
+        counts = histogram[0, :Data.MISSING_BIN]
+        n_missing = histogram[0, Data.MISSING_BIN]
+
+        # Every non-empty bin but the last one is a candidate split, plus a split of the missing values alone.
+        bins = np.flatnonzero(counts)
+        if len(bins) + (n_missing > 0) < 2:
+            return best_value, best_var, best_decrease, best_send_missing_left
+        bins = bins[:-1]
+
+        buckets = data.get_bin_values(var)[bins], counts[bins], histogram[1, bins], histogram[2, bins, np.newaxis]
+        bin_values, counter, weight_sums, sums = SplitBuckets.add_missing_bucket(buckets, n_missing)
+
+        index, decrease, send_left = SplitBuckets.find_best_bucket(counter, weight_sums, sums, n_missing, histogram[1, Data.MISSING_BIN], histogram[2, Data.MISSING_BIN:], weight_sum_node, sum_node, size_node, min_child_size, self.imbalance_penalty)
 
-        num_splits = len(possible_split_values) - 1
-        self.weight_sums[:num_splits] = 0
-        self.counter[:num_splits] = 0
-        self.sums[:num_splits] = 0
-        n_missing = weight_sum_missing = sum_missing = 0
-
-        split_index = 0
-        for i in range(size_node - 1):
-            sample = sorted_samples[i]
-            next_sample = sorted_samples[i + 1]
-            sample_value = data.get(sample, var)
-            response = responses_by_sample[sample, 0]
-            sample_weight = data.get_weight(sample)
-
-            if np.isnan(sample_value):
-                weight_sum_missing += sample_weight
-                sum_missing += sample_weight * response
-                n_missing += 1
-            else:
-                self.weight_sums[split_index] += sample_weight
-                self.sums[split_index] += sample_weight * response
-                self.counter[split_index] += 1
-
-            next_sample_value = data.get(next_sample, var)
-            if sample_value != next_sample_value and not np.isnan(next_sample_value):
-                split_index += 1
-
-        n_left = weight_sum_left = sum_left = 0
-
-        for send_left in [True, False]:
-            if not send_left and n_missing == 0:
-                break
-
-            n_left = weight_sum_left = sum_left = 0
-
-            for i in range(num_splits):
-                if i == 0 and not send_left:
-                    continue
-
-                n_left += self.counter[i]
-                weight_sum_left += self.weight_sums[i]
-                sum_left += self.sums[i]
-
-                if n_left < min_child_size:
-                    continue
-
-                n_right = size_node - n_left
-                if n_right < min_child_size:
-                    break
-
-                weight_sum_right = weight_sum_node - weight_sum_left
-                sum_right = sum_node - sum_left
-                decrease = sum_left**2 / weight_sum_left + sum_right**2 / weight_sum_right
-                penalty = self.imbalance_penalty * (1.0 / n_left + 1.0 / n_right)
-                decrease -= penalty
-
-                if decrease > best_decrease:
-                    best_value = possible_split_values[i]
-                    best_var = var
-                    best_decrease = decrease
-                    best_send_missing_left = send_left
+        if decrease > best_decrease:
+            return bin_values[index], var, decrease, send_left
+        return best_value, best_var, best_decrease, best_send_missing_left
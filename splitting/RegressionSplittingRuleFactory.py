@@ -0,0 +1,17 @@
+from splitting.RegressionSplittingRule import RegressionSplittingRule
+
+
+class RegressionSplittingRuleFactory:
+    """
+    A factory creating a RegressionSplittingRule for each tree.
+    """
+
+    def create(self, max_num_unique_values, options):
+        """
+        Create a splitting rule.
+
+        :param max_num_unique_values: The maximum number of unique values for a variable.
+        :param options: The TreeOptions of the tree.
+        :return: A RegressionSplittingRule.
+        """
+        return RegressionSplittingRule(max_num_unique_values, options.get_alpha(), options.get_imbalance_penalty(), options.get_max_bins())
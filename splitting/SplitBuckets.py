@@ -0,0 +1,133 @@
+import numpy as np
+
+
+class SplitBuckets:
+    """
+    Candidate splits of one variable, grouped into buckets of equal values, and their vectorized scoring.
+
+    Shared by the regression splitting rules: the weighted response sums have shape (num_buckets, num_outcomes),
+    and the single-outcome rule uses num_outcomes == 1.
+    """
+
+    @staticmethod
+    def from_sorted_values(sorted_values, sample_weights, weighted_responses):
+        """
+        Group the samples of a node, sorted by a variable, into buckets of equal values.
+
+        Missing values sort first and are not a bucket of their own: when there are any, bucket 0 is the (empty)
+        bucket of the split that sends only the missing values left. The last bucket always ends up on the right,
+        so it is never a split candidate and is left out.
+
+        :param sorted_values: The values of the variable, sorted with NaNs first.
+        :param sample_weights: The weight of each sample, in the same order.
+        :param weighted_responses: The weighted responses of each sample, of shape (num_samples, num_outcomes).
+        :return: None if the variable cannot be split, otherwise a tuple of the candidate split values, the
+                 number of samples, weight sum and weighted response sums (num_buckets x num_outcomes) of each
+                 bucket, and the number of samples, weight sum and weighted response sums of the missing values.
+        """
+        n_missing = np.count_nonzero(np.isnan(sorted_values))
+        observed_values = sorted_values[n_missing:]
+        if len(observed_values) == 0:
+            return None
+        starts = n_missing + np.flatnonzero(np.concatenate(([True], observed_values[1:] != observed_values[:-1])))
+        if len(starts) + (n_missing > 0) < 2:
+            return None
+
+        possible_split_values = sorted_values[starts[:-1]]
+        counter = np.diff(starts)
+        weight_sums = np.add.reduceat(sample_weights, starts)[:-1]
+        sums = np.add.reduceat(weighted_responses, starts, axis=0)[:-1]
+        weight_sum_missing = np.sum(sample_weights[:n_missing])
+        sum_missing = np.sum(weighted_responses[:n_missing], axis=0)
+
+        buckets = possible_split_values, counter, weight_sums, sums
+        return SplitBuckets.add_missing_bucket(buckets, n_missing) + (n_missing, weight_sum_missing, sum_missing)
+
+    @staticmethod
+    def add_missing_bucket(buckets, n_missing):
+        """
+        Prepend the empty bucket of the split that sends only the missing values left, if there are any.
+
+        :param buckets: A tuple of the candidate split values and the counts, weight sums and response sums of the buckets.
+        :param n_missing: The number of samples with a missing value.
+        :return: The buckets, with the missing-only bucket first when n_missing > 0.
+        """
+        if n_missing == 0:
+            return buckets
+        possible_split_values, counter, weight_sums, sums = buckets
+        return (np.concatenate(([np.nan], possible_split_values)),
+                np.concatenate(([0], counter)),
+                np.concatenate(([0.0], weight_sums)),
+                np.concatenate((np.zeros((1, sums.shape[1])), sums)))
+
+    @staticmethod
+    def get_impurity_decrease(score, weight_sum_node, sum_node):
+        """
+        Turn the score of a split into the decrease in weighted sum of squared errors it brings.
+
+        The score leaves out the node's own term sum_node^2 / weight_sum_node, which is the same for every
+        candidate of a node but grows with the node's size and its mean response.
+
+        :param score: The score of the split, as returned by find_best_bucket.
+        :param weight_sum_node: The sum of weights in the node.
+        :param sum_node: The weighted sums of responses in the node.
+        :return: The decrease in impurity, minus the imbalance penalty. It does not change when a constant is
+                 added to the responses.
+        """
+        return score - np.sum(np.square(sum_node)) / weight_sum_node
+
+    @staticmethod
+    def find_best_bucket(counter, weight_sums, sums, n_missing, weight_sum_missing, sum_missing, weight_sum_node, sum_node, size_node, min_child_size, imbalance_penalty):
+        """
+        Score every candidate split of one variable at once.
+
+        Bucket i holds the samples whose value equals the i-th candidate split value; a split at bucket i sends
+        buckets 0..i left. The candidates are scored first with missing values sent left, then right, and the
+        first maximum wins, as in a sequential scan. A split scores sum_left^2 / weight_left + sum_right^2 /
+        weight_right (summed over outcomes) minus the imbalance penalty.
+
+        :param counter: The number of samples in each bucket.
+        :param weight_sums: The sum of sample weights in each bucket.
+        :param sums: The weighted sums of responses in each bucket, of shape (num_buckets, num_outcomes).
+        :param n_missing: The number of samples with a missing value.
+        :param weight_sum_missing: The sum of weights of the samples with a missing value.
+        :param sum_missing: The weighted sums of responses of the samples with a missing value.
+        :param weight_sum_node: The sum of weights in the node.
+        :param sum_node: The weighted sums of responses in the node.
+        :param size_node: The number of samples in the node.
+        :param min_child_size: The minimum number of samples in each child.
+        :param imbalance_penalty: The penalty for imbalanced splits.
+        :return: A tuple of the best bucket index, its score (-inf if no split is valid) and whether missing values go left.
+        """
+        candidates = []
+        for send_left in [True, False]:
+            if send_left:
+                # Missing values start out on the left.
+                n_left = np.cumsum(np.concatenate(([n_missing], counter)))[1:]
+                weight_sum_left = np.cumsum(np.concatenate(([weight_sum_missing], weight_sums)))[1:]
+                sum_left = np.cumsum(np.concatenate((sum_missing[np.newaxis, :], sums)), axis=0)[1:]
+                first = 0
+            else:
+                if n_missing == 0:
+                    break
+                # Not necessary to evaluate sending right when splitting on NaN.
+                n_left = np.cumsum(counter[1:])
+                weight_sum_left = np.cumsum(weight_sums[1:])
+                sum_left = np.cumsum(sums[1:], axis=0)
+                first = 1
+
+            decrease = np.full(len(counter), -np.inf)
+            n_right = size_node - n_left
+            valid = np.flatnonzero((n_left >= min_child_size) & (n_right >= min_child_size))
+            if len(valid) > 0:
+                valid_sum_left = sum_left[valid]
+                valid_sum_right = sum_node - valid_sum_left
+                weight_sum_right = weight_sum_node - weight_sum_left[valid]
+                scores = np.sum(valid_sum_left**2, axis=1) / weight_sum_left[valid] + np.sum(valid_sum_right**2, axis=1) / weight_sum_right
+                penalty = imbalance_penalty * (1.0 / n_left[valid] + 1.0 / n_right[valid])
+                decrease[valid + first] = scores - penalty
+            candidates.append(decrease)
+
+        decrease = np.concatenate(candidates)
+        best = int(np.argmax(decrease))
+        return best % len(counter), decrease[best], best < len(counter)
@@ -0,0 +1,120 @@
+# Float32 storage of the data matrix must not change split decisions: on values that float32 represents exactly,
+# the splitting rules, the trained trees and tree traversal must give the same results as with float64 storage.
+import numpy as np
+import pytest
+
+from data_.Data import Data
+from forest.ForestOptions import ForestOptions
+from forest.ForestTrainer import ForestTrainer
+from relabelling.MultiNoopRelabelingStrategy import MultiNoopRelabelingStrategy
+from relabelling.NoopRelabelingStrategy import NoopRelabelingStrategy
+from splitting.MultiRegressionSplittingRule import MultiRegressionSplittingRule
+from splitting.MultiRegressionSplittingRuleFactory import MultiRegressionSplittingRuleFactory
+from splitting.RegressionSplittingRule import RegressionSplittingRule
+from splitting.RegressionSplittingRuleFactory import RegressionSplittingRuleFactory
+from tree.NodeSamples import NodeSamples
+
+NUM_ROWS = 2000
+NUM_FEATURES = 6
+OUTCOME_COLUMNS = [NUM_FEATURES, NUM_FEATURES + 1]
+
+
+@pytest.fixture(scope="module")
+def values():
+    # Multiples of 1/8 of small magnitude, which float32 holds exactly, with two outcomes in the last columns
+    rng = np.random.default_rng(42)
+    features = rng.integers(-256, 256, size=(NUM_ROWS, NUM_FEATURES)) / 8.0
+    features[rng.random(features.shape) < 0.02] = np.nan
+    noise = rng.integers(-16, 16, size=(NUM_ROWS, 2)) / 8.0
+    filled = np.nan_to_num(features)
+    outcomes = np.column_stack([filled[:, 0] * filled[:, 1] + filled[:, 2], filled[:, 3] - filled[:, 4] ** 2 / 8.0]) + noise
+    values = np.column_stack([features, outcomes])
+    assert np.array_equal(values.astype(np.float32).astype(np.float64), values, equal_nan=True)
+    return values
+
+
+def make_data(values, dtype, multi):
+    data = Data(values, dtype=dtype, exact_columns=OUTCOME_COLUMNS)
+    data.set_outcome_index(OUTCOME_COLUMNS if multi else OUTCOME_COLUMNS[0])
+    data.disallowed_split_variables.update(OUTCOME_COLUMNS)
+    return data
+
+
+def find_root_split(rule, data):
+    samples = NodeSamples()
+    samples.add_node()
+    samples.set_root_samples(np.arange(data.get_num_rows()))
+    responses = data.get_outcome_matrix(samples[0])
+    split_vars = np.zeros(1, dtype=np.int64)
+    split_values = np.zeros(1)
+    send_missing_left = np.zeros(1, dtype=bool)
+    stop = rule.find_best_split(data, 0, list(range(NUM_FEATURES)), responses, samples, split_vars, split_values, send_missing_left)
+    return stop, split_vars[0], split_values[0], send_missing_left[0]
+
+
+def train(values, dtype, multi, max_bins=None):
+    data = make_data(values, dtype, multi)
+    options = ForestOptions(num_trees=10, ci_group_size=1, sample_fraction=0.5, mtry=3, min_node_size=5,
+                            honesty=False, honesty_fraction=0.5, honesty_prune_leaves=False, alpha=0.05,
+                            imbalance_penalty=0.0, num_threads=1, random_seed=42, sample_clusters=None,
+                            samples_per_cluster=0, max_bins=max_bins)
+    if multi:
+        trainer = ForestTrainer(MultiNoopRelabelingStrategy(len(OUTCOME_COLUMNS)), MultiRegressionSplittingRuleFactory(len(OUTCOME_COLUMNS)), None)
+    else:
+        trainer = ForestTrainer(NoopRelabelingStrategy(), RegressionSplittingRuleFactory(), None)
+    return trainer.train(data, options)
+
+
+def assert_same_trees(forest, forest32):
+    for tree, tree32 in zip(forest.get_trees(), forest32.get_trees()):
+        assert np.array_equal(tree.get_child_nodes(), tree32.get_child_nodes())
+        assert np.array_equal(tree.get_split_vars(), tree32.get_split_vars())
+        assert np.array_equal(tree.get_split_values(), tree32.get_split_values(), equal_nan=True)
+
+
+def test_outcomes_stay_float64():
+    data = Data(np.array([[1.0, 0.1], [2.0, 0.2]]), dtype=np.float32, exact_columns=[1])
+    data.set_outcome_index(1)
+    assert data.get_outcomes([0, 1]).tolist() == [0.1, 0.2]
+
+
+def test_rounded_outcomes_are_rejected():
+    data = Data(np.array([[1.0, 0.1], [2.0, 0.2]]), dtype=np.float32)
+    with pytest.raises(ValueError):
+        data.set_outcome_index(1)
+    with pytest.raises(ValueError):
+        data.set_weight_index(1)
+
+
+def test_regression_rule_root_split(values):
+    rule = RegressionSplittingRule(max_num_unique_values=NUM_ROWS, alpha=0.05, imbalance_penalty=0.0)
+    split = find_root_split(rule, make_data(values, np.float64, multi=False))
+    assert not split[0]
+    assert find_root_split(rule, make_data(values, np.float32, multi=False)) == split
+
+
+def test_multi_regression_rule_root_split(values):
+    rule = MultiRegressionSplittingRule(max_num_unique_values=NUM_ROWS, alpha=0.05, imbalance_penalty=0.0, num_outcomes=2)
+    split = find_root_split(rule, make_data(values, np.float64, multi=True))
+    assert not split[0]
+    assert find_root_split(rule, make_data(values, np.float32, multi=True)) == split
+
+
+@pytest.mark.parametrize("max_bins", [None, 32])
+def test_regression_trees(values, max_bins):
+    assert_same_trees(train(values, np.float64, False, max_bins), train(values, np.float32, False, max_bins))
+
+
+def test_multi_regression_trees(values):
+    assert_same_trees(train(values, np.float64, True), train(values, np.float32, True))
+
+
+def test_tree_traversal(values):
+    forest = train(values, np.float64, False)
+    data = make_data(values, np.float64, multi=False)
+    data32 = make_data(values, np.float32, multi=False)
+    samples = np.arange(NUM_ROWS)
+    for tree in forest.get_trees():
+        leaf_nodes = tree.find_leaf_nodes(data, samples)
+        assert np.array_equal(tree.find_leaf_nodes(data32, samples), leaf_nodes)
+        assert [tree.find_leaf_node(data32, sample) for sample in samples[:100]] == leaf_nodes[:100].tolist()
@@ -0,0 +1,72 @@
+import numpy as np
+import pytest
+
+from data_.Data import Data
+from forest.ForestOptions import ForestOptions
+from forest.ForestSerializer import ForestSerializer
+from forest.ForestTrainer import ForestTrainer
+from prediction.RegressionPredictionStrategy import RegressionPredictionStrategy
+from relabelling.NoopRelabelingStrategy import NoopRelabelingStrategy
+from splitting.RegressionSplittingRuleFactory import RegressionSplittingRuleFactory
+
+
+@pytest.fixture(scope="module")
+def forest():
+    rng = np.random.default_rng(3)
+    values = rng.normal(size=(500, 4))
+    values[:, 3] = values[:, 0] - values[:, 1] ** 2 + rng.normal(size=500)
+    values[rng.random(values.shape) < 0.05] = np.nan
+    values[:, 3] = np.nan_to_num(values[:, 3])
+    data = Data(values)
+    data.set_outcome_index(3)
+    options = ForestOptions(num_trees=4, ci_group_size=2, sample_fraction=0.5, mtry=2, min_node_size=5,
+                            honesty=True, honesty_fraction=0.5, honesty_prune_leaves=True, alpha=0.05,
+                            imbalance_penalty=0.0, num_threads=1, random_seed=42, sample_clusters=None,
+                            samples_per_cluster=0)
+    return ForestTrainer(NoopRelabelingStrategy(), RegressionSplittingRuleFactory(), RegressionPredictionStrategy()).train(data, options)
+
+
+@pytest.mark.parametrize("mmap", [True, False])
+def test_round_trip(tmp_path, forest, mmap):
+    file_name = str(tmp_path / "forest.grf")
+    ForestSerializer.write(forest, file_name)
+    read = ForestSerializer.read(file_name, mmap=mmap)
+
+    assert read.get_num_variables() == forest.get_num_variables()
+    assert read.get_ci_group_size() == forest.get_ci_group_size()
+    for tree, read_tree in zip(forest.get_trees(), read.get_trees()):
+        assert read_tree.get_root_node() == tree.get_root_node()
+        for getter in ("get_child_nodes", "get_split_vars", "get_split_values", "get_send_missing_left_bits",
+                       "get_leaf_offsets", "get_leaf_members", "get_drawn_sample_bits"):
+            assert np.array_equal(getattr(read_tree, getter)(), getattr(tree, getter)(), equal_nan=True), getter
+        assert np.array_equal(read_tree.get_prediction_values().get_values(), tree.get_prediction_values().get_values())
+        assert np.array_equal(read_tree.get_prediction_values().get_counts(), tree.get_prediction_values().get_counts())
+
+
+def test_preamble_is_little_endian(tmp_path, forest):
+    file_name = tmp_path / "forest.grf"
+    ForestSerializer.write(forest, str(file_name))
+    preamble = file_name.read_bytes()[:len(ForestSerializer.MAGIC) + 12]
+    assert preamble[:len(ForestSerializer.MAGIC)] == ForestSerializer.MAGIC
+    assert int.from_bytes(preamble[-12:-8], "little") == ForestSerializer.VERSION
+
+
+def test_other_versions_are_rejected(tmp_path, forest):
+    file_name = tmp_path / "forest.grf"
+    ForestSerializer.write(forest, str(file_name))
+    contents = bytearray(file_name.read_bytes())
+    contents[len(ForestSerializer.MAGIC):len(ForestSerializer.MAGIC) + 4] = (2).to_bytes(4, "little")
+    file_name.write_bytes(bytes(contents))
+    with pytest.raises(RuntimeError, match="Unsupported forest file version"):
+        ForestSerializer.read(str(file_name))
+
+
+def test_only_prediction_values_are_written(tmp_path, forest):
+    tree = forest.get_trees()[0]
+    prediction_values = tree.get_prediction_values()
+    tree.set_prediction_values({"not": "arrays"})
+    try:
+        with pytest.raises(TypeError):
+            ForestSerializer.write(forest, str(tmp_path / "forest.grf"))
+    finally:
+        tree.set_prediction_values(prediction_values)
@@ -0,0 +1,36 @@
+import numpy as np
+import pytest
+
+from data_.Data import Data
+from forest.ForestOptions import ForestOptions
+from relabelling.LLRegressionRelabelingStrategy import LLRegressionRelabelingStrategy
+from sampling.RandomSampler import RandomSampler
+from sampling.SamplingOptions import SamplingOptions
+from splitting.RegressionSplittingRuleFactory import RegressionSplittingRuleFactory
+from tree.TreeTrainer import TreeTrainer
+
+
+class RecordingStrategy(LLRegressionRelabelingStrategy):
+    def clone(self):
+        strategy = super().clone()
+        self.clones.append(strategy)
+        return strategy
+
+
+@pytest.mark.parametrize("tree_size_options", [{}, {"max_depth": 4}, {"min_split_gain": 2.0}, {"max_leaf_nodes": 20}])
+def test_node_caches_are_freed_with_the_tree(tree_size_options):
+    rng = np.random.default_rng(1)
+    values = rng.normal(size=(3000, 5))
+    values[:, 4] = values[:, 0] + values[:, 1] ** 2 + rng.normal(size=3000)
+    data = Data(values)
+    data.set_outcome_index(4)
+    options = ForestOptions(num_trees=1, ci_group_size=1, sample_fraction=0.5, mtry=3, min_node_size=20,
+                            honesty=False, honesty_fraction=0.5, honesty_prune_leaves=False, alpha=0.05,
+                            imbalance_penalty=0.0, num_threads=1, random_seed=1, sample_clusters=None,
+                            samples_per_cluster=0, **tree_size_options)
+    strategy = RecordingStrategy(0.1, False, [0.0, 0.0, 0.0], 10, [0, 1])
+    strategy.clones = []
+    TreeTrainer(strategy, RegressionSplittingRuleFactory(), None).train(data, RandomSampler(1, SamplingOptions()), list(range(3000)), options.get_tree_options())
+
+    assert strategy.clones[-1].node_statistics == {}
+    assert strategy.clones[-1].node_designs == {}
@@ -0,0 +1,49 @@
+import numpy as np
+import pytest
+
+from data_.Data import Data
+from tree.NodeSamples import NodeSamples
+from tree.TrainingWorkspace import TrainingWorkspace
+
+
+@pytest.fixture(scope="module")
+def data():
+    rng = np.random.default_rng(7)
+    values = np.round(rng.normal(size=(1000, 3)) * 4) / 4
+    values[rng.random(values.shape) < 0.05] = np.nan
+    data = Data(values)
+    data.presort()
+    return data
+
+
+def make_nodes(root_samples, workspace=None):
+    nodes = NodeSamples(workspace)
+    nodes.add_node()
+    nodes.set_root_samples(root_samples)
+    return nodes
+
+
+@pytest.mark.parametrize("num_root_samples", [50, 900])
+def test_sorted_samples_match_data(data, num_root_samples):
+    rng = np.random.default_rng(num_root_samples)
+    nodes = make_nodes(rng.choice(data.get_num_rows(), num_root_samples, replace=False), TrainingWorkspace())
+    left, right = nodes.add_node(), nodes.add_node()
+    nodes.partition(0, rng.random(num_root_samples) < 0.3, left, right)
+
+    for node in (left, right):
+        assert np.array_equal(nodes.root_samples[nodes.get_positions(node)], nodes[node])
+        for var in range(data.get_num_cols()):
+            sorted_samples, sorted_positions, sorted_values = nodes.get_sorted_samples(node, data, var)
+            expected_samples, expected_values = data.get_sorted_samples(nodes[node], var)
+            assert np.array_equal(sorted_values, expected_values, equal_nan=True)
+            assert np.array_equal(np.sort(sorted_samples), np.sort(expected_samples))
+            assert np.array_equal(nodes.root_samples[sorted_positions], sorted_samples)
+
+
+def test_workspace_buffers_are_sized_to_the_subsample():
+    workspace = TrainingWorkspace()
+    responses = workspace.get_responses(100, 2)
+    assert responses.shape == (100, 2)
+    assert workspace.get_responses(40, 2).base is responses.base
+    assert len(workspace.get_sample_mask(40)) == 40
+    assert workspace.get_sorted_positions(40, 3).shape == (40, 3)
@@ -0,0 +1,20 @@
+import pytest
+
+from sampling.RandomSampler import RandomSampler
+from sampling.SamplingOptions import SamplingOptions
+
+
+@pytest.mark.parametrize("num_samples", [1, 5, 10, 12])
+def test_draw_when_most_values_are_skipped(num_samples):
+    sampler = RandomSampler(42, SamplingOptions())
+    drawn = sampler.draw(1000, set(range(10, 1000)), num_samples)
+    assert len(drawn) == min(num_samples, 10)
+    assert len(set(drawn)) == len(drawn)
+    assert all(0 <= value < 10 for value in drawn)
+
+
+def test_draw_skips_values():
+    sampler = RandomSampler(42, SamplingOptions())
+    drawn = sampler.draw(1000, {1, 2, 3}, 20)
+    assert len(set(drawn)) == 20
+    assert not set(drawn) & {1, 2, 3}
@@ -0,0 +1,32 @@
+import numpy as np
+import pytest
+
+from data_ import utility
+
+
+def write(tmp_path, text):
+    file_name = tmp_path / "table.txt"
+    file_name.write_text(text)
+    return str(file_name)
+
+
+@pytest.mark.parametrize("text", ["a,b,c\n1,2,3\n4,5\n7,8,9", "a,b,c\n1,2,3\n4,5,6,7\n7,8,9",
+                                  "1 2 3\n4 5\n7 8 9\n", "1 2 3\n4 5 6\n7 8"])
+def test_inconsistent_number_of_columns(tmp_path, text):
+    with pytest.raises(RuntimeError, match="Inconsistent number of columns."):
+        utility.read_table(write(tmp_path, text), chunk_size=1)
+
+
+def test_blank_lines_and_missing_values(tmp_path):
+    storage, column_names, _ = utility.read_table(write(tmp_path, "a,b,c\n1,,3\n  \n\n7,8,NA"))
+    assert column_names == ["a", "b", "c"]
+    assert np.array_equal(storage, [[1.0, np.nan, 3.0], [7.0, 8.0, np.nan]], equal_nan=True)
+
+
+@pytest.mark.parametrize("block_size", [1, 2, 3, 5, 7, 1 << 24])
+def test_count_lines_across_blocks(tmp_path, block_size):
+    file_name = write(tmp_path, "a b c\n1 2 3\n\n 4 5 6 \n7 8 9")
+    assert utility.count_lines(file_name, block_size) == 5
+    assert utility.count_lines(file_name, block_size, num_cols=3) == 5
+    with pytest.raises(RuntimeError):
+        utility.count_lines(file_name, block_size, num_cols=4)
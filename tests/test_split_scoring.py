@@ -0,0 +1,164 @@
+# The vectorized split scoring (SplitBuckets, used by the regression splitting rules) must find the same split as
+# a scalar scan over the candidates, as in the original sequential implementation, and on data without ties it
+# must give the same score bit for bit: every bucket holds one sample, so both add up the same terms in the same
+# order.
+import numpy as np
+import pytest
+
+from data_.Data import Data
+from splitting.MultiRegressionSplittingRule import MultiRegressionSplittingRule
+from splitting.RegressionSplittingRule import RegressionSplittingRule
+from splitting.SplitBuckets import SplitBuckets
+from tree.NodeSamples import NodeSamples
+
+NUM_ROWS = 300
+NUM_FEATURES = 5
+ALPHA = 0.05
+
+
+def scalar_best_split(sorted_values, weights, responses, weight_sum_node, sum_node, size_node, min_child_size, imbalance_penalty):
+    """
+    Score the candidate splits of one variable one at a time.
+
+    :return: A tuple of the best split value, its score (-inf if there is no valid split) and whether missing
+             values go left.
+    """
+    n_missing = 0
+    while n_missing < len(sorted_values) and np.isnan(sorted_values[n_missing]):
+        n_missing += 1
+    weight_sum_missing = 0.0
+    sum_missing = np.zeros(len(sum_node))
+    for i in range(n_missing):
+        weight_sum_missing += weights[i]
+        sum_missing += weights[i] * responses[i]
+
+    # A candidate sends the samples before its end left, missing values aside.
+    candidates = [(np.nan, n_missing)] if n_missing > 0 else []
+    for i in range(n_missing, len(sorted_values) - 1):
+        if sorted_values[i] != sorted_values[i + 1]:
+            candidates.append((sorted_values[i], i + 1))
+
+    best_value, best_score, best_send_left = 0.0, -np.inf, True
+    for send_left in [True, False]:
+        if not send_left and n_missing == 0:
+            break
+        n_left, weight_sum_left, sum_left = (n_missing, weight_sum_missing, sum_missing.copy()) if send_left else (0, 0.0, np.zeros(len(sum_node)))
+        position = n_missing
+        for value, end in candidates:
+            if not send_left and np.isnan(value):
+                continue
+            while position < end:
+                n_left += 1
+                weight_sum_left += weights[position]
+                sum_left += weights[position] * responses[position]
+                position += 1
+            n_right = size_node - n_left
+            if n_left < min_child_size or n_right < min_child_size:
+                continue
+            sum_right = sum_node - sum_left
+            weight_sum_right = weight_sum_node - weight_sum_left
+            score = 0.0
+            for outcome in range(len(sum_node)):
+                score += sum_left[outcome] * sum_left[outcome]
+            score_right = 0.0
+            for outcome in range(len(sum_node)):
+                score_right += sum_right[outcome] * sum_right[outcome]
+            score = score / weight_sum_left + score_right / weight_sum_right
+            score -= imbalance_penalty * (1.0 / n_left + 1.0 / n_right)
+            if score > best_score:
+                best_value, best_score, best_send_left = value, score, send_left
+    return best_value, best_score, best_send_left
+
+
+def make_data(seed, num_outcomes):
+    # Continuous values, so no two samples tie, with a few missing values (fewer than 8 per column, so that
+    # numpy sums them in order too) and random weights.
+    rng = np.random.default_rng(seed)
+    features = rng.normal(size=(NUM_ROWS, NUM_FEATURES))
+    for col in range(NUM_FEATURES):
+        features[rng.choice(NUM_ROWS, rng.integers(0, 8), replace=False), col] = np.nan
+    filled = np.nan_to_num(features)
+    outcomes = np.column_stack([filled[:, 0] * filled[:, 1] + filled[:, 2] + rng.normal(size=NUM_ROWS) for _ in range(num_outcomes)])
+    weights = rng.uniform(0.5, 2.0, size=NUM_ROWS)
+    data = Data(np.column_stack([features, outcomes, weights]))
+    data.set_outcome_index(list(range(NUM_FEATURES, NUM_FEATURES + num_outcomes)))
+    data.set_weight_index(NUM_FEATURES + num_outcomes)
+    return data
+
+
+def make_samples(data, seed):
+    samples = NodeSamples()
+    samples.add_node()
+    samples.set_root_samples(np.random.default_rng(seed).choice(data.get_num_rows(), NUM_ROWS // 2, replace=False))
+    return samples
+
+
+def scalar_find_best_split(data, samples, responses_by_sample, imbalance_penalty):
+    node_samples = samples[0]
+    size_node = len(node_samples)
+    min_child_size = max(int(np.ceil(size_node * ALPHA)), 1)
+    # The node totals are inputs of the scoring, computed as the rules do.
+    node_weights = data.get_weights(node_samples)
+    weight_sum_node = np.sum(node_weights)
+    sum_node = node_weights @ responses_by_sample[samples.get_positions(0)]
+
+    best = (0, 0.0, 0.0, True)
+    for var in range(NUM_FEATURES):
+        values = data.get_values(node_samples, var)
+        order = Data.nan_first_argsort(values)
+        value, score, send_left = scalar_best_split(values[order], node_weights[order], responses_by_sample[samples.get_positions(0)][order],
+                                                    weight_sum_node, sum_node, size_node, min_child_size, imbalance_penalty)
+        if score > best[2]:
+            best = (var, value, score, send_left)
+    var, value, score, send_left = best
+    return var, value, SplitBuckets.get_impurity_decrease(score, weight_sum_node, sum_node), send_left
+
+
+def vectorized_find_best_split(rule, data, samples, responses_by_sample):
+    split_vars, split_values, send_missing_left, split_gains = [0], [0.0], [True], {}
+    stop = rule.find_best_split(data, 0, range(NUM_FEATURES), responses_by_sample, samples, split_vars, split_values, send_missing_left, split_gains)
+    assert not stop
+    return split_vars[0], split_values[0], split_gains[0], send_missing_left[0]
+
+
+@pytest.mark.parametrize("seed", range(5))
+@pytest.mark.parametrize("imbalance_penalty", [0.0, 0.5])
+def test_regression_rule_matches_scalar_scan(seed, imbalance_penalty):
+    data = make_data(seed, 1)
+    samples = make_samples(data, seed)
+    responses_by_sample = data.get_outcome_matrix(samples[0])
+    rule = RegressionSplittingRule(max_num_unique_values=NUM_ROWS, alpha=ALPHA, imbalance_penalty=imbalance_penalty)
+    assert vectorized_find_best_split(rule, data, samples, responses_by_sample) == scalar_find_best_split(data, samples, responses_by_sample, imbalance_penalty)
+
+
+@pytest.mark.parametrize("seed", range(5))
+@pytest.mark.parametrize("imbalance_penalty", [0.0, 0.5])
+def test_multi_regression_rule_matches_scalar_scan(seed, imbalance_penalty):
+    data = make_data(seed, 3)
+    samples = make_samples(data, seed)
+    responses_by_sample = data.get_outcome_matrix(samples[0])
+    rule = MultiRegressionSplittingRule(max_num_unique_values=NUM_ROWS, alpha=ALPHA, imbalance_penalty=imbalance_penalty, num_outcomes=3)
+    assert vectorized_find_best_split(rule, data, samples, responses_by_sample) == scalar_find_best_split(data, samples, responses_by_sample, imbalance_penalty)
+
+
+@pytest.mark.parametrize("seed", range(5))
+@pytest.mark.parametrize("min_child_size", [1, 20])
+def test_every_variable_matches_scalar_scan(seed, min_child_size):
+    # The best split of each variable, not only the best one overall.
+    data = make_data(seed, 2)
+    samples = make_samples(data, seed)
+    responses = data.get_outcome_matrix(samples[0])
+    weights = data.get_weights(samples[0])
+    weight_sum_node, sum_node, size_node = np.sum(weights), weights @ responses, len(weights)
+    for var in range(NUM_FEATURES):
+        sorted_samples, sorted_positions, sorted_values = samples.get_sorted_samples(0, data, var)
+        sorted_weights = data.get_weights(sorted_samples)
+        sorted_responses = responses[sorted_positions]
+        buckets = SplitBuckets.from_sorted_values(sorted_values, sorted_weights, sorted_weights[:, np.newaxis] * sorted_responses)
+        possible_split_values, counter, weight_sums, sums, n_missing, weight_sum_missing, sum_missing = buckets
+        index, score, send_left = SplitBuckets.find_best_bucket(counter, weight_sums, sums, n_missing, weight_sum_missing, sum_missing,
+                                                                weight_sum_node, sum_node, size_node, min_child_size, 0.0)
+        expected_value, expected_score, expected_send_left = scalar_best_split(sorted_values, sorted_weights, sorted_responses, weight_sum_node,
+                                                                               sum_node, size_node, min_child_size, 0.0)
+        assert np.array_equal(possible_split_values[index], expected_value, equal_nan=True)
+        assert (score, send_left) == (expected_score, expected_send_left)
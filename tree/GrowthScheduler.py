@@ -0,0 +1,58 @@
+import collections
+import heapq
+
+
+class GrowthScheduler:
+    """
+    The order in which the open nodes of a tree are split.
+
+    - "breadth_first": level by level, in the order the nodes were created (a FIFO queue).
+    - "depth_first": the most recently created node first (a stack), so only the open nodes along one path
+      and their siblings are alive at once.
+    - "best_first": the node with the largest split gain first (a priority queue), so that a leaf budget
+      is spent on the most useful splits. The gain is the decrease in impurity reported by the splitting rule,
+      which does not depend on the mean response of the node. Ties are broken by creation order.
+    """
+
+    ORDERS = ("breadth_first", "depth_first", "best_first")
+
+    def __init__(self, order="breadth_first"):
+        """
+        Initialize an empty GrowthScheduler.
+
+        :param order: The growth order, one of ORDERS.
+        """
+        if order not in GrowthScheduler.ORDERS:
+            raise ValueError("Unknown growth order: " + str(order) + ".")
+        self.order = order
+        self.open_nodes = collections.deque() if order == "breadth_first" else []
+        self.num_pushed = 0
+
+    def __len__(self):
+        """Get the number of open nodes."""
+        return len(self.open_nodes)
+
+    def push(self, node, gain):
+        """
+        Add an open node, i.e. a node with a split that has been found but not yet applied.
+
+        :param node: The node index.
+        :param gain: The decrease in impurity of the node's split.
+        """
+        if self.order == "best_first":
+            heapq.heappush(self.open_nodes, (-gain, self.num_pushed, node))
+        else:
+            self.open_nodes.append(node)
+        self.num_pushed += 1
+
+    def pop(self):
+        """
+        Remove and return the next node to split.
+
+        :return: The node index.
+        """
+        if self.order == "breadth_first":
+            return self.open_nodes.popleft()
+        if self.order == "best_first":
+            return heapq.heappop(self.open_nodes)[2]
+        return self.open_nodes.pop()
@@ -0,0 +1,198 @@
+import numpy as np
+
+from data_.Data import Data
+
+
+class NodeSamples:
+    """
+    The samples of every node of a tree being trained, held in one int32 array.
+
+    Each node owns a contiguous range [start, end) of the array. Splitting a node partitions its range in
+    place, stably, into the ranges of its two children, so the working set of a tree is one array of the
+    root samples plus two offsets per node. Indexing with a node returns a view of its samples.
+
+    Alongside each sample, its position among the root samples is kept and partitioned with it. Per-sample
+    buffers of the tree (such as the responses) have one row per position, so they are sized to the tree's
+    subsample rather than to the data.
+    """
+
+    def __init__(self, workspace=None):
+        """
+        Initialize a NodeSamples without nodes.
+
+        :param workspace: The TrainingWorkspace whose buffers hold the sort orders and sample mask, or None to
+                          allocate them for this tree only.
+        """
+        self.samples = np.empty(0, dtype=np.int32)
+        self.positions = np.empty(0, dtype=np.int32)
+        self.root_samples = self.samples
+        self.starts = []
+        self.ends = []
+        self.workspace = workspace
+
+        # Per variable, the positions of the root samples sorted by value, computed on first use.
+        self.sorted_positions = None
+        self.is_sorted = None
+        # The position of each row of the data among the root samples (-1 if not sampled), only built
+        # to filter the presorted index when the subsample is large.
+        self.row_positions = None
+        self.sample_mask = None
+
+    def set_root_samples(self, samples):
+        """
+        Set the samples of the root node (node 0), which must have been added.
+
+        :param samples: The distinct samples of the root node.
+        """
+        self.root_samples = np.array(samples, dtype=np.int32)
+        self.samples = self.root_samples.copy()
+        self.positions = np.arange(len(self.samples), dtype=np.int32)
+        self.starts[0], self.ends[0] = 0, len(self.samples)
+        self.sorted_positions = None
+        self.is_sorted = None
+        self.row_positions = None
+
+    def __getitem__(self, node):
+        """
+        Get the samples of a node.
+
+        :param node: The node index.
+        :return: A view of the node's samples.
+        """
+        return self.samples[self.starts[node]:self.ends[node]]
+
+    def __len__(self):
+        """Get the number of nodes."""
+        return len(self.starts)
+
+    def get_positions(self, node):
+        """
+        Get the positions among the root samples of the samples of a node, in the same order.
+
+        :param node: The node index.
+        :return: A view of the positions, each in [0, number of root samples).
+        """
+        return self.positions[self.starts[node]:self.ends[node]]
+
+    def get_num_root_samples(self):
+        """Get the number of samples of the root node, which is the length of the tree's per-sample buffers."""
+        return len(self.root_samples)
+
+    def get_size(self, node):
+        """
+        Get the number of samples of a node.
+
+        :param node: The node index.
+        :return: The number of samples.
+        """
+        return self.ends[node] - self.starts[node]
+
+    def add_node(self):
+        """
+        Add a node without samples.
+
+        :return: The index of the new node.
+        """
+        self.starts.append(0)
+        self.ends.append(0)
+        return len(self.starts) - 1
+
+    def partition(self, node, go_left, left_child, right_child):
+        """
+        Split the samples of a node between its children, keeping their order within each child.
+
+        :param node: The node index.
+        :param go_left: A boolean array with one entry per sample of the node, True for samples going left.
+        :param left_child: The index of the left child.
+        :param right_child: The index of the right child.
+        """
+        start, end = self.starts[node], self.ends[node]
+        num_left = int(np.count_nonzero(go_left))
+        for array in (self.samples, self.positions):
+            node_array = array[start:end]
+            node_array[:] = np.concatenate((node_array[go_left], node_array[~go_left]))
+
+        self.starts[left_child], self.ends[left_child] = start, start + num_left
+        self.starts[right_child], self.ends[right_child] = start + num_left, end
+
+    def clear(self, node):
+        """
+        Remove the samples of a node (their range stays with its children).
+
+        :param node: The node index.
+        """
+        self.ends[node] = self.starts[node]
+
+    def get_sorted_samples(self, node, data, var):
+        """
+        Sort the samples of a node by their value for a given variable (NaNs first).
+
+        Large nodes filter the sort order of the root samples, computed once per variable and tree; small ones
+        sort their own values. A node's positions are always increasing, as partitioning is stable, and ties
+        keep that order.
+
+        :param node: The node index.
+        :param data: The data used for training the tree.
+        :param var: The variable index.
+        :return: A tuple of the sorted samples, their positions and their values.
+        """
+        positions = self.get_positions(node)
+        num_samples = len(positions)
+
+        if num_samples * np.log2(max(num_samples, 2)) >= len(self.root_samples):
+            order = self.get_root_order(data, var)
+            in_node = self.get_sample_mask()
+            in_node[positions] = True
+            sorted_positions = order[in_node[order]]
+            in_node[positions] = False
+        else:
+            sorted_positions = positions[Data.nan_first_argsort(data.get_values(self.root_samples[positions], var))]
+
+        sorted_samples = self.root_samples[sorted_positions]
+        return sorted_samples, sorted_positions, data.get_values(sorted_samples, var)
+
+    def get_root_order(self, data, var):
+        """
+        Get the positions of the root samples sorted by their value for a variable (NaNs first).
+
+        When the data is presorted and the subsample is large enough for a linear filter of the presorted
+        column to beat sorting, the order is read from the presorted index.
+
+        :param data: The data used for training the tree.
+        :param var: The variable index.
+        :return: An int32 array of the positions.
+        """
+        num_root_samples = len(self.root_samples)
+        if self.sorted_positions is None:
+            shape = (num_root_samples, data.get_num_cols())
+            if self.workspace is None:
+                self.sorted_positions = np.empty(shape, dtype=np.int32, order='F')
+            else:
+                self.sorted_positions = self.workspace.get_sorted_positions(*shape)
+            self.is_sorted = np.zeros(data.get_num_cols(), dtype=bool)
+
+        order = self.sorted_positions[:, var]
+        if not self.is_sorted[var]:
+            sorted_index = data.get_sorted_index()
+            if sorted_index is not None and num_root_samples * np.log2(max(num_root_samples, 2)) >= data.get_num_rows():
+                if self.row_positions is None:
+                    self.row_positions = np.full(data.get_num_rows(), -1, dtype=np.int32)
+                    self.row_positions[self.root_samples] = np.arange(num_root_samples, dtype=np.int32)
+                row_positions = self.row_positions[sorted_index[:, var]]
+                order[:] = row_positions[row_positions >= 0]
+            else:
+                order[:] = Data.nan_first_argsort(data.get_values(self.root_samples, var))
+            self.is_sorted[var] = True
+        return order
+
+    def get_sample_mask(self):
+        """
+        Get a boolean mask over the positions of the root samples, all False.
+
+        :return: A bool array with one entry per root sample.
+        """
+        if self.workspace is not None:
+            return self.workspace.get_sample_mask(len(self.root_samples))
+        if self.sample_mask is None or len(self.sample_mask) != len(self.root_samples):
+            self.sample_mask = np.zeros(len(self.root_samples), dtype=bool)
+        return self.sample_mask
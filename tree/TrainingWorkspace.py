@@ -0,0 +1,59 @@
+import numpy as np
+
+
+class TrainingWorkspace:
+    """
+    Scratch buffers reused across the nodes and trees trained by one worker.
+
+    A workspace must not be shared between threads. Buffers are sized to the subsample of the tree being
+    trained, not to the data, and are only reallocated when a tree needs larger ones, so training a batch of
+    trees allocates them about once.
+    """
+
+    def __init__(self):
+        """
+        Initialize an empty TrainingWorkspace.
+        """
+        self.responses = None
+        self.sample_mask = None
+        self.sorted_positions = None
+
+    def get_responses(self, num_samples, response_length):
+        """
+        Get the buffer of responses, one row per sample of the tree's subsample (see NodeSamples.get_positions).
+
+        The buffer is not cleared between trees: the relabeling strategy writes the responses of a node's
+        samples before the splitting rule reads them, so stale entries are never read.
+
+        :param num_samples: The number of samples of the tree.
+        :param response_length: The number of responses per sample.
+        :return: A float64 array of shape (num_samples, response_length).
+        """
+        if self.responses is None or len(self.responses) < num_samples or self.responses.shape[1] != response_length:
+            self.responses = np.zeros((num_samples, response_length))
+        return self.responses[:num_samples]
+
+    def get_sample_mask(self, num_samples):
+        """
+        Get a boolean mask over the samples of the tree, all False.
+
+        Callers that set entries must reset them to False before the mask is used again.
+
+        :param num_samples: The number of samples of the tree.
+        :return: A bool array of length num_samples.
+        """
+        if self.sample_mask is None or len(self.sample_mask) < num_samples:
+            self.sample_mask = np.zeros(num_samples, dtype=bool)
+        return self.sample_mask[:num_samples]
+
+    def get_sorted_positions(self, num_samples, num_cols):
+        """
+        Get the buffer in which NodeSamples keeps, per variable, the samples of the tree sorted by value.
+
+        :param num_samples: The number of samples of the tree.
+        :param num_cols: The number of columns of the data.
+        :return: An uninitialized int32 array of shape (num_samples, num_cols), column-major.
+        """
+        if self.sorted_positions is None or self.sorted_positions.shape[0] < num_samples or self.sorted_positions.shape[1] != num_cols:
+            self.sorted_positions = np.empty((num_samples, num_cols), dtype=np.int32, order='F')
+        return self.sorted_positions[:num_samples]
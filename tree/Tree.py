@@ -1,8 +1,22 @@
+import math
+
+import numpy as np
+
+
 class Tree:
     """
     A class representing a decision tree.
+
+    The tree is stored in flat arrays indexed by node: int32 child and split variable arrays, float64 split
+    values, a bit-packed array of missing value directions, and the leaf samples in CSR form, where the
+    samples of node i are leaf_members[leaf_offsets[i]:leaf_offsets[i + 1]]. The samples drawn to train the
+    tree are a bitset over the rows of the training data (bit i set if row i was drawn), packed like the
+    missing value directions and long enough to hold the largest drawn row.
     """
 
+    __slots__ = ("root_node", "child_nodes", "split_vars", "split_values", "send_missing_left_bits", "num_nodes",
+                 "leaf_offsets", "leaf_members", "drawn_sample_bits", "prediction_values")
+
     def __init__(self, root_node, child_nodes, leaf_samples, split_vars, split_values, drawn_samples, send_missing_left, prediction_values):
         """
         Initialize a Tree object.
@@ -17,25 +31,66 @@ class Tree:
         :param prediction_values: The prediction values for each node.
         """
         self.root_node = root_node
-        self.child_nodes = child_nodes
-        self.leaf_samples = leaf_samples
-        self.split_vars = split_vars
-        self.split_values = split_values
-        self.drawn_samples = drawn_samples
-        self.send_missing_left = send_missing_left
+        self.child_nodes = np.asarray(child_nodes, dtype=np.int32).reshape(2, -1)
+        self.split_vars = np.asarray(split_vars, dtype=np.int32)
+        self.split_values = np.asarray(split_values, dtype=np.float64)
+        self.num_nodes = len(self.split_vars)
+        self.send_missing_left_bits = np.packbits(np.asarray(send_missing_left, dtype=bool))
+        self.leaf_offsets, self.leaf_members = self.to_csr(leaf_samples)
+        self.drawn_sample_bits = self.to_bitset(drawn_samples)
         self.prediction_values = prediction_values
 
+    @staticmethod
+    def to_csr(leaf_samples):
+        """
+        Convert a list of sample lists, one per node, into CSR offsets and members.
+
+        :param leaf_samples: A list of samples for each node.
+        :return: A tuple of the int64 offsets (one more than the number of nodes) and the int32 members.
+        """
+        leaf_sizes = np.fromiter((len(samples) for samples in leaf_samples), dtype=np.int64, count=len(leaf_samples))
+        leaf_offsets = np.zeros(len(leaf_samples) + 1, dtype=np.int64)
+        np.cumsum(leaf_sizes, out=leaf_offsets[1:])
+        leaf_members = np.empty(leaf_offsets[-1], dtype=np.int32)
+        for node in np.flatnonzero(leaf_sizes):
+            leaf_members[leaf_offsets[node]:leaf_offsets[node + 1]] = leaf_samples[node]
+        return leaf_offsets, leaf_members
+
+    @staticmethod
+    def to_bitset(samples):
+        """
+        Pack a set of samples into a bitset.
+
+        :param samples: The sample indices.
+        :return: A uint8 array with bit i set (most significant bit first) if sample i is in the set, just long
+                 enough to hold the largest sample.
+        """
+        samples = np.asarray(samples, dtype=np.intp)
+        if len(samples) == 0:
+            return np.zeros(0, dtype=np.uint8)
+        mask = np.zeros(int(samples.max()) + 1, dtype=bool)
+        mask[samples] = True
+        return np.packbits(mask)
+
     def get_root_node(self):
         """Get the root node of the tree."""
         return self.root_node
 
     def get_child_nodes(self):
-        """Get the child nodes of the tree."""
+        """Get the child nodes of the tree, as a (2, num_nodes) array of left and right children."""
         return self.child_nodes
 
     def get_leaf_samples(self):
-        """Get the leaf samples of the tree."""
-        return self.leaf_samples
+        """Get the leaf samples of the tree, as a list of array views (one per node)."""
+        return [self.leaf_members[self.leaf_offsets[node]:self.leaf_offsets[node + 1]] for node in range(self.num_nodes)]
+
+    def get_leaf_offsets(self):
+        """Get the CSR offsets of the leaf samples."""
+        return self.leaf_offsets
+
+    def get_leaf_members(self):
+        """Get the CSR members of the leaf samples."""
+        return self.leaf_members
 
     def get_split_vars(self):
         """Get the split variables of the tree."""
@@ -46,36 +101,138 @@ class Tree:
         return self.split_values
 
     def get_drawn_samples(self):
-        """Get the drawn samples of the tree."""
-        return self.drawn_samples
+        """Get the drawn samples of the tree, as a sorted int32 array."""
+        return np.flatnonzero(np.unpackbits(self.drawn_sample_bits)).astype(np.int32)
+
+    def get_drawn_sample_bits(self):
+        """Get the bitset of the drawn samples of the tree."""
+        return self.drawn_sample_bits
+
+    def is_drawn(self, samples):
+        """
+        Check which samples were drawn to train the tree.
+
+        :param samples: An array of sample indices.
+        :return: A bool array, True for the samples that were drawn (i.e. are not out of bag).
+        """
+        samples = np.asarray(samples, dtype=np.intp)
+        in_range = np.flatnonzero((samples >> 3) < len(self.drawn_sample_bits))
+        drawn = np.zeros(len(samples), dtype=bool)
+        drawn[in_range] = (self.drawn_sample_bits[samples[in_range] >> 3] >> (7 - (samples[in_range] & 7))) & 1
+        return drawn
 
     def get_send_missing_left(self):
         """Get the flags for sending missing values left."""
-        return self.send_missing_left
+        return np.unpackbits(self.send_missing_left_bits, count=self.num_nodes).astype(bool)
+
+    def get_send_missing_left_bits(self):
+        """Get the bit-packed flags for sending missing values left."""
+        return self.send_missing_left_bits
+
+    def sends_missing_left(self, node):
+        """
+        Check whether missing values are sent left at a node.
+
+        :param node: The node to check.
+        :return: True if missing values go to the left child.
+        """
+        return bool((self.send_missing_left_bits[node >> 3] >> (7 - (node & 7))) & 1)
 
     def get_prediction_values(self):
         """Get the prediction values of the tree."""
         return self.prediction_values
 
+    def get_num_nodes(self):
+        """Get the number of nodes in the tree."""
+        return self.num_nodes
+
+    def serialize(self):
+        """
+        Pack the tree into flat numpy arrays, e.g. to send it between processes.
+
+        :return: A dict of arrays (and the prediction values) describing the tree.
+        """
+        return {
+            "root_node": self.root_node,
+            "child_nodes": self.child_nodes,
+            "split_vars": self.split_vars,
+            "split_values": self.split_values,
+            "send_missing_left_bits": self.send_missing_left_bits,
+            "leaf_offsets": self.leaf_offsets,
+            "leaf_members": self.leaf_members,
+            "drawn_sample_bits": self.drawn_sample_bits,
+            "prediction_values": self.prediction_values,
+        }
+
+    @classmethod
+    def deserialize(cls, arrays):
+        """
+        Rebuild a tree from the arrays returned by serialize, without copying them.
+
+        :param arrays: The serialized tree.
+        :return: A Tree object.
+        """
+        tree = cls.__new__(cls)
+        tree.root_node = arrays["root_node"]
+        tree.child_nodes = arrays["child_nodes"]
+        tree.split_vars = arrays["split_vars"]
+        tree.split_values = arrays["split_values"]
+        tree.num_nodes = len(tree.split_vars)
+        tree.send_missing_left_bits = arrays["send_missing_left_bits"]
+        tree.leaf_offsets = arrays["leaf_offsets"]
+        tree.leaf_members = arrays["leaf_members"]
+        tree.drawn_sample_bits = arrays["drawn_sample_bits"]
+        tree.prediction_values = arrays["prediction_values"]
+        return tree
+
     def find_leaf_nodes(self, data, samples):
         """
         Find the leaf nodes for the given samples.
 
+        All samples are moved down the tree together, one level per step: each step gathers the split of every
+        sample's current node, compares the samples' values in one go and moves them to the chosen children.
+
         :param data: The data used for the tree.
         :param samples: The samples to find leaf nodes for.
-        :return: A list of leaf nodes for each sample.
+        :return: An array with the leaf node of each of the given samples at its sample index (0 elsewhere).
         """
-        prediction_leaf_nodes = [0] * data.get_num_rows()
+        samples = np.asarray(samples, dtype=np.intp)
+        nodes = np.full(len(samples), self.root_node, dtype=np.int32)
+
+        left_children, right_children = self.child_nodes
+        is_leaf = (left_children == 0) & (right_children == 0)
+        send_missing_left = self.get_send_missing_left()
+
+        active = np.flatnonzero(~is_leaf[nodes])
+        while len(active) > 0:
+            active_nodes = nodes[active]
+            split_values = self.split_values[active_nodes]
+            values = data.get_values_at(samples[active], self.split_vars[active_nodes])
 
-        for sample in samples:
-            node = self.find_leaf_node(data, sample)
-            prediction_leaf_nodes[sample] = node
+            is_missing = np.isnan(values)
+            go_left = (values <= split_values) | (is_missing & (send_missing_left[active_nodes] | np.isnan(split_values)))
+            active_nodes = np.where(go_left, left_children[active_nodes], right_children[active_nodes])
 
+            nodes[active] = active_nodes
+            active = active[~is_leaf[active_nodes]]
+
+        prediction_leaf_nodes = np.zeros(data.get_num_rows(), dtype=np.int32)
+        prediction_leaf_nodes[samples] = nodes
         return prediction_leaf_nodes
 
     def set_leaf_samples(self, leaf_samples):
-        """Set the leaf samples of the tree."""
-        self.leaf_samples = leaf_samples
+        """Set the leaf samples of the tree from a list of samples for each node."""
+        self.leaf_offsets, self.leaf_members = self.to_csr(leaf_samples)
+
+    def set_leaf_samples_csr(self, leaf_offsets, leaf_members):
+        """
+        Set the leaf samples of the tree in CSR form.
+
+        :param leaf_offsets: The int64 offsets into leaf_members, one more than the number of nodes.
+        :param leaf_members: The samples of all nodes, grouped by node.
+        """
+        self.leaf_offsets = np.asarray(leaf_offsets, dtype=np.int64)
+        self.leaf_members = np.asarray(leaf_members, dtype=np.int32)
 
     def set_prediction_values(self, prediction_values):
         """Set the prediction values of the tree."""
@@ -97,7 +254,7 @@ class Tree:
             split_var = self.split_vars[node]
             split_val = self.split_values[node]
             value = data.get(sample, split_var)
-            send_na_left = self.send_missing_left[node]
+            send_na_left = self.sends_missing_left(node)
 
             if value <= split_val or (send_na_left and math.isnan(value)) or (math.isnan(split_val) and math.isnan(value)):
                 node = self.child_nodes[0][node]
@@ -110,7 +267,7 @@ class Tree:
         """
         Prune the leaves of the tree based on honesty criteria.
         """
-        num_nodes = len(self.leaf_samples)
+        num_nodes = self.num_nodes
         for n in range(num_nodes, self.root_node, -1):
             node = n - 1
             if self.is_leaf(node):
@@ -160,4 +317,4 @@ class Tree:
         :param node: The node to check.
         :return: True if the node is an empty leaf, False otherwise.
         """
-        return self.is_leaf(node) and not self.leaf_samples[node]
+        return self.is_leaf(node) and self.leaf_offsets[node] == self.leaf_offsets[node + 1]
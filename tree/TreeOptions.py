@@ -1,9 +1,12 @@
+from tree.GrowthScheduler import GrowthScheduler
+
+
 class TreeOptions:
     """
     A class to hold options for building and pruning decision trees.
     """
 
-    def __init__(self, mtry, min_node_size, honesty, honesty_fraction, honesty_prune_leaves, alpha, imbalance_penalty):
+    def __init__(self, mtry, min_node_size, honesty, honesty_fraction, honesty_prune_leaves, alpha, imbalance_penalty, max_bins=None, growth_order="breadth_first", max_leaf_nodes=None, max_depth=None, min_split_gain=0.0):
         """
         Initialize TreeOptions.
 
@@ -14,7 +17,22 @@ class TreeOptions:
         :param honesty_prune_leaves: Whether to prune leaves based on honesty.
         :param alpha: The alpha parameter for tree building.
         :param imbalance_penalty: The imbalance penalty for tree building.
+        :param max_bins: If set, the maximum number of quantile bins per variable used for split finding.
+        :param growth_order: The order in which nodes are split: "breadth_first", "depth_first" or "best_first".
+        :param max_leaf_nodes: If set, the maximum number of leaves of a tree. Combine with best_first growth to
+                               spend the budget on the splits with the largest gains.
+        :param max_depth: If set, the maximum depth of a tree; nodes at this depth are not split.
+        :param min_split_gain: The minimum decrease in impurity (as computed by the splitting rule) of a split.
         """
+        if growth_order not in GrowthScheduler.ORDERS:
+            raise ValueError("Unknown growth order: " + str(growth_order) + ".")
+        if max_leaf_nodes is not None and max_leaf_nodes < 1:
+            raise ValueError("max_leaf_nodes must be at least 1.")
+        if max_depth is not None and max_depth < 0:
+            raise ValueError("max_depth must be non-negative.")
+        if min_split_gain < 0:
+            raise ValueError("min_split_gain must be non-negative.")
+
         self.mtry = mtry
         self.min_node_size = min_node_size
         self.honesty = honesty
@@ -22,6 +40,11 @@ class TreeOptions:
         self.honesty_prune_leaves = honesty_prune_leaves
         self.alpha = alpha
         self.imbalance_penalty = imbalance_penalty
+        self.max_bins = max_bins
+        self.growth_order = growth_order
+        self.max_leaf_nodes = max_leaf_nodes
+        self.max_depth = max_depth
+        self.min_split_gain = min_split_gain
 
     def get_mtry(self):
         """Get the number of variables to try at each split."""
@@ -50,3 +73,23 @@ class TreeOptions:
     def get_imbalance_penalty(self):
         """Get the imbalance penalty for tree building."""
         return self.imbalance_penalty
+
+    def get_max_bins(self):
+        """Get the maximum number of bins per variable, or None if split finding is exact."""
+        return self.max_bins
+
+    def get_growth_order(self):
+        """Get the order in which nodes are split."""
+        return self.growth_order
+
+    def get_max_leaf_nodes(self):
+        """Get the maximum number of leaves of a tree, or None if unbounded."""
+        return self.max_leaf_nodes
+
+    def get_max_depth(self):
+        """Get the maximum depth of a tree, or None if unbounded."""
+        return self.max_depth
+
+    def get_min_split_gain(self):
+        """Get the minimum decrease in impurity of a split."""
+        return self.min_split_gain
@@ -1,6 +1,9 @@
 import numpy as np
 
+from tree.GrowthScheduler import GrowthScheduler
+from tree.NodeSamples import NodeSamples
 from tree.Tree import Tree
+from tree.TrainingWorkspace import TrainingWorkspace
 
 
 class TreeTrainer:
@@ -16,7 +19,7 @@ class TreeTrainer:
         self.splitting_rule_factory = splitting_rule_factory
         self.prediction_strategy = prediction_strategy
 
-    def train(self, data, sampler, clusters, options):
+    def train(self, data, sampler, clusters, options, workspace=None):
         """
         Train a decision tree.
 
@@ -24,45 +27,84 @@ class TreeTrainer:
         :param sampler: A RandomSampler instance.
         :param clusters: Clusters of data.
         :param options: Tree options.
+        :param workspace: The TrainingWorkspace of the calling worker, reused across its trees. A new one is used if None.
         :return: A trained Tree object.
         """
+        if workspace is None:
+            workspace = TrainingWorkspace()
+
         child_nodes = [[], []]
-        nodes = [[]]
+        nodes = NodeSamples(workspace)
         split_vars = []
         split_values = []
         send_missing_left = []
+        split_gains = {}
 
         self.create_empty_node(child_nodes, nodes, split_vars, split_values, send_missing_left)
 
+        root_samples = []
         new_leaf_samples = []
         if options.get_honesty():
-            tree_growing_clusters, new_leaf_clusters = sampler.subsample(clusters, options.get_honesty_fraction())
-            nodes[0] = sampler.sample_from_clusters(tree_growing_clusters)
-            new_leaf_samples = sampler.sample_from_clusters(new_leaf_clusters)
+            tree_growing_clusters = []
+            new_leaf_clusters = []
+            sampler.subsample(clusters, options.get_honesty_fraction(), tree_growing_clusters, new_leaf_clusters)
+            sampler.sample_from_clusters(tree_growing_clusters, root_samples)
+            sampler.sample_from_clusters(new_leaf_clusters, new_leaf_samples)
         else:
-            nodes[0] = sampler.sample_from_clusters(clusters)
+            sampler.sample_from_clusters(clusters, root_samples)
+        nodes.set_root_samples(root_samples)
 
         splitting_rule = self.splitting_rule_factory.create(len(nodes[0]), options)
 
-        num_open_nodes = 1
-        i = 0
-        responses_by_sample = np.zeros((data.get_num_rows(), self.relabeling_strategy.get_response_length()))
-        while num_open_nodes > 0:
-            is_leaf_node = self.split_node(i, data, splitting_rule, sampler, child_nodes, nodes, split_vars, split_values, send_missing_left, responses_by_sample, options)
-            if is_leaf_node:
-                num_open_nodes -= 1
-            else:
-                nodes[i].clear()
-                num_open_nodes += 1
-            i += 1
-
-        drawn_samples = sampler.get_samples_in_clusters(clusters)
-        tree = Tree(0, child_nodes, nodes, split_vars, split_values, drawn_samples, send_missing_left, PredictionValues())
+        # Relabeling strategies that cache per-node statistics get a fresh copy per tree, so that trees
+        # trained concurrently do not share caches.
+        relabeling_strategy = self.relabeling_strategy
+        if hasattr(relabeling_strategy, "clone"):
+            relabeling_strategy = relabeling_strategy.clone()
+        # Histograms can only be carried from a node to its children if the responses are not refit at every node.
+        if hasattr(splitting_rule, "set_histogram_subtraction"):
+            splitting_rule.set_histogram_subtraction(hasattr(relabeling_strategy, "is_node_invariant") and relabeling_strategy.is_node_invariant())
+
+        # A node's split is found as soon as the node is created; the scheduler then decides when to apply it.
+        responses_by_sample = workspace.get_responses(nodes.get_num_root_samples(), relabeling_strategy.get_response_length())
+        scheduler = GrowthScheduler(options.get_growth_order())
+        max_leaf_nodes = options.get_max_leaf_nodes()
+        num_leaves = 0
+        depths = {0: 0}
+
+        new_nodes = [0]
+        while new_nodes:
+            for node in new_nodes:
+                is_leaf_node = self.find_split(node, depths[node], data, splitting_rule, relabeling_strategy, sampler, nodes, split_vars, split_values, send_missing_left, split_gains, responses_by_sample, options)
+                if is_leaf_node:
+                    num_leaves += 1
+                    self.set_leaf(node, splitting_rule, relabeling_strategy)
+                else:
+                    scheduler.push(node, split_gains.get(node, 0.0))
+
+            # Every split turns one open node into two, so it adds one leaf to the final tree.
+            if len(scheduler) == 0 or (max_leaf_nodes is not None and num_leaves + len(scheduler) >= max_leaf_nodes):
+                break
+            node = scheduler.pop()
+            new_nodes = self.split_node(node, data, splitting_rule, relabeling_strategy, child_nodes, nodes, split_vars, split_values, send_missing_left, options.get_min_node_size())
+            nodes.clear(node)
+            for child in new_nodes:
+                depths[child] = depths[node] + 1
+
+        # Open nodes left over once the leaf budget is spent become leaves.
+        while len(scheduler) > 0:
+            node = scheduler.pop()
+            split_values[node] = -1.0
+            self.set_leaf(node, splitting_rule, relabeling_strategy)
+
+        drawn_samples = []
+        sampler.get_samples_in_clusters(clusters, drawn_samples)
+        tree = Tree(0, child_nodes, nodes, split_vars, split_values, drawn_samples, send_missing_left, None)
 
         if new_leaf_samples:
             self.repopulate_leaf_nodes(tree, data, new_leaf_samples, options.get_honesty_prune_leaves())
 
-        prediction_values = PredictionValues()  # Placeholder for actual prediction values
+        prediction_values = None
         if self.prediction_strategy:
             prediction_values = self.prediction_strategy.precompute_prediction_values(tree.get_leaf_samples(), data)
         tree.set_prediction_values(prediction_values)
@@ -70,6 +112,19 @@ class TreeTrainer:
         return tree
 
 
+    def set_leaf(self, node, splitting_rule, relabeling_strategy):
+        """
+        Let the splitting rule and the relabeling strategy drop what they cached for a node that is final as a leaf.
+
+        :param node: The index of the leaf.
+        :param splitting_rule: The rule used for splitting nodes.
+        :param relabeling_strategy: The relabeling strategy of the tree.
+        """
+        if hasattr(splitting_rule, "set_leaf"):
+            splitting_rule.set_leaf(node)
+        if hasattr(relabeling_strategy, "set_leaf"):
+            relabeling_strategy.set_leaf(node)
+
     def repopulate_leaf_nodes(self, tree, data, leaf_samples, honesty_prune_leaves):
         """
         Repopulate the leaf nodes of the tree with new samples.
@@ -79,16 +134,15 @@ class TreeTrainer:
         :param leaf_samples: The new leaf samples.
         :param honesty_prune_leaves: Whether to apply honesty-based pruning.
         """
-        num_nodes = len(tree.get_leaf_samples())
-        new_leaf_nodes = [[] for _ in range(num_nodes)]
+        num_nodes = tree.get_num_nodes()
+        leaf_samples = np.asarray(leaf_samples, dtype=np.int32)
+        leaf_nodes = tree.find_leaf_nodes(data, leaf_samples)[leaf_samples]
 
-        leaf_nodes = tree.find_leaf_nodes(data, leaf_samples)
-
-        for sample in leaf_samples:
-            leaf_node = leaf_nodes[sample]
-            new_leaf_nodes[leaf_node].append(sample)
-
-        tree.set_leaf_samples(new_leaf_nodes)
+        # Group the samples by leaf, keeping their order within each leaf.
+        order = np.argsort(leaf_nodes, kind='stable')
+        leaf_offsets = np.zeros(num_nodes + 1, dtype=np.int64)
+        np.cumsum(np.bincount(leaf_nodes, minlength=num_nodes), out=leaf_offsets[1:])
+        tree.set_leaf_samples_csr(leaf_offsets, leaf_samples[order])
 
         if honesty_prune_leaves:
             tree.honesty_prune_leaves()
@@ -108,31 +162,59 @@ class TreeTrainer:
 
         return sampler.draw(data.get_num_cols(), data.get_disallowed_split_variables(), split_mtry)
 
-    def split_node(self, node, data, splitting_rule, sampler, child_nodes, samples, split_vars, split_values, send_missing_left, responses_by_sample, options):
+    def find_split(self, node, depth, data, splitting_rule, relabeling_strategy, sampler, samples, split_vars, split_values, send_missing_left, split_gains, responses_by_sample, options):
         """
-        Split a node during the tree training process.
+        Find the split of a node during the tree training process, without applying it.
+
+        Besides the splitting rule's own stopping criteria, a node is a leaf if it is at the maximum depth
+        or if the gain of its best split is below the minimum split gain.
 
         :param node: The index of the current node to be split.
+        :param depth: The depth of the node (0 for the root).
         :param data: The data used for training the tree.
         :param splitting_rule: The rule used for splitting nodes.
+        :param relabeling_strategy: The relabeling strategy of the tree.
         :param sampler: A RandomSampler instance.
-        :param child_nodes: A list of child nodes.
-        :param samples: A list of samples at each node.
+        :param samples: The NodeSamples holding the samples of each node.
         :param split_vars: Variables used for splitting at each node.
         :param split_values: Values used for splitting at each node.
         :param send_missing_left: Whether to send missing values left at each node.
-        :param responses_by_sample: The responses associated with each sample.
+        :param split_gains: The decrease in impurity of the split of each node, filled in by the splitting rule.
+        :param responses_by_sample: The responses of the tree's samples, one row per position (see NodeSamples.get_positions).
         :param options: Tree options.
         :return: True if the node is a terminal node, False otherwise.
         """
+        max_depth = options.get_max_depth()
+        if max_depth is not None and depth >= max_depth:
+            split_values[node] = -1.0
+            return True
+
         possible_split_vars = self.create_split_variable_subset(sampler, data, options.get_mtry())
 
-        # Placeholder for split_node_internal function
-        stop = split_node_internal(node, data, splitting_rule, possible_split_vars, samples, split_vars, split_values, send_missing_left, responses_by_sample, options.get_min_node_size())
+        stop = self.split_node_internal(node, data, splitting_rule, relabeling_strategy, possible_split_vars, samples, split_vars, split_values, send_missing_left, split_gains, responses_by_sample, options.get_min_node_size())
 
-        if stop:
+        if not stop and split_gains.get(node, 0.0) < options.get_min_split_gain():
+            split_values[node] = -1.0
             return True
 
+        return stop
+
+    def split_node(self, node, data, splitting_rule, relabeling_strategy, child_nodes, samples, split_vars, split_values, send_missing_left, min_node_size=0):
+        """
+        Split a node with the split found by find_split: create its children and partition its samples.
+
+        :param node: The index of the node to be split.
+        :param data: The data used for training the tree.
+        :param splitting_rule: The rule used for splitting nodes.
+        :param relabeling_strategy: The relabeling strategy of the tree.
+        :param child_nodes: A list of child nodes.
+        :param samples: The NodeSamples holding the samples of each node.
+        :param split_vars: Variables used for splitting at each node.
+        :param split_values: Values used for splitting at each node.
+        :param send_missing_left: Whether to send missing values left at each node.
+        :param min_node_size: The size at or below which a node is not split.
+        :return: A list of the left and right child nodes.
+        """
         split_var = split_vars[node]
         split_value = split_values[node]
         send_na_left = send_missing_left[node]
@@ -145,28 +227,36 @@ class TreeTrainer:
         child_nodes[1][node] = right_child_node
         self.create_empty_node(child_nodes, samples, split_vars, split_values, send_missing_left)
 
-        for sample in samples[node]:
-            value = data.get(sample, split_var)
-            if value <= split_value or (send_na_left and math.isnan(value)) or (math.isnan(split_value) and math.isnan(value)):
-                samples[left_child_node].append(sample)
-            else:
-                samples[right_child_node].append(sample)
+        # Binned splitting rules derive the children's histograms from this node's.
+        if hasattr(splitting_rule, "set_children"):
+            splitting_rule.set_children(node, left_child_node, right_child_node)
 
-        return False
+        values = data.get_values(samples[node], split_var)
+        is_missing = np.isnan(values)
+        go_left = (values <= split_value) | (is_missing & (send_na_left or np.isnan(split_value)))
+        samples.partition(node, go_left, left_child_node, right_child_node)
+
+        # Relabeling strategies that cache per-node statistics derive the children's from this node's.
+        if hasattr(relabeling_strategy, "set_children"):
+            relabeling_strategy.set_children(node, left_child_node, right_child_node, samples, data, min_node_size)
+
+        return [left_child_node, right_child_node]
 
-    def split_node_internal(self, node, data, splitting_rule, possible_split_vars, samples, split_vars, split_values, send_missing_left, responses_by_sample, min_node_size):
+    def split_node_internal(self, node, data, splitting_rule, relabeling_strategy, possible_split_vars, samples, split_vars, split_values, send_missing_left, split_gains, responses_by_sample, min_node_size):
         """
         Split a node during the tree training process.
 
         :param node: The index of the current node to be split.
         :param data: The data used for training the tree.
         :param splitting_rule: The rule used for splitting nodes.
+        :param relabeling_strategy: The relabeling strategy of the tree.
         :param possible_split_vars: A list of possible variables for splitting.
-        :param samples: A list of samples at each node.
+        :param samples: The NodeSamples holding the samples of each node.
         :param split_vars: Variables used for splitting at each node.
         :param split_values: Values used for splitting at each node.
         :param send_missing_left: Whether to send missing values left at each node.
-        :param responses_by_sample: The responses associated with each sample.
+        :param split_gains: The decrease in impurity of the split of each node, filled in by the splitting rule.
+        :param responses_by_sample: The responses of the tree's samples, one row per position (see NodeSamples.get_positions).
         :param min_node_size: The minimum size of a node.
         :return: True if the node is a terminal node, False otherwise.
         """
@@ -174,9 +264,9 @@ class TreeTrainer:
             split_values[node] = -1.0
             return True
 
-        stop = self.relabeling_strategy.relabel(samples[node], data, responses_by_sample)
+        stop = relabeling_strategy.relabel(samples[node], samples.get_positions(node), data, responses_by_sample, node)
 
-        if stop or splitting_rule.find_best_split(data, node, possible_split_vars, responses_by_sample, samples, split_vars, split_values, send_missing_left):
+        if stop or splitting_rule.find_best_split(data, node, possible_split_vars, responses_by_sample, samples, split_vars, split_values, send_missing_left, split_gains):
             split_values[node] = -1.0
             return True
 
@@ -187,14 +277,14 @@ class TreeTrainer:
         Create an empty node in the tree with default values.
 
         :param child_nodes: A list of child nodes.
-        :param samples: A list of samples at each node.
+        :param samples: The NodeSamples holding the samples of each node.
         :param split_vars: Variables used for splitting at each node.
         :param split_values: Values used for splitting at each node.
         :param send_missing_left: Whether to send missing values left at each node.
         """
         child_nodes[0].append(0)
         child_nodes[1].append(0)
-        samples.append([])
+        samples.add_node()
         split_vars.append(0)
         split_values.append(0.0)
         send_missing_left.append(True)